@@ -0,0 +1,22 @@
+"""Outils d'analyse de la fidélisation des clients Arkose.
+
+Les sous-modules sont importés à la demande, pour que la ligne de commande
+(`arkose.cli`) démarre sans charger pandas, SQLAlchemy ni matplotlib.
+"""
+
+import importlib
+
+_EXPORTS = {
+    'ajouter_age': 'arkose.ingestion',
+    'calculate_monthly_visits': 'arkose.frequentation',
+    'charger_clients': 'arkose.ingestion',
+    'charger_passages': 'arkose.ingestion',
+}
+
+__all__ = sorted(_EXPORTS)
+
+
+def __getattr__(nom):
+    if nom in _EXPORTS:
+        return getattr(importlib.import_module(_EXPORTS[nom]), nom)
+    raise AttributeError(f"module 'arkose' has no attribute {nom!r}")
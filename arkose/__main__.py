@@ -0,0 +1,5 @@
+import sys
+
+from arkose.cli import main
+
+sys.exit(main())
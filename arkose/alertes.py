@@ -0,0 +1,247 @@
+"""Détection en flux du désengagement des clients.
+
+Indicateur retenu par l'étude : une fréquentation en baisse sur plusieurs mois
+consécutifs, et une inactivité de plus de 90 jours. Le détecteur consomme les
+passages au fil de l'eau (micro-lots, ou suivi d'un fichier en cours
+d'écriture) et lève une alerte dès qu'un client franchit l'un des seuils.
+
+L'état est de taille fixe par client (une vingtaine d'octets dans des tableaux
+numpy, plus l'entrée de la table d'identifiants) : mois en cours et son
+nombre de passages, nombre de passages du mois précédent, longueur de la
+série de baisses, date du dernier passage. Les lots sont traités de façon
+vectorisée.
+"""
+
+import io
+import time
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+
+from arkose.ingestion import SCHEMA_PASSAGES, iterer_blocs
+
+SEUIL_MOIS_BAISSE = 2
+SEUIL_JOURS_INACTIVITE = 90
+
+_EPOQUE = np.datetime64('1970-01-01', 'D')
+
+
+def _jours(dates):
+    return (dates.to_numpy(dtype='datetime64[D]') - _EPOQUE).astype(np.int32)
+
+
+def _mois(dates):
+    return (dates.dt.year * 12 + dates.dt.month - 1).to_numpy(dtype=np.int32)
+
+
+class DetecteurDesengagement:
+    """Détecteur de baisse de fréquentation et d'inactivité, à état constant par client.
+
+    `traiter(passages)` consomme un lot de passages (colonnes `ID Client` et
+    `Date Passage`) et renvoie les alertes levées ; `avancer(date)` fait
+    avancer l'horloge du flux pour clôturer les mois écoulés de tous les
+    clients et détecter les inactivités, même sans nouveau passage.
+
+    Une alerte `baisse` est levée quand un client enchaîne au moins
+    `seuil_mois` mois complets en baisse (par rapport au mois précédent), une
+    alerte `inactivite` quand son dernier passage date de plus de
+    `seuil_jours` jours. Chaque alerte n'est levée qu'une fois par épisode.
+    """
+
+    def __init__(self, seuil_mois=SEUIL_MOIS_BAISSE, seuil_jours=SEUIL_JOURS_INACTIVITE, capacite=1024):
+        self.seuil_mois = seuil_mois
+        self.seuil_jours = seuil_jours
+        self._slots = {}
+        self._n = 0
+        self.ids = np.zeros(capacite, dtype=np.int64)
+        self.mois = np.full(capacite, -1, dtype=np.int32)
+        self.compte = np.zeros(capacite, dtype=np.int32)
+        self.precedent = np.full(capacite, -1, dtype=np.int32)
+        self.serie = np.zeros(capacite, dtype=np.int16)
+        self.dernier_jour = np.zeros(capacite, dtype=np.int32)
+        self.alerte_baisse = np.zeros(capacite, dtype=bool)
+        self.alerte_inactivite = np.zeros(capacite, dtype=bool)
+
+    def __len__(self):
+        return self._n
+
+    def _agrandir(self, taille):
+        capacite = len(self.ids)
+        if taille <= capacite:
+            return
+        while capacite < taille:
+            capacite *= 2
+        for nom in ('ids', 'mois', 'compte', 'precedent', 'serie', 'dernier_jour',
+                    'alerte_baisse', 'alerte_inactivite'):
+            ancien = getattr(self, nom)
+            nouveau = np.full(capacite, -1 if nom in ('mois', 'precedent') else 0, dtype=ancien.dtype)
+            nouveau[:len(ancien)] = ancien
+            setattr(self, nom, nouveau)
+
+    def _slots_de(self, ids):
+        # Identifiants distincts du lot -> emplacements, en créant les nouveaux clients
+        slots = np.empty(len(ids), dtype=np.int64)
+        for i, id_client in enumerate(ids.tolist()):
+            slot = self._slots.get(id_client)
+            if slot is None:
+                slot = self._slots[id_client] = self._n
+                self._n += 1
+            slots[i] = slot
+        self._agrandir(self._n)
+        self.ids[slots] = ids
+        return slots
+
+    def _cloturer(self, slots, nouveau_mois):
+        """Clôt le mois en cours des `slots` (distincts) et ouvre `nouveau_mois`."""
+        compte = self.compte[slots]
+        precedent = self.precedent[slots]
+        serie = self.serie[slots]
+        ecart = nouveau_mois - self.mois[slots] - 1
+
+        # Mois qui se termine, comparé au mois précédent
+        serie = np.where((precedent >= 0) & (compte < precedent), serie + 1, 0)
+        # Mois intermédiaires sans passage : le premier est une baisse s'il suit
+        # un mois fréquenté, les suivants (0 -> 0) interrompent la série
+        serie = np.where(ecart >= 1, np.where(compte > 0, serie + 1, 0), serie)
+        serie = np.where(ecart >= 2, 0, serie)
+
+        self.precedent[slots] = np.where(ecart >= 1, 0, compte)
+        self.serie[slots] = serie
+        self.mois[slots] = nouveau_mois
+        self.compte[slots] = 0
+        self.alerte_baisse[slots] &= serie > 0
+
+    def _alertes_baisse(self, slots, date):
+        nouvelles = slots[(self.serie[slots] >= self.seuil_mois) & ~self.alerte_baisse[slots]]
+        self.alerte_baisse[nouvelles] = True
+        return pd.DataFrame({
+            'ID Client': self.ids[nouvelles],
+            'type': 'baisse',
+            'date': date,
+            'valeur': self.serie[nouvelles].astype(np.int64),
+        })
+
+    def _alertes_inactivite(self, date):
+        slots = np.arange(self._n)
+        inactivite = _jours(pd.Series([date]))[0] - self.dernier_jour[:self._n]
+        nouvelles = slots[(inactivite > self.seuil_jours) & ~self.alerte_inactivite[:self._n]]
+        self.alerte_inactivite[nouvelles] = True
+        return pd.DataFrame({
+            'ID Client': self.ids[nouvelles],
+            'type': 'inactivite',
+            'date': date,
+            'valeur': inactivite[nouvelles].astype(np.int64),
+        })
+
+    def traiter(self, passages):
+        """Consomme un lot de passages et renvoie les alertes de baisse levées."""
+        passages = passages[passages['Date Passage'].notna()]
+        if passages.empty:
+            return self._alertes_baisse(np.empty(0, dtype=np.int64), pd.NaT)
+        date_lot = passages['Date Passage'].max()
+
+        # Agrégation du lot par (client, mois) : nombre de passages et dernier jour
+        lot = pd.DataFrame({
+            'ID Client': passages['ID Client'].to_numpy(),
+            'mois': _mois(passages['Date Passage']),
+            'jour': _jours(passages['Date Passage']),
+        }).groupby(['ID Client', 'mois'], sort=True).agg(n=('jour', 'size'), jour=('jour', 'max')).reset_index()
+
+        ids, inverse = np.unique(lot['ID Client'].to_numpy(), return_inverse=True)
+        lot_slots = self._slots_de(ids)[inverse]
+        rang = lot.groupby('ID Client').cumcount().to_numpy()
+
+        touches = []
+        # Un client peut couvrir plusieurs mois dans le lot : on les applique
+        # dans l'ordre, un rang à la fois, chaque rang étant vectorisé
+        for r in range(int(rang.max()) + 1):
+            selection = rang == r
+            slots = lot_slots[selection]
+            mois = lot['mois'].to_numpy()[selection]
+            n = lot['n'].to_numpy()[selection]
+            jour = lot['jour'].to_numpy()[selection]
+
+            nouveaux = self.mois[slots] < 0
+            self.mois[slots[nouveaux]] = mois[nouveaux]
+            suivants = mois > self.mois[slots]
+            self._cloturer(slots[suivants], mois[suivants])
+            # Les passages d'un mois déjà clos (arrivés en retard) ne comptent plus
+            en_cours = mois == self.mois[slots]
+            self.compte[slots[en_cours]] += n[en_cours].astype(np.int32)
+
+            self.dernier_jour[slots] = np.maximum(self.dernier_jour[slots], jour)
+            self.alerte_inactivite[slots] = False
+            touches.append(slots[suivants])
+
+        return self._alertes_baisse(np.unique(np.concatenate(touches)), date_lot)
+
+    def avancer(self, date):
+        """Avance l'horloge à `date` : clôt les mois écoulés et détecte les inactivités."""
+        date = pd.Timestamp(date)
+        mois = date.year * 12 + date.month - 1
+        slots = np.flatnonzero(self.mois[:self._n] < mois)
+        self._cloturer(slots, mois)
+        return pd.concat([self._alertes_baisse(slots, date), self._alertes_inactivite(date)],
+                         ignore_index=True)
+
+    def etat(self):
+        """Photographie de l'état courant, un client par ligne."""
+        n = self._n
+        return pd.DataFrame({
+            'ID Client': self.ids[:n],
+            'mois_en_cours': self.mois[:n],
+            'passages_mois_en_cours': self.compte[:n],
+            'passages_mois_precedent': self.precedent[:n],
+            'mois_en_baisse': self.serie[:n],
+            'dernier_passage': _EPOQUE + self.dernier_jour[:n].astype('timedelta64[D]'),
+        })
+
+
+def _fin_derniere_ligne(donnees):
+    """Position suivant le dernier saut de ligne hors guillemets (fin du dernier enregistrement complet)."""
+    octets = np.frombuffer(donnees, dtype=np.uint8)
+    hors_guillemets = np.cumsum(octets == ord('"')) % 2 == 0
+    fins = np.flatnonzero((octets == ord('\n')) & hors_guillemets)
+    return int(fins[-1]) + 1 if len(fins) else 0
+
+
+def suivre_fichier(chemin, detecteur, intervalle=5.0, depuis_debut=True, continuer=True,
+                   taille_max=64 * 1024 * 1024):
+    """Suit un export de passages en cours d'écriture et renvoie les alertes au fil de l'eau.
+
+    Générateur : à chaque lecture, les enregistrements complets ajoutés depuis
+    la lecture précédente (au plus `taille_max` octets) sont traités comme un
+    micro-lot, puis l'horloge du détecteur avance à la date du dernier passage
+    vu. Un DataFrame d'alertes (éventuellement vide) est produit par micro-lot.
+    Avec `continuer=False`, le suivi s'arrête à la fin du fichier.
+    """
+    chemin = Path(chemin)
+    colonnes = pd.read_csv(chemin, nrows=0).columns.tolist()
+    options = {'header': None, 'names': colonnes}
+
+    with open(chemin, 'rb') as f:
+        f.readline()
+        position = f.tell() if depuis_debut else chemin.stat().st_size
+        horloge = None
+        while True:
+            f.seek(position)
+            donnees = f.read(taille_max)
+            fin = _fin_derniere_ligne(donnees)
+            if fin == 0:
+                if not continuer:
+                    return
+                time.sleep(intervalle)
+                continue
+            position += fin
+
+            alertes = []
+            for bloc in iterer_blocs(io.BytesIO(donnees[:fin]), SCHEMA_PASSAGES,
+                                     dedupliquer=False, options_lecture=options):
+                alertes.append(detecteur.traiter(bloc))
+                maximum = bloc['Date Passage'].max()
+                if pd.notna(maximum) and (horloge is None or maximum > horloge):
+                    horloge = maximum
+            if horloge is not None:
+                alertes.append(detecteur.avancer(horloge))
+            yield pd.concat(alertes, ignore_index=True)
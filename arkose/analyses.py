@@ -0,0 +1,206 @@
+"""Analyses de l'étude, exécutées sur la base (requêtes en dialecte MySQL, traduites par le backend).
+
+Chaque fonction prend le moteur SQLAlchemy et renvoie les données prêtes à
+afficher ou à tracer (voir `arkose.graphiques`). Les résultats des requêtes
+d'agrégat sont mis en cache tant que les tables lues ne changent pas (voir
+`arkose.cache_requetes`).
+"""
+
+import pandas as pd
+
+from arkose import cache_requetes
+from arkose.backend import lire_sql
+from arkose.frequentation import BORNES_ANCIENNETE, TRANCHES_ANCIENNETE
+from arkose.resume_clients import N_MOIS
+from arkose.tarifs import LIBELLES_TARIF, TARIF_REDUIT
+
+REQUETE_AGE_MOYEN = """
+    SELECT ROUND(AVG(age)) AS age_moyen
+    FROM clients
+    WHERE age IS NOT NULL
+"""
+
+# Classe tarifaire calculée au chargement (arkose/tarifs.py), équivalente au filtre
+# LOWER(REPLACE(Designation,'é', 'e')) LIKE '%reduit' : agrégation sur l'index ix_passages_tarif
+REQUETE_TARIF_REDUIT = f"""
+    SELECT
+        ROUND(
+            SUM(CASE WHEN classe_tarif = {TARIF_REDUIT} THEN 1 ELSE 0 END) *100.0 /COUNT(*),
+            2
+        ) AS prop_tarif_reduit
+    FROM passages
+    WHERE classe_tarif >= 0
+"""
+
+REQUETE_REPARTITION_TARIFS = """
+    SELECT classe_tarif, COUNT(*) AS passages
+    FROM passages
+    WHERE classe_tarif >= 0
+    GROUP BY classe_tarif
+    ORDER BY classe_tarif
+"""
+
+REQUETE_FREQUENTATION_PAR_TARIF = """
+    SELECT
+        classe_tarif,
+        YEAR(`Date Passage`) AS annee,
+        MONTH(`Date Passage`) AS mois,
+        COUNT(*) AS passages
+    FROM passages
+    WHERE classe_tarif >= 0
+    GROUP BY classe_tarif, annee, mois
+    ORDER BY annee, mois, classe_tarif
+"""
+
+# Agrégat mensuel maintenu à chaque ingestion (arkose/incremental.py), équivalent à
+# SELECT YEAR(`Date Passage`) AS annee, MONTH(`Date Passage`) AS mois, COUNT(*) AS passages
+# FROM passages GROUP BY annee, mois
+REQUETE_FREQUENTATION_MENSUELLE = """
+    SELECT annee, mois, passages
+    FROM agg_passages_mensuels
+    ORDER BY annee, mois
+"""
+
+REQUETE_INSCRIPTIONS = """
+    SELECT `ID Client`, `Date Inscription`
+    FROM clients
+    WHERE `Date Inscription` IS NOT NULL
+"""
+
+# Effectif par tranche d'ancienneté (indice dans TRANCHES_ANCIENNETE), lu dans la
+# synthèse par client (arkose/resume_clients.py), où
+# anciennete_jours = DATEDIFF(MAX(`Date Passage`), `Date Inscription`) :
+# une ligne par tranche quitte le serveur
+REQUETE_REPARTITION_ANCIENNETE = f"""
+    SELECT
+        CASE
+            {' '.join(f'WHEN anciennete_jours < {borne:g} THEN {i}'
+                      for i, borne in enumerate(BORNES_ANCIENNETE[1:-1]))}
+            ELSE {len(TRANCHES_ANCIENNETE) - 1}
+        END AS tranche,
+        COUNT(*) AS clients
+    FROM resume_clients
+    WHERE anciennete_jours >= 0
+    GROUP BY tranche
+    ORDER BY tranche
+"""
+
+# Fréquentation moyenne des N_MOIS mois précédant le dernier passage, comme
+# calculate_monthly_visits : profils par client calculés dans la base par fonctions
+# de fenêtre (resume_clients.REQUETE_RESUME). Seules les N_MOIS moyennes quittent le serveur.
+REQUETE_PROFIL_MENSUEL = f"""
+    SELECT {', '.join(f'AVG(mois_{i}) AS mois_{i}' for i in range(1, N_MOIS + 1))}
+    FROM resume_clients
+"""
+
+REQUETE_FORFAITS = """
+    SELECT
+        `Type Forfait`,
+        COUNT(*) AS nombre_utilisations
+    FROM
+        passages
+    GROUP BY
+        `Type Forfait`
+    ORDER BY
+        nombre_utilisations DESC
+"""
+
+REQUETE_TRANCHES_AGE = """
+    SELECT
+        CASE
+            WHEN age BETWEEN 17 AND 20 THEN '17-20'
+            WHEN age BETWEEN 21 AND 25 THEN '21-25'
+            WHEN age BETWEEN 26 AND 30 THEN '26-30'
+            WHEN age BETWEEN 31 AND 35 THEN '31-35'
+            WHEN age BETWEEN 36 AND 40 THEN '36-40'
+            WHEN age BETWEEN 41 AND 45 THEN '41-45'
+            WHEN age BETWEEN 46 AND 47 THEN '46-47'
+            ELSE 'Autre'
+        END AS age_group,
+        COUNT(*) AS count,
+        (COUNT(*) * 100.0 / (SELECT COUNT(*) FROM clients WHERE age BETWEEN 17 AND 47)) AS percentage
+    FROM
+        clients
+    WHERE
+        age BETWEEN 17 AND 47
+    GROUP BY
+        age_group
+    ORDER BY
+        MIN(age)
+"""
+
+
+def age_moyen(engine):
+    return cache_requetes.executer_scalaire(REQUETE_AGE_MOYEN, engine)
+
+
+def proportion_tarif_reduit(engine):
+    return cache_requetes.executer_scalaire(REQUETE_TARIF_REDUIT, engine)
+
+
+def repartition_tarifs(engine):
+    """Nombre et proportion de passages par classe tarifaire."""
+    df = cache_requetes.lire_sql(REQUETE_REPARTITION_TARIFS, engine)
+    df.insert(1, 'tarif', df['classe_tarif'].map(LIBELLES_TARIF))
+    df['Proportion'] = (df['passages'] / df['passages'].sum()) * 100
+    return df
+
+
+def frequentation_par_tarif(engine):
+    """Passages par mois et par classe tarifaire (une colonne par tarif)."""
+    df = cache_requetes.lire_sql(REQUETE_FREQUENTATION_PAR_TARIF, engine)
+    df['tarif'] = df['classe_tarif'].map(LIBELLES_TARIF)
+    return (df.pivot_table(index=['annee', 'mois'], columns='tarif', values='passages', aggfunc='sum', fill_value=0)
+            .reset_index().rename_axis(columns=None))
+
+
+def frequentation_mensuelle(engine):
+    """Passages par année et par mois."""
+    return cache_requetes.lire_sql(REQUETE_FREQUENTATION_MENSUELLE, engine)
+
+
+def repartition_inscriptions(engine):
+    """Nombre de clients par année d'inscription, années sans inscription comprises."""
+    df = lire_sql(REQUETE_INSCRIPTIONS, engine)
+    annees = pd.to_datetime(df['Date Inscription'], format='ISO8601').dt.year
+    repartition = annees.value_counts().sort_index()
+    if repartition.empty:
+        return repartition.rename_axis('annee_inscription')
+    annees_completes = range(annees.min(), annees.max() + 1)
+    return repartition.reindex(annees_completes, fill_value=0).rename_axis('annee_inscription')
+
+
+def repartition_anciennete(engine):
+    """Nombre de clients par tranche de durée de fréquentation, tranches vides comprises."""
+    df = cache_requetes.lire_sql(REQUETE_REPARTITION_ANCIENNETE, engine)
+    clients = (df.set_index('tranche')['clients'].astype('int64')
+               .reindex(range(len(TRANCHES_ANCIENNETE)), fill_value=0))
+    return pd.DataFrame({
+        'Tranche': pd.Categorical(TRANCHES_ANCIENNETE, categories=TRANCHES_ANCIENNETE, ordered=True),
+        'clients': clients.to_numpy(),
+    })
+
+
+def profil_mensuel(engine):
+    """Fréquentation moyenne par client sur les mois précédant son dernier passage.
+
+    `M-1` est le mois le plus ancien, `M-12` le mois du dernier passage.
+    """
+    # MySQL renvoie des DECIMAL (NULL sans passage)
+    moyennes = cache_requetes.lire_sql(REQUETE_PROFIL_MENSUEL, engine).iloc[0].astype(float)
+    return pd.DataFrame({
+        'Mois': [f'M-{i}' for i in range(1, N_MOIS + 1)],
+        'Moyenne': [moyennes[f'mois_{i}'] for i in range(1, N_MOIS + 1)],
+    })
+
+
+def types_forfaits(engine):
+    """Nombre et proportion d'utilisations par type de forfait."""
+    df = cache_requetes.lire_sql(REQUETE_FORFAITS, engine)
+    df['Proportion'] = (df['nombre_utilisations'] / df['nombre_utilisations'].sum()) * 100
+    return df
+
+
+def tranches_age(engine):
+    """Répartition des clients de 17 à 47 ans par tranche d'âge."""
+    return cache_requetes.lire_sql(REQUETE_TRANCHES_AGE, engine)
@@ -0,0 +1,102 @@
+"""Photographies « à date » des indicateurs clients, pour une liste de dates de référence.
+
+Pour chaque date de référence et chaque client inscrit à cette date : âge,
+nombre de passages, jours depuis le dernier passage, statut actif/inactif et
+tranche de durée de fréquentation. Toutes les dates sont traitées en un seul
+balayage des visites triées par jour : entre deux dates de référence, seules
+les visites de l'intervalle mettent à jour les compteurs cumulés (sommes
+préfixes) et le dernier passage de chaque client. Un backtest sur 60 fins de
+mois coûte ainsi une lecture des visites plus 60 photographies vectorisées.
+"""
+
+import numpy as np
+import pandas as pd
+
+from arkose.frequentation import BORNES_ANCIENNETE, TRANCHES_ANCIENNETE
+from arkose.index_visites import en_jours
+
+SEUIL_JOURS_INACTIVITE = 90
+
+
+def _ages(naissance, date):
+    # Âge en années révolues à `date` (même règle que ajouter_age)
+    return ((date.year - naissance.dt.year) -
+            ((date.month < naissance.dt.month) |
+             ((date.month == naissance.dt.month) & (date.day < naissance.dt.day)))).to_numpy()
+
+
+def _entiers(valeurs, connues):
+    # Entiers nullables : NA là où la valeur n'est pas définie
+    return pd.arrays.IntegerArray(valeurs.astype(np.int64), ~connues)
+
+
+def instantanes(clients, index, dates_reference, seuil_inactivite=SEUIL_JOURS_INACTIVITE):
+    """Indicateurs de chaque client à chacune des `dates_reference`.
+
+    `clients` contient `ID Client`, `Date Inscription` et `Date de naissance`,
+    `index` est l'`IndexVisites` des passages. Renvoie un DataFrame long, une
+    ligne par (date de référence, client inscrit ou déjà venu à cette date).
+    """
+    dates = pd.DatetimeIndex(pd.to_datetime(dates_reference)).sort_values().unique()
+    n = len(clients)
+    ids = clients['ID Client'].to_numpy(dtype=np.int64)
+    inscription = en_jours(clients['Date Inscription'].dt.normalize()).astype(np.int64)
+    inscription_connue = clients['Date Inscription'].notna().to_numpy()
+    naissance = clients['Date de naissance']
+
+    # Visites triées par jour, rattachées à la ligne de leur client dans `clients`
+    ligne_client = pd.Series(np.arange(n), index=ids)
+    lignes_index = ligne_client.reindex(index.ids).fillna(-1).to_numpy(dtype=np.int64)
+    lignes = lignes_index[index.codes_visites]
+    ordre = np.argsort(index.jours, kind='stable')
+    jours = index.jours[ordre].astype(np.int64)
+    lignes = lignes[ordre]
+    connues = lignes >= 0
+    jours, lignes = jours[connues], lignes[connues]
+    bornes = np.searchsorted(jours, en_jours(dates).astype(np.int64), side='right')
+
+    nb_passages = np.zeros(n, dtype=np.int64)
+    dernier = np.full(n, np.iinfo(np.int64).min, dtype=np.int64)
+    resultats, debut = [], 0
+    for date, fin in zip(dates, bornes):
+        # Visites de l'intervalle ]date précédente, date]
+        np.maximum.at(dernier, lignes[debut:fin], jours[debut:fin])
+        nb_passages += np.bincount(lignes[debut:fin], minlength=n)
+        debut = fin
+
+        jour = int(en_jours(date))
+        presents = (inscription_connue & (inscription <= jour)) | (nb_passages > 0)
+        venus = nb_passages > 0
+        depuis = np.where(venus, jour - dernier, 0)
+        anciennete = np.where(venus & inscription_connue, dernier - inscription, 0)
+
+        resultats.append(pd.DataFrame({
+            'date_reference': date,
+            'ID Client': ids,
+            'age': _ages(naissance, date),
+            'nb_passages': nb_passages,
+            'jours_depuis_dernier_passage': _entiers(depuis, venus),
+            'actif': venus & (depuis <= seuil_inactivite),
+            'anciennete_jours': _entiers(anciennete, venus & inscription_connue),
+        })[presents])
+
+    if not resultats:
+        return pd.DataFrame(columns=['date_reference', 'ID Client', 'age', 'nb_passages',
+                                     'jours_depuis_dernier_passage', 'actif', 'anciennete_jours',
+                                     'tranche_anciennete'])
+    df = pd.concat(resultats, ignore_index=True)
+    df['tranche_anciennete'] = pd.cut(df['anciennete_jours'].astype('float64'), bins=BORNES_ANCIENNETE,
+                                      labels=TRANCHES_ANCIENNETE, right=False)
+    return df
+
+
+def synthese_par_date(df):
+    """Agrège les photographies : clients, actifs, taux d'inactivité et répartition des tranches."""
+    synthese = df.groupby('date_reference').agg(
+        clients=('ID Client', 'size'),
+        actifs=('actif', 'sum'),
+        age_moyen=('age', 'mean'),
+    )
+    synthese['taux_inactifs'] = 1 - synthese['actifs'] / synthese['clients']
+    tranches = df.groupby(['date_reference', 'tranche_anciennete'], observed=False).size().unstack(fill_value=0)
+    return synthese.join(tranches).reset_index()
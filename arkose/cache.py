@@ -0,0 +1,172 @@
+"""Cache disque (format colonnaire Feather) des jeux de données nettoyés.
+
+Chaque entrée est indexée par l'empreinte SHA-256 du fichier source et par
+`VERSION_PRETRAITEMENT` : modifier l'export ou le nettoyage suffit à la rendre
+caduque. Les tables sont relues en mémoire mappée.
+
+Invalidation manuelle : `python -m arkose.cache invalider`.
+"""
+
+import argparse
+import hashlib
+import json
+import os
+from pathlib import Path
+
+from arkose.ingestion import TAILLE_BLOC, ajouter_age, charger_clients, charger_passages
+
+# À incrémenter à chaque changement du nettoyage (schéma, dédoublonnage, âge...)
+VERSION_PRETRAITEMENT = 2
+
+REPERTOIRE_CACHE = Path('.cache_arkose')
+
+_INDEX_EMPREINTES = 'empreintes.json'
+
+
+def _pyarrow_feather():
+    try:
+        import pyarrow.feather as feather
+    except ImportError as exc:
+        raise ImportError("Le cache colonnaire nécessite pyarrow (pip install pyarrow)") from exc
+    return feather
+
+
+def empreinte_fichier(chemin, repertoire=REPERTOIRE_CACHE):
+    """SHA-256 du fichier `chemin`.
+
+    L'empreinte est mémorisée avec la taille et la date de modification du
+    fichier pour ne pas relire un export inchangé à chaque exécution.
+    """
+    chemin = Path(chemin).resolve()
+    statut = chemin.stat()
+    index_path = Path(repertoire) / _INDEX_EMPREINTES
+    index = json.loads(index_path.read_text()) if index_path.exists() else {}
+
+    connue = index.get(str(chemin))
+    if connue and connue['taille'] == statut.st_size and connue['mtime_ns'] == statut.st_mtime_ns:
+        return connue['sha256']
+
+    with open(chemin, 'rb') as f:
+        sha256 = hashlib.file_digest(f, 'sha256').hexdigest()
+
+    index[str(chemin)] = {'taille': statut.st_size, 'mtime_ns': statut.st_mtime_ns, 'sha256': sha256}
+    _ecrire_atomique(index_path, json.dumps(index, indent=1).encode())
+    return sha256
+
+
+def _ecrire_atomique(chemin, contenu):
+    chemin.parent.mkdir(parents=True, exist_ok=True)
+    temporaire = chemin.with_name(chemin.name + '.tmp')
+    temporaire.write_bytes(contenu)
+    os.replace(temporaire, chemin)
+
+
+def _cle(nom, chemin, repertoire, parametres):
+    empreinte = empreinte_fichier(chemin, repertoire)
+    suffixe = ''.join(f'-{k}={v}' for k, v in sorted(parametres.items()))
+    return f'{nom}-{empreinte[:16]}-v{VERSION_PRETRAITEMENT}{suffixe}'
+
+
+def charger_avec_cache(nom, chemin, chargeur, repertoire=REPERTOIRE_CACHE, **parametres):
+    """Renvoie `(df, rapport)` depuis le cache, ou via `chargeur(chemin)` à défaut.
+
+    `parametres` entre dans la clé du cache : il doit décrire tout ce qui,
+    en plus du fichier source, influence le résultat de `chargeur`.
+    """
+    feather = _pyarrow_feather()
+    repertoire = Path(repertoire)
+    cle = _cle(nom, chemin, repertoire, parametres)
+    fichier_table = repertoire / f'{cle}.feather'
+    fichier_rapport = repertoire / f'{cle}.json'
+
+    if fichier_table.exists() and fichier_rapport.exists():
+        table = feather.read_table(fichier_table, memory_map=True)
+        return table.to_pandas(), json.loads(fichier_rapport.read_text())
+
+    df, rapport = chargeur(chemin)
+
+    # Une seule version par jeu de données : les entrées périmées sont retirées
+    for ancien in repertoire.glob(f'{nom}-*'):
+        ancien.unlink()
+
+    repertoire.mkdir(parents=True, exist_ok=True)
+    temporaire = fichier_table.with_name(fichier_table.name + '.tmp')
+    feather.write_feather(df, temporaire, compression='uncompressed')
+    os.replace(temporaire, fichier_table)
+    _ecrire_atomique(fichier_rapport, json.dumps(rapport).encode())
+    return df, rapport
+
+
+def _parametres_controles(controles):
+    # Les contrôles complètent le rapport mis en cache : leurs clés entrent dans celle du cache
+    return {'controles': '+'.join(c.cle for c in controles)} if controles else {}
+
+
+def _repartir_controles(controles):
+    # Contrôles faits pendant l'ingestion (mis en cache), et contrôles sans clé, qui dépendent
+    # d'autres données que le fichier : refaits à chaque appel sur le tableau chargé
+    return [c for c in controles if c.cle is not None], [c for c in controles if c.cle is None]
+
+
+def _controler(resultat, controles):
+    df, rapport = resultat
+    for controle in controles:
+        controle(df, rapport)
+    return df, rapport
+
+
+def charger_clients_cache(chemin, date_reference=None, repertoire=REPERTOIRE_CACHE, taille_bloc=TAILLE_BLOC,
+                          controles=()):
+    """Clients nettoyés ; avec la colonne `age` calculée à `date_reference` si elle est fournie.
+
+    `controles` (voir `arkose.qualite`) portent un attribut `cle` : ceux qui
+    en ont une sont faits pendant l'ingestion et leurs compteurs conservés
+    dans le rapport mis en cache ; ceux dont la `cle` est None sont refaits à
+    chaque appel sur le tableau chargé.
+    """
+    controles, apres = _repartir_controles(controles)
+    parametres = _parametres_controles(controles)
+    if date_reference is None:
+        return _controler(charger_avec_cache('clients', chemin,
+                                             lambda c: charger_clients(c, taille_bloc, controles),
+                                             repertoire, **parametres), apres)
+
+    def chargeur(c):
+        clients, rapport = charger_clients(c, taille_bloc, controles)
+        return ajouter_age(clients, date_reference), rapport
+
+    return _controler(charger_avec_cache('clients', chemin, chargeur, repertoire,
+                                         reference=date_reference.strftime('%Y%m%d'), **parametres), apres)
+
+
+def charger_passages_cache(chemin, repertoire=REPERTOIRE_CACHE, taille_bloc=TAILLE_BLOC, controles=()):
+    """Passages nettoyés (`controles` : voir `charger_clients_cache`)."""
+    controles, apres = _repartir_controles(controles)
+    return _controler(charger_avec_cache('passages', chemin, lambda c: charger_passages(c, taille_bloc, controles),
+                                         repertoire, **_parametres_controles(controles)), apres)
+
+
+def invalider_cache(repertoire=REPERTOIRE_CACHE):
+    """Supprime toutes les entrées du cache et renvoie le nombre de fichiers retirés."""
+    repertoire = Path(repertoire)
+    if not repertoire.exists():
+        return 0
+    fichiers = [f for f in repertoire.rglob('*') if f.is_file()]
+    for f in fichiers:
+        f.unlink()
+    return len(fichiers)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(prog='python -m arkose.cache',
+                                     description="Gestion du cache des données nettoyées")
+    parser.add_argument('commande', choices=['invalider'])
+    parser.add_argument('--repertoire', default=REPERTOIRE_CACHE, type=Path)
+    args = parser.parse_args(argv)
+
+    if args.commande == 'invalider':
+        print(f"{invalider_cache(args.repertoire)} fichier(s) supprimé(s) de {args.repertoire}")
+
+
+if __name__ == '__main__':
+    main()
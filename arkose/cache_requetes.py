@@ -0,0 +1,127 @@
+"""Cache disque des résultats des requêtes d'analyse.
+
+Un résultat est indexé par le texte normalisé de la requête, la base visée
+et le filigrane des tables qu'elle lit : la version de chaque table dans
+`versions_tables` (incrémentée par le chargeur à chaque écriture), ou son
+nombre de lignes pour une table que le chargeur n'a jamais écrite, ainsi
+que l'identifiant de la base (`identite_base`), qui distingue une base
+recréée, dont les versions repartent de zéro, de la précédente. Un
+chargement de nouvelles données change le filigrane et rend donc caducs les
+résultats qui en dépendent, sans invalidation explicite.
+
+Les résultats sont conservés en pickle dans `.cache_arkose/requetes/` ; au-delà
+de `TAILLE_MAX` octets, les moins récemment utilisés sont supprimés.
+"""
+
+import hashlib
+import os
+import pickle
+import re
+from pathlib import Path
+
+from sqlalchemy import inspect, select, text
+
+from arkose import backend
+from arkose.cache import REPERTOIRE_CACHE, _ecrire_atomique
+from arkose.chargement import identite_base_table, versions_tables_table
+
+TAILLE_MAX = 256 * 1024 ** 2
+
+_TABLES = re.compile(r'\b(?:FROM|JOIN)\s+`?(\w+)`?', re.IGNORECASE)
+# Noms des expressions de table (WITH nom AS (...)), qui ne sont pas des tables de la base
+_EXPRESSIONS_TABLE = re.compile(r'\b(\w+)\s+AS\s*\(', re.IGNORECASE)
+
+
+def normaliser(sql):
+    """Texte de requête sans espaces superflus ni point-virgule final."""
+    return ' '.join(sql.split()).rstrip(';').rstrip()
+
+
+def tables_lues(sql):
+    return sorted(set(_TABLES.findall(sql)) - set(_EXPRESSIONS_TABLE.findall(sql)))
+
+
+def filigrane(conn, tables):
+    """Version (ou nombre de lignes à défaut) de chacune des `tables`."""
+    versions = {}
+    if inspect(conn).has_table(versions_tables_table.name):
+        colonnes = versions_tables_table.c
+        versions = dict(conn.execute(select(colonnes.nom_table, colonnes.version)
+                                     .where(colonnes.nom_table.in_(tables))).all())
+    preparateur = conn.dialect.identifier_preparer
+    return {t: versions[t] if t in versions else
+            ('lignes', conn.execute(text(f'SELECT COUNT(*) FROM {preparateur.quote(t)}')).scalar())
+            for t in tables}
+
+
+def identite_base(conn):
+    """Identifiant de la base tiré par `creer_schema` (None si le schéma n'a pas été créé par arkose)."""
+    if not inspect(conn).has_table(identite_base_table.name):
+        return None
+    return conn.execute(select(identite_base_table.c.identifiant)).scalar()
+
+
+class CacheRequetes:
+    """Résultats de requêtes mis en cache sur disque, avec éviction LRU."""
+
+    def __init__(self, repertoire=REPERTOIRE_CACHE / 'requetes', taille_max=TAILLE_MAX, actif=True):
+        self.repertoire = Path(repertoire)
+        self.taille_max = taille_max
+        self.actif = actif
+        self.statistiques = {'succes': 0, 'echecs': 0}
+
+    def _resultat(self, sql, engine, mode, executer):
+        if not self.actif:
+            return executer()
+
+        sql = normaliser(sql if isinstance(sql, str) else sql.text)
+        base = engine.url.render_as_string(hide_password=True)
+        cle = hashlib.sha256(f'{base}\n{mode}\n{sql}'.encode()).hexdigest()[:24]
+        with engine.connect() as conn:
+            version = (identite_base(conn), sorted(filigrane(conn, tables_lues(sql)).items()))
+        suffixe = hashlib.sha256(repr(version).encode()).hexdigest()[:12]
+        fichier = self.repertoire / f'{cle}-{suffixe}.pkl'
+
+        if fichier.exists():
+            self.statistiques['succes'] += 1
+            # La date de modification sert d'horodatage du dernier accès pour l'éviction
+            os.utime(fichier)
+            return pickle.loads(fichier.read_bytes())
+
+        self.statistiques['echecs'] += 1
+        resultat = executer()
+        # Les résultats calculés sur d'anciennes versions des tables sont retirés
+        for ancien in self.repertoire.glob(f'{cle}-*.pkl'):
+            ancien.unlink(missing_ok=True)
+        _ecrire_atomique(fichier, pickle.dumps(resultat))
+        self._evincer()
+        return resultat
+
+    def _evincer(self):
+        fichiers = [(f, f.stat()) for f in self.repertoire.glob('*.pkl')]
+        total = sum(statut.st_size for _, statut in fichiers)
+        for f, statut in sorted(fichiers, key=lambda fs: fs[1].st_mtime_ns):
+            if total <= self.taille_max:
+                break
+            f.unlink(missing_ok=True)
+            total -= statut.st_size
+
+    def lire_sql(self, sql, engine):
+        """Comme `arkose.backend.lire_sql`, avec mise en cache du DataFrame."""
+        return self._resultat(sql, engine, 'dataframe', lambda: backend.lire_sql(sql, engine))
+
+    def executer_scalaire(self, sql, engine):
+        """Comme `arkose.backend.executer_scalaire`, avec mise en cache de la valeur."""
+        return self._resultat(sql, engine, 'scalaire', lambda: backend.executer_scalaire(sql, engine))
+
+
+# Cache utilisé par les analyses (désactivable via `CACHE.actif = False`)
+CACHE = CacheRequetes()
+
+
+def lire_sql(sql, engine):
+    return CACHE.lire_sql(sql, engine)
+
+
+def executer_scalaire(sql, engine):
+    return CACHE.executer_scalaire(sql, engine)
@@ -0,0 +1,245 @@
+"""Chargement en masse des données nettoyées dans la base, par lots et en upsert.
+
+Les tables sont créées avec leurs clés et index (au lieu du `to_sql(...,
+if_exists='replace')` qui les recréait sans clé à chaque exécution) puis
+alimentées par lots en upsert : une ligne déjà présente est mise à jour, une
+nouvelle ligne est ajoutée, le reste de la table n'est pas touché. Les lots
+sont convertis colonne par colonne en types natifs et passés directement à
+l'`executemany` du pilote, sans la liaison ligne à ligne de SQLAlchemy.
+"""
+
+import time
+import uuid
+from contextlib import nullcontext
+from datetime import datetime
+
+import numpy as np
+import pandas as pd
+from sqlalchemy import (BigInteger, Column, DateTime, Index, Integer, MetaData,
+                        SmallInteger, String, Table, inspect, select)
+from sqlalchemy.dialects.mysql import insert as mysql_insert
+from sqlalchemy.dialects.sqlite import insert as sqlite_insert
+
+from arkose.tarifs import classes_tarif, dimension_tarifs
+
+TAILLE_LOT = 10_000
+
+metadata = MetaData()
+
+clients_table = Table(
+    'clients', metadata,
+    Column('ID Client', BigInteger, primary_key=True, autoincrement=False),
+    Column('Etablissement Inscription', String(100)),
+    Column('Date Inscription', DateTime),
+    Column('Date de naissance', DateTime),
+    Column('age', Integer),
+)
+
+# Colonnes d'un passage dans l'export : deux lignes identiques sur toutes ces
+# colonnes sont un doublon (voir `ingestion.iterer_blocs`)
+COLONNES_PASSAGE = ['Date Passage', 'Etablissement', 'ID Client', 'Type Forfait', 'Designation', 'Quantite']
+
+# La clé primaire est l'empreinte de la ligne entière (`empreintes_passages`) :
+# deux passages qui ne diffèrent que par le forfait ou la quantité restent
+# distincts, comme à la déduplication de l'ingestion
+passages_table = Table(
+    'passages', metadata,
+    # INTEGER sous SQLite : la clé est alors le rowid de la table, sans index séparé
+    Column('empreinte', BigInteger().with_variant(Integer, 'sqlite'), primary_key=True, autoincrement=False),
+    Column('ID Client', BigInteger, nullable=False),
+    Column('Date Passage', DateTime),
+    Column('Etablissement', String(100)),
+    Column('Designation', String(100)),
+    Column('Type Forfait', String(20)),
+    Column('Quantite', SmallInteger),
+    # Classe tarifaire (arkose/tarifs.py), renseignée au chargement
+    Column('classe_tarif', SmallInteger),
+    Index('ix_passages_client', 'ID Client', 'Date Passage'),
+    Index('ix_passages_date', 'Date Passage'),
+    Index('ix_passages_tarif', 'classe_tarif', 'Date Passage'),
+)
+
+# Dimension des désignations : une ligne par désignation distincte, avec sa classe tarifaire
+tarifs_table = Table(
+    'tarifs', metadata,
+    Column('Designation', String(100), primary_key=True),
+    Column('classe_tarif', SmallInteger, nullable=False),
+    Column('libelle', String(20)),
+)
+
+# Version de chaque table, incrémentée à chaque écriture par `charger_table` :
+# sert de filigrane au cache des résultats de requêtes (arkose/cache_requetes.py)
+versions_tables_table = Table(
+    'versions_tables', metadata,
+    Column('nom_table', String(64), primary_key=True),
+    Column('version', BigInteger),
+    Column('mis_a_jour', DateTime),
+)
+
+# Identité de la base, tirée à la création du schéma : les versions de
+# `versions_tables` repartent de zéro quand la base est recréée, l'identité
+# les distingue de celles de la base précédente
+identite_base_table = Table(
+    'identite_base', metadata,
+    Column('identifiant', String(32), primary_key=True),
+    Column('cree_le', DateTime),
+)
+
+
+def creer_schema(engine):
+    """Crée les tables et leurs index s'ils n'existent pas.
+
+    Une base neuve reçoit son identifiant (`identite_base`). Une table
+    héritée d'un ancien `to_sql` (sans clé primaire) est recréée ; une table
+    `passages` d'un schéma antérieur (sans `empreinte`) est recréée et
+    rechargée avec ses lignes, classe tarifaire et empreinte comprises.
+    """
+    with engine.begin() as conn:
+        inspecteur = inspect(conn)
+        existantes = {t.name for t in metadata.sorted_tables if inspecteur.has_table(t.name)}
+        for table in metadata.sorted_tables:
+            if table.name in existantes and not inspecteur.get_pk_constraint(table.name)['constrained_columns']:
+                table.drop(conn)
+                existantes.discard(table.name)
+        anciens_passages = None
+        if (passages_table.name in existantes and 'empreinte' not in
+                {c['name'] for c in inspecteur.get_columns(passages_table.name)}):
+            ancienne = Table(passages_table.name, MetaData(), autoload_with=conn)
+            anciens_passages = pd.read_sql(select(*[ancienne.c[c] for c in COLONNES_PASSAGE]), conn,
+                                           parse_dates=['Date Passage'])
+            ancienne.drop(conn)
+        metadata.create_all(conn)
+        if conn.execute(select(identite_base_table.c.identifiant)).first() is None:
+            conn.execute(identite_base_table.insert().values(identifiant=uuid.uuid4().hex, cree_le=datetime.now()))
+        if anciens_passages is not None:
+            charger_table(engine, preparer_passages(engine, anciens_passages, conn), passages_table, conn=conn)
+
+
+def requete_upsert(engine, table, cumuler=(), colonnes=None):
+    """INSERT multi-lignes de `table` mettant à jour les lignes déjà présentes.
+
+    Seules les `colonnes` fournies (toutes par défaut) sont mises à jour. Les
+    colonnes de `cumuler` sont additionnées à la valeur existante au lieu de
+    la remplacer (mise à jour d'agrégats par différence).
+    """
+    cles = [c.name for c in table.primary_key.columns]
+    autres = [c.name for c in table.columns if c.name not in cles and (colonnes is None or c.name in colonnes)]
+
+    def valeurs(nouvelles):
+        return {c: table.c[c] + nouvelles[c] if c in cumuler else nouvelles[c] for c in autres}
+
+    if engine.dialect.name == 'mysql':
+        stmt = mysql_insert(table)
+        if not autres:
+            return stmt.prefix_with('IGNORE')
+        return stmt.on_duplicate_key_update(valeurs(stmt.inserted))
+
+    if engine.dialect.name == 'sqlite':
+        stmt = sqlite_insert(table)
+        if not autres:
+            return stmt.on_conflict_do_nothing(index_elements=cles)
+        return stmt.on_conflict_do_update(index_elements=cles, set_=valeurs(stmt.excluded))
+
+    raise NotImplementedError(f"Upsert non pris en charge pour le dialecte {engine.dialect.name!r}")
+
+
+def _valeurs(serie, colonne, dialecte):
+    # Valeurs natives d'une colonne pour le pilote (NaN/NaT -> NULL, catégories -> texte)
+    if isinstance(serie.dtype, pd.CategoricalDtype):
+        # Le code -1 (valeur absente) tombe sur le dernier élément, None
+        categories = np.append(serie.cat.categories.to_numpy(dtype=object), None)
+        return categories[serie.cat.codes.to_numpy()].tolist()
+    absentes = serie.isna().to_numpy()
+    if pd.api.types.is_datetime64_any_dtype(serie.dtype):
+        if dialecte.name == 'sqlite':
+            # Format de stockage du type DateTime de SQLAlchemy pour SQLite
+            dates = np.datetime_as_string(serie.to_numpy(dtype='datetime64[us]'), unit='us')
+            valeurs = np.char.replace(dates.astype(str), 'T', ' ').astype(object)
+        else:
+            valeurs = np.asarray(serie.dt.to_pydatetime(), dtype=object)
+    elif pd.api.types.is_numeric_dtype(serie.dtype) and not absentes.any():
+        return serie.tolist()
+    else:
+        valeurs = np.array(serie, dtype=object)
+        processeur = colonne.type.dialect_impl(dialecte).bind_processor(dialecte)
+        if processeur is not None:
+            valeurs = np.array([None if a else processeur(v) for v, a in zip(valeurs, absentes)], dtype=object)
+    valeurs[absentes] = None
+    return valeurs.tolist()
+
+
+def _lignes(engine, table, df, colonnes):
+    # Tuples dans l'ordre des paramètres de la requête compilée
+    return list(zip(*[_valeurs(df[c], table.c[c], engine.dialect) for c in colonnes]))
+
+
+def charger_table(engine, df, table, taille_lot=TAILLE_LOT, cumuler=(), conn=None):
+    """Upsert de `df` dans `table` par lots de `taille_lot` lignes.
+
+    Sans `conn`, le chargement se fait dans sa propre transaction. La
+    version de la table est incrémentée dans la même transaction. Renvoie
+    les statistiques du chargement (lignes, durée, lignes/s).
+    """
+    colonnes = [c.name for c in table.columns if c.name in df.columns]
+    requete = requete_upsert(engine, table, cumuler, colonnes).compile(dialect=engine.dialect, column_keys=colonnes)
+    colonnes = list(requete.positiontup)
+
+    debut = time.perf_counter()
+    with (engine.begin() if conn is None else nullcontext(conn)) as conn:
+        for i in range(0, len(df), taille_lot):
+            conn.exec_driver_sql(str(requete), _lignes(engine, table, df.iloc[i:i + taille_lot], colonnes))
+        if len(df):
+            incrementer_version(engine, conn, table.name)
+    duree = time.perf_counter() - debut
+
+    return {
+        'table': table.name,
+        'lignes': len(df),
+        'secondes': duree,
+        'lignes_par_seconde': len(df) / duree if duree > 0 else float('inf'),
+    }
+
+
+def incrementer_version(engine, conn, nom_table):
+    """Signale une écriture dans `nom_table` (invalide les résultats de requêtes en cache)."""
+    conn.execute(requete_upsert(engine, versions_tables_table, cumuler=('version',)),
+                 [{'nom_table': nom_table, 'version': 1, 'mis_a_jour': datetime.now()}])
+
+
+def empreintes_passages(passages):
+    """Empreinte 64 bits (signée) de chaque passage, sur toutes les colonnes de `COLONNES_PASSAGE`.
+
+    Les colonnes sont ramenées à des types fixes avant le calcul : un même
+    passage a la même empreinte qu'il vienne d'un CSV typé ou de la base.
+    """
+    canoniques = pd.DataFrame({
+        'Date Passage': pd.to_datetime(passages['Date Passage']).to_numpy(dtype='datetime64[ns]').view(np.int64),
+        'Etablissement': passages['Etablissement'].astype(object),
+        'ID Client': passages['ID Client'].to_numpy(dtype=np.int64),
+        'Type Forfait': passages['Type Forfait'].astype(object),
+        'Designation': passages['Designation'].astype(object),
+        'Quantite': passages['Quantite'].astype(np.float64).to_numpy(),
+    })
+    return pd.util.hash_pandas_object(canoniques, index=False).to_numpy().view(np.int64)
+
+
+def classer_passages(engine, passages, conn):
+    """Ajoute `classe_tarif` aux passages et enregistre leurs désignations dans `tarifs`."""
+    charger_table(engine, dimension_tarifs(passages['Designation']), tarifs_table, conn=conn)
+    return passages.assign(classe_tarif=classes_tarif(passages['Designation']).to_numpy())
+
+
+def preparer_passages(engine, passages, conn):
+    """Passages prêts pour `passages_table` : classe tarifaire et empreinte (clé primaire)."""
+    return classer_passages(engine, passages, conn).assign(empreinte=empreintes_passages(passages))
+
+
+def charger_donnees(engine, clients, passages, taille_lot=TAILLE_LOT):
+    """Crée le schéma si besoin puis charge clients et passages."""
+    creer_schema(engine)
+    with engine.begin() as conn:
+        passages = preparer_passages(engine, passages, conn)
+    return [
+        charger_table(engine, clients, clients_table, taille_lot),
+        charger_table(engine, passages, passages_table, taille_lot),
+    ]
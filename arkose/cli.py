@@ -0,0 +1,342 @@
+"""Point d'entrée en ligne de commande : exécution sans affichage des étapes de l'étude.
+
+    arkose --clients clients.csv --passages passages.csv --sortie sortie/
+    arkose --etapes age,tarif_reduit --sans-graphiques
+
+Les tableaux sont écrits en CSV, les indicateurs dans `metriques.json`, le
+contrôle de qualité des exports dans `qualite.json` et les graphiques dans
+`figures/`. Les mesures de chaque étape (temps, CPU, mémoire,
+lignes, SQL) sont ajoutées à `instrumentation.jsonl` et exposées dans
+`metriques.prom` (format texte Prometheus). pandas, SQLAlchemy et matplotlib ne sont importés
+que par les étapes qui en ont besoin.
+"""
+
+import argparse
+import json
+import sys
+import threading
+import time
+from datetime import date
+from pathlib import Path
+
+from arkose.instrumentation import Instrumentation, lignes
+
+CLIENTS_PAR_DEFAUT = 'arkose - data analyst test - clients.csv'
+PASSAGES_PAR_DEFAUT = 'arkose - data analyst test - passages.csv'
+DATE_REFERENCE_PAR_DEFAUT = '2022-12-31'
+
+
+class Contexte:
+    """Paramètres de l'exécution et ressources partagées entre les étapes."""
+
+    def __init__(self, args):
+        self.args = args
+        self.sortie = Path(args.sortie)
+        self.metriques = {}
+        self.figures = {}
+        self._engine = None
+        self._donnees = None
+        self.rapports = {}
+        self._index = None
+        # Les étapes s'exécutent en parallèle : les ressources partagées sont créées une seule fois
+        self._verrou = threading.RLock()
+
+    def charger_donnees(self):
+        """Clients (avec leur âge à la date de référence) et passages nettoyés, lus une fois."""
+        with self._verrou:
+            if self._donnees is None:
+                import pandas as pd
+
+                from arkose.qualite import controle_ages, controle_orphelins
+
+                # Contrôles de qualité faits pendant l'ingestion (voir etape_qualite)
+                date_reference = pd.Timestamp(self.args.date_reference)
+                if self.args.sans_cache:
+                    from arkose.ingestion import ajouter_age, charger_clients, charger_passages
+                    clients, rapport_clients = charger_clients(self.args.clients,
+                                                               controles=[controle_ages(date_reference)])
+                    clients = ajouter_age(clients, date_reference)
+                    passages, rapport_passages = charger_passages(
+                        self.args.passages, controles=[controle_orphelins(clients['ID Client'])])
+                else:
+                    from arkose.cache import charger_clients_cache, charger_passages_cache
+                    clients, rapport_clients = charger_clients_cache(self.args.clients, date_reference,
+                                                                     controles=[controle_ages(date_reference)])
+                    passages, rapport_passages = charger_passages_cache(
+                        self.args.passages, controles=[controle_orphelins(clients['ID Client'])])
+                self.rapports = {'clients': rapport_clients, 'passages': rapport_passages}
+                self._donnees = clients, passages
+                lignes(entree=len(clients) + len(passages))
+            return self._donnees
+
+    @property
+    def index(self):
+        """Index compact des visites par client, construit à la première utilisation."""
+        with self._verrou:
+            if self._index is None:
+                from arkose.index_visites import IndexVisites
+                self._index = IndexVisites.depuis_passages(self.charger_donnees()[1])
+            return self._index
+
+    @property
+    def engine(self):
+        # Pool borné à une connexion par étape simultanée, réutilisées d'une étape à l'autre
+        with self._verrou:
+            if self._engine is None:
+                from arkose.backend import creer_moteur
+                self._engine = creer_moteur(self.args.url, connexions=self.args.paralleles)
+            return self._engine
+
+    def ecrire_table(self, nom, df):
+        df.to_csv(self.sortie / f'{nom}.csv', index=False)
+        lignes(sortie=len(df))
+
+    def ecrire_figure(self, nom, fabrique, donnees):
+        # Les figures sont dessinées ensemble, en parallèle, après les étapes (voir rendre)
+        if not self.args.sans_graphiques:
+            self.figures[nom] = (fabrique, donnees)
+
+    def rendre(self):
+        if not self.figures:
+            return {}
+        from arkose.rendu import rendre_figures
+        return rendre_figures(self.figures, self.sortie / 'figures', self.args.formats, self.args.processus)
+
+
+def etape_qualite(ctx):
+    from arkose.qualite import rapport_qualite
+
+    # Rapport tiré de l'ingestion partagée avec les autres étapes : pas de lecture supplémentaire
+    ctx.charger_donnees()
+    rapport = rapport_qualite(ctx.rapports['clients'], ctx.rapports['passages'], ctx.args.date_reference)
+    (ctx.sortie / 'qualite.json').write_text(json.dumps(rapport, indent=2, ensure_ascii=False), encoding='utf-8')
+    ctx.metriques['qualite'] = {
+        'doublons_passages': rapport['passages']['doublons'],
+        'dates_invalides': sum(rapport['clients']['dates_invalides'].values())
+        + sum(rapport['passages']['dates_invalides'].values()),
+        'ages_incoherents': rapport['clients']['ages_incoherents'],
+        'passages_orphelins': rapport['passages']['passages_orphelins'],
+    }
+
+
+def etape_chargement(ctx):
+    from arkose.chargement import charger_table, clients_table, creer_schema
+    from arkose.incremental import ingerer_passages
+
+    clients, passages = ctx.charger_donnees()
+    creer_schema(ctx.engine)
+    stats = charger_table(ctx.engine, clients, clients_table)
+    # Passages déjà lus par charger_donnees : l'export n'est pas relu
+    ingestion = ingerer_passages(ctx.engine, ctx.args.passages,
+                                 ingestion=(passages, ctx.rapports['passages']))
+    lignes(sortie=stats['lignes'] + ingestion['nouveaux_passages'])
+    ctx.metriques['chargement'] = {
+        'clients': stats['lignes'],
+        'nouveaux_passages': ingestion['nouveaux_passages'],
+        'dernier_passage': str(ingestion['derniere_date']),
+    }
+
+
+def etape_age(ctx):
+    from arkose import analyses
+    ctx.metriques['age_moyen'] = analyses.age_moyen(ctx.engine)
+
+
+def etape_tarif_reduit(ctx):
+    from arkose import analyses
+    ctx.metriques['proportion_tarif_reduit'] = analyses.proportion_tarif_reduit(ctx.engine)
+    ctx.ecrire_table('repartition_tarifs', analyses.repartition_tarifs(ctx.engine))
+    ctx.ecrire_table('frequentation_par_tarif', analyses.frequentation_par_tarif(ctx.engine))
+
+
+def etape_frequentation(ctx):
+    from arkose import analyses
+    df = analyses.frequentation_mensuelle(ctx.engine)
+    ctx.ecrire_table('frequentation_mensuelle', df)
+    ctx.ecrire_figure('frequentation_mensuelle', 'figure_frequentation_mensuelle', df)
+
+
+def etape_inscriptions(ctx):
+    from arkose import analyses
+    repartition = analyses.repartition_inscriptions(ctx.engine)
+    ctx.ecrire_table('inscriptions', repartition.rename('clients').reset_index())
+    ctx.ecrire_figure('inscriptions', 'figure_inscriptions', repartition)
+
+
+def etape_anciennete(ctx):
+    from arkose import analyses
+    repartition = analyses.repartition_anciennete(ctx.engine)
+    ctx.ecrire_table('anciennete', repartition)
+    ctx.ecrire_figure('anciennete', 'figure_anciennete', repartition)
+
+
+def etape_profil(ctx):
+    from arkose import analyses
+    statistiques = analyses.profil_mensuel(ctx.engine)
+    ctx.ecrire_table('profil_mensuel', statistiques)
+    ctx.ecrire_figure('profil_mensuel', 'figure_profil_mensuel', statistiques)
+
+
+def etape_forfaits(ctx):
+    from arkose import analyses
+    df = analyses.types_forfaits(ctx.engine)
+    ctx.ecrire_table('forfaits', df)
+    ctx.ecrire_figure('forfaits', 'figure_forfaits', df)
+
+
+def etape_tranches_age(ctx):
+    from arkose import analyses
+    df = analyses.tranches_age(ctx.engine)
+    ctx.ecrire_table('tranches_age', df)
+    ctx.ecrire_figure('tranches_age', 'figure_tranches_age', df)
+
+
+def etape_cohortes(ctx):
+    from arkose.cohortes import matrice_retention
+    clients, _ = ctx.charger_donnees()
+    df = matrice_retention(clients, ctx.index)
+    ctx.ecrire_table('retention_cohortes', df)
+    ensemble = matrice_retention(clients, ctx.index, par_etablissement=False)
+    ctx.ecrire_figure('retention_cohortes', 'figure_retention', ensemble)
+
+
+def etape_features(ctx):
+    # Seuls les mois complets à la date de référence sont ajoutés au panel
+    from datetime import timedelta
+    from arkose.features import ouvrir_ou_creer
+    panel = ouvrir_ou_creer(ctx.sortie / 'features', ctx.index)
+    ajoutes = panel.mettre_a_jour(ctx.index, ctx.args.date_reference + timedelta(days=1))
+    ctx.metriques['features'] = {'mois': panel.n_mois, 'mois_ajoutes': ajoutes, 'clients': panel.n_clients}
+
+
+def etape_scores(ctx):
+    from arkose.scores import clients_a_risque, enregistrer_scores, score_clients
+    scores = score_clients(ctx.index, ctx.args.date_reference)
+    liste = clients_a_risque(scores)
+    ctx.ecrire_table('clients_a_risque', liste)
+    enregistrer_scores(ctx.engine, scores, ctx.args.date_reference)
+    ctx.metriques['scores'] = {'clients_scores': len(scores), 'clients_a_risque': len(liste)}
+
+
+# Étapes dans leur ordre d'exécution
+ETAPES = {
+    'qualite': etape_qualite,
+    'chargement': etape_chargement,
+    'age': etape_age,
+    'tarif_reduit': etape_tarif_reduit,
+    'frequentation': etape_frequentation,
+    'inscriptions': etape_inscriptions,
+    'anciennete': etape_anciennete,
+    'profil': etape_profil,
+    'forfaits': etape_forfaits,
+    'tranches_age': etape_tranches_age,
+    'cohortes': etape_cohortes,
+    'features': etape_features,
+    'scores': etape_scores,
+}
+
+# Étapes à attendre avant de lancer chaque étape (quand elles sont demandées) :
+# les analyses lisent la base alimentée par le chargement, l'enregistrement des
+# scores y écrit après lui. Les autres étapes travaillent sur les fichiers.
+DEPENDANCES = {
+    'age': ['chargement'],
+    'tarif_reduit': ['chargement'],
+    'frequentation': ['chargement'],
+    'inscriptions': ['chargement'],
+    'anciennete': ['chargement'],
+    'profil': ['chargement'],
+    'forfaits': ['chargement'],
+    'tranches_age': ['chargement'],
+    'scores': ['chargement'],
+}
+
+
+def _liste_etapes(valeur):
+    etapes = [e.strip() for e in valeur.split(',') if e.strip()]
+    inconnues = [e for e in etapes if e not in ETAPES]
+    if inconnues:
+        raise argparse.ArgumentTypeError(
+            f"étape(s) inconnue(s) : {', '.join(inconnues)} (choix : {', '.join(ETAPES)})")
+    return etapes
+
+
+def _date(valeur):
+    try:
+        return date.fromisoformat(valeur)
+    except ValueError:
+        raise argparse.ArgumentTypeError(f"date invalide (AAAA-MM-JJ attendu) : {valeur!r}") from None
+
+
+def construire_parser():
+    parser = argparse.ArgumentParser(prog='arkose', description="Étude de fidélisation Arkose, en mode batch")
+    parser.add_argument('--clients', default=CLIENTS_PAR_DEFAUT, type=Path, help="export CSV des clients")
+    parser.add_argument('--passages', default=PASSAGES_PAR_DEFAUT, type=Path, help="export CSV des passages")
+    parser.add_argument('--date-reference', default=_date(DATE_REFERENCE_PAR_DEFAUT), type=_date,
+                        help="date de calcul des âges (AAAA-MM-JJ)")
+    parser.add_argument('--url', default=None, help="URL SQLAlchemy de la base (SQLite local par défaut)")
+    parser.add_argument('--sortie', default='sortie', type=Path, help="répertoire des résultats")
+    parser.add_argument('--etapes', default=list(ETAPES), type=_liste_etapes,
+                        help=f"étapes à exécuter, séparées par des virgules ({', '.join(ETAPES)})")
+    parser.add_argument('--formats', default=['png'], type=lambda v: v.split(','),
+                        help="formats des graphiques (ex : png,svg)")
+    parser.add_argument('--sans-graphiques', action='store_true', help="ne produit pas les graphiques")
+    parser.add_argument('--processus', default=None, type=int,
+                        help="nombre de processus de rendu des graphiques (par défaut : un par figure, au plus un par cœur)")
+    parser.add_argument('--paralleles', default=4, type=int,
+                        help="nombre d'étapes indépendantes exécutées simultanément (1 : séquentiel)")
+    parser.add_argument('--profiler', default=None, choices=[*ETAPES, 'graphiques'], metavar='ETAPE',
+                        help="profile une étape (profil écrit dans profils/)")
+    parser.add_argument('--profileur', default='cprofile', choices=['cprofile', 'echantillonnage'],
+                        help="cprofile, ou échantillonnage avec pyinstrument")
+    parser.add_argument('--sans-cache', action='store_true', help="n'utilise ni le cache des données nettoyées ni celui des requêtes")
+    parser.add_argument('--invalider-cache', action='store_true', help="vide le cache avant l'exécution")
+    return parser
+
+
+def main(argv=None):
+    args = construire_parser().parse_args(argv)
+    ctx = Contexte(args)
+    ctx.sortie.mkdir(parents=True, exist_ok=True)
+    instrumentation = Instrumentation(args.profiler, args.profileur, ctx.sortie / 'profils')
+
+    if args.sans_cache:
+        from arkose import cache_requetes
+        cache_requetes.CACHE.actif = False
+    if args.invalider_cache:
+        from arkose.cache import invalider_cache
+        invalider_cache()
+
+    from arkose.ordonnanceur import executer_etapes
+
+    debut = time.perf_counter()
+    durees = executer_etapes({nom: instrumentation.envelopper(nom, ETAPES[nom]) for nom in args.etapes},
+                             DEPENDANCES, ctx,
+                             max(args.paralleles, 1),
+                             rapport=lambda nom, secondes: print(f"{nom} : {secondes:.2f} s", file=sys.stderr))
+    total = time.perf_counter() - debut
+    print(f"étapes : {total:.2f} s (somme des étapes : "
+          f"{sum(d['secondes'] for d in durees.values()):.2f} s)", file=sys.stderr)
+    ctx.metriques['durees_etapes'] = {nom: round(durees[nom]['secondes'], 3) for nom in args.etapes}
+
+    debut = time.perf_counter()
+    with instrumentation.etape('graphiques') as etape:
+        figures = ctx.rendre()
+        etape.lignes(sortie=len(figures))
+    if figures:
+        reutilisees = sum(f['reutilisee'] for f in figures.values())
+        print(f"graphiques : {time.perf_counter() - debut:.2f} s "
+              f"({len(figures) - reutilisees} dessiné(s), {reutilisees} réutilisé(s))", file=sys.stderr)
+
+    # Les indicateurs des étapes non exécutées lors de ce lancement sont conservés
+    fichier_metriques = ctx.sortie / 'metriques.json'
+    metriques = json.loads(fichier_metriques.read_text(encoding='utf-8')) if fichier_metriques.exists() else {}
+    metriques.update(ctx.metriques)
+    fichier_metriques.write_text(json.dumps(metriques, indent=2, ensure_ascii=False, default=str), encoding='utf-8')
+
+    instrumentation.exporter_jsonl(ctx.sortie / 'instrumentation.jsonl')
+    instrumentation.ecrire_prometheus(ctx.sortie / 'metriques.prom')
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,96 @@
+"""Matrice de rétention des cohortes d'inscription (mois d'inscription x mois écoulés).
+
+Un client de la cohorte du mois M est actif au mois M + k s'il a au moins un
+passage ce mois-là. Tout le calcul se fait sur des numéros de mois entiers :
+les couples (client, k) distincts sont obtenus sans tri (les visites de
+l'index sont déjà triées par client et par date), puis comptés par
+`np.bincount` pour toutes les cohortes et tous les établissements à la fois.
+"""
+
+import numpy as np
+import pandas as pd
+
+from arkose.index_visites import jours_en_mois
+
+TOUS_ETABLISSEMENTS = 'Tous'
+
+
+def _mois(dates):
+    return (dates.dt.year * 12 + dates.dt.month - 1).to_numpy()
+
+
+def matrice_retention(clients, index, par_etablissement=True, horizon=None):
+    """Table longue de la rétention par cohorte.
+
+    `clients` contient `ID Client`, `Date Inscription` (et `Etablissement
+    Inscription` si `par_etablissement`), `index` est l'`IndexVisites` des
+    passages. Renvoie une ligne par (établissement, cohorte, mois depuis
+    l'inscription) observable, avec `clients_actifs`, `taille_cohorte` et
+    `taux_retention`. `horizon` limite le nombre de mois suivis.
+    """
+    clients = clients[clients['Date Inscription'].notna()]
+    n = len(clients)
+    mois_inscription = _mois(clients['Date Inscription']).astype(np.int64)
+    premier_mois = int(mois_inscription.min()) if n else 0
+    cohorte = mois_inscription - premier_mois
+    n_cohortes = int(cohorte.max()) + 1 if n else 0
+
+    if par_etablissement:
+        etablissements, groupe = np.unique(clients['Etablissement Inscription'].astype(str).to_numpy(),
+                                           return_inverse=True)
+    else:
+        etablissements, groupe = np.array([TOUS_ETABLISSEMENTS]), np.zeros(n, dtype=np.int64)
+    # Identifiant dense (établissement, cohorte) de chaque client
+    groupe_cohorte = groupe.astype(np.int64) * n_cohortes + cohorte
+    n_groupes = len(etablissements) * n_cohortes
+
+    # Visites rattachées à leur client ; les clients inconnus sont ignorés
+    ligne_client = pd.Series(np.arange(n), index=clients['ID Client'].to_numpy(dtype=np.int64))
+    lignes_index = ligne_client.reindex(index.ids).fillna(-1).to_numpy(dtype=np.int64)
+    lignes = lignes_index[index.codes_visites]
+    mois_visite = jours_en_mois(index.jours)
+    dernier_mois_observe = int(mois_visite.max()) if len(mois_visite) else premier_mois
+
+    connues = lignes >= 0
+    lignes, mois_visite = lignes[connues], mois_visite[connues]
+    ecart = mois_visite - mois_inscription[lignes]
+    gardees = ecart >= 0
+    if horizon is not None:
+        gardees &= ecart <= horizon
+    lignes, ecart = lignes[gardees], ecart[gardees]
+
+    # Couples (client, mois écoulé) distincts : les visites sont triées par
+    # client puis par date, les doublons sont donc consécutifs
+    distincts = np.ones(len(lignes), dtype=bool)
+    distincts[1:] = (lignes[1:] != lignes[:-1]) | (ecart[1:] != ecart[:-1])
+    lignes, ecart = lignes[distincts], ecart[distincts]
+
+    n_ecarts = dernier_mois_observe - premier_mois + 1
+    if horizon is not None:
+        n_ecarts = min(n_ecarts, horizon + 1)
+    actifs = np.bincount(groupe_cohorte[lignes] * n_ecarts + ecart,
+                         minlength=n_groupes * n_ecarts).reshape(n_groupes, n_ecarts)
+    tailles = np.bincount(groupe_cohorte, minlength=n_groupes)
+
+    # Mise en forme longue : seules les cases observables des cohortes non vides
+    g, k = np.divmod(np.arange(n_groupes * n_ecarts), n_ecarts)
+    cohorte_g = g % n_cohortes
+    observables = (tailles[g] > 0) & (premier_mois + cohorte_g + k <= dernier_mois_observe)
+    g, k, cohorte_g = g[observables], k[observables], cohorte_g[observables]
+
+    mois_cohorte = premier_mois + cohorte_g
+    df = pd.DataFrame({
+        'Etablissement Inscription': etablissements[g // n_cohortes],
+        'cohorte': pd.PeriodIndex.from_fields(year=mois_cohorte // 12, month=mois_cohorte % 12 + 1, freq='M'),
+        'mois_depuis_inscription': k,
+        'clients_actifs': actifs[g, k],
+        'taille_cohorte': tailles[g],
+    })
+    df['taux_retention'] = df['clients_actifs'] / df['taille_cohorte']
+    return df
+
+
+def pivot_retention(df, etablissement=TOUS_ETABLISSEMENTS):
+    """Vue cohorte x mois écoulés des taux de rétention d'un établissement."""
+    return (df[df['Etablissement Inscription'] == etablissement]
+            .pivot(index='cohorte', columns='mois_depuis_inscription', values='taux_retention'))
@@ -0,0 +1,378 @@
+"""Esquisses (sketches) en mémoire constante pour le tableau de bord d'activité.
+
+    python -m arkose.esquisses clients.csv passages.csv --etat esquisses.json --verifier
+
+Les passages sont lus en flux (dans l'ordre chronologique des exports) et
+résumés, pour chaque mois et chaque établissement, par trois esquisses :
+
+- `HyperLogLog` des clients distincts : 2^14 registres, erreur relative type
+  1,04 / sqrt(2^14) ≈ 0,8 % (moins de 2,5 % dans 99 % des cas) ;
+- `EsquisseQuantiles` du nombre de visites de chaque client actif dans le
+  mois, et de son ancienneté (jours entre l'inscription et son dernier
+  passage du mois) : histogramme à classes logarithmiques, dont chaque
+  quantile est à moins de `alpha` (1 %) en valeur relative du quantile exact
+  de même rang. La répartition par tranches d'ancienneté qui s'en déduit
+  n'est inexacte que pour les valeurs à moins de 1 % d'une borne de tranche.
+
+Les états de plusieurs établissements se combinent sans perte par
+`fusionner` (maximum des registres, somme des compteurs, et regroupement par
+client des comptes du mois encore ouvert). Fusionnées entre établissements,
+les esquisses de visites et d'ancienneté comptent un client une fois par
+établissement fréquenté ; entre mois, une fois par mois actif. Un mois
+clôturé ne se reconstitue pas à partir d'esquisses journalières : les
+visites par client ne s'additionnent pas d'une esquisse à l'autre.
+
+Seuls les comptes par client du mois en cours sont conservés en clair, le
+temps que le mois se termine (`cloturer` les verse dans les esquisses).
+"""
+
+import argparse
+import base64
+import json
+import math
+import zlib
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+
+from arkose.frequentation import BORNES_ANCIENNETE, TRANCHES_ANCIENNETE
+
+PRECISION_HLL = 14
+ALPHA = 0.01
+
+
+def _longueur_bits(valeurs):
+    # Nombre de bits significatifs de chaque entier non signé 64 bits
+    valeurs = valeurs.copy()
+    longueurs = np.zeros(valeurs.shape, dtype=np.int64)
+    for decalage in (32, 16, 8, 4, 2, 1):
+        grands = valeurs >= (np.uint64(1) << np.uint64(decalage))
+        longueurs[grands] += decalage
+        valeurs[grands] >>= np.uint64(decalage)
+    return longueurs + (valeurs > 0)
+
+
+class HyperLogLog:
+    """Nombre approximatif d'éléments distincts, en 2^`precision` octets."""
+
+    def __init__(self, precision=PRECISION_HLL, registres=None):
+        self.precision = precision
+        self.registres = np.zeros(1 << precision, dtype=np.uint8) if registres is None else registres
+
+    @property
+    def erreur_type(self):
+        return 1.04 / math.sqrt(len(self.registres))
+
+    def ajouter(self, ids):
+        """Ajoute des identifiants entiers (empreinte `pd.util.hash_array`, identique partout)."""
+        empreintes = pd.util.hash_array(np.asarray(ids, dtype=np.int64))
+        bits_restants = 64 - self.precision
+        indices = (empreintes >> np.uint64(bits_restants)).astype(np.int64)
+        reste = empreintes & np.uint64((1 << bits_restants) - 1)
+        # Position du premier bit à 1 dans les bits restants
+        rangs = (bits_restants - _longueur_bits(reste) + 1).astype(np.uint8)
+        np.maximum.at(self.registres, indices, rangs)
+        return self
+
+    def fusionner(self, autre):
+        if autre.precision != self.precision:
+            raise ValueError("Précisions HyperLogLog différentes")
+        np.maximum(self.registres, autre.registres, out=self.registres)
+        return self
+
+    def estimation(self):
+        m = len(self.registres)
+        brute = 0.7213 / (1 + 1.079 / m) * m * m / np.sum(np.ldexp(1.0, -self.registres.astype(np.int64)))
+        vides = int(np.count_nonzero(self.registres == 0))
+        # Petits effectifs : comptage linéaire des registres vides
+        if brute <= 2.5 * m and vides:
+            return m * math.log(m / vides)
+        return float(brute)
+
+    def vers_dict(self):
+        return {'precision': self.precision,
+                'registres': base64.b64encode(zlib.compress(self.registres.tobytes())).decode()}
+
+    @classmethod
+    def depuis_dict(cls, d):
+        registres = np.frombuffer(zlib.decompress(base64.b64decode(d['registres'])), dtype=np.uint8).copy()
+        return cls(d['precision'], registres)
+
+
+class EsquisseQuantiles:
+    """Quantiles de valeurs positives à `alpha` près en valeur relative.
+
+    Chaque valeur x > 0 est comptée dans la classe ceil(log_gamma(x)), avec
+    gamma = (1 + alpha) / (1 - alpha) ; les zéros sont comptés à part. Le
+    nombre de classes croît comme le logarithme de l'étendue des valeurs.
+    """
+
+    def __init__(self, alpha=ALPHA, zeros=0, compteurs=None):
+        self.alpha = alpha
+        self.gamma = (1 + alpha) / (1 - alpha)
+        self.zeros = zeros
+        self.compteurs = compteurs or {}
+
+    @property
+    def nombre(self):
+        return self.zeros + sum(self.compteurs.values())
+
+    def ajouter(self, valeurs):
+        valeurs = np.asarray(valeurs, dtype=np.float64)
+        if (valeurs < 0).any():
+            raise ValueError("Les valeurs d'une EsquisseQuantiles doivent être positives")
+        self.zeros += int(np.count_nonzero(valeurs == 0))
+        classes, effectifs = np.unique(np.ceil(np.log(valeurs[valeurs > 0]) / math.log(self.gamma)),
+                                       return_counts=True)
+        for classe, effectif in zip(classes.astype(np.int64).tolist(), effectifs.tolist()):
+            self.compteurs[classe] = self.compteurs.get(classe, 0) + effectif
+        return self
+
+    def fusionner(self, autre):
+        if autre.alpha != self.alpha:
+            raise ValueError("Précisions d'esquisses de quantiles différentes")
+        self.zeros += autre.zeros
+        for classe, effectif in autre.compteurs.items():
+            self.compteurs[classe] = self.compteurs.get(classe, 0) + effectif
+        return self
+
+    def _classes(self):
+        # Valeurs représentatives (milieu relatif de chaque classe) et effectifs, par valeur croissante
+        classes = sorted(self.compteurs)
+        valeurs = [0.0] + [2 * self.gamma ** c / (self.gamma + 1) for c in classes]
+        return np.array(valeurs), np.array([self.zeros] + [self.compteurs[c] for c in classes])
+
+    def quantile(self, q):
+        """Valeur de rang floor(q * (n - 1)) parmi les n valeurs triées (NaN si vide)."""
+        if not self.nombre:
+            return float('nan')
+        valeurs, effectifs = self._classes()
+        rang = math.floor(q * (self.nombre - 1))
+        return float(valeurs[np.searchsorted(np.cumsum(effectifs), rang, side='right')])
+
+    def repartition(self, bornes):
+        """Nombre de valeurs dans chaque intervalle [bornes[i], bornes[i + 1])."""
+        valeurs, effectifs = self._classes()
+        tranches = np.searchsorted(bornes, valeurs, side='right') - 1
+        dans_bornes = (tranches >= 0) & (tranches < len(bornes) - 1)
+        return np.bincount(tranches[dans_bornes], weights=effectifs[dans_bornes],
+                           minlength=len(bornes) - 1).astype(np.int64)
+
+    def vers_dict(self):
+        return {'alpha': self.alpha, 'zeros': self.zeros,
+                'compteurs': {str(c): n for c, n in sorted(self.compteurs.items())}}
+
+    @classmethod
+    def depuis_dict(cls, d):
+        return cls(d['alpha'], d['zeros'], {int(c): n for c, n in d['compteurs'].items()})
+
+
+class EsquissesActivite:
+    """Esquisses par (mois, établissement) alimentées par des blocs de passages.
+
+    `inscriptions` associe à chaque `ID Client` sa date d'inscription. Les
+    passages doivent arriver par mois croissants : un mois est clôturé dès
+    qu'un passage d'un mois postérieur est reçu.
+    """
+
+    def __init__(self, inscriptions, precision=PRECISION_HLL, alpha=ALPHA):
+        self.inscriptions = inscriptions
+        self.precision = precision
+        self.alpha = alpha
+        self.cellules = {}
+        # Visites et dernier passage par (mois, établissement, client) des mois non clôturés
+        self._ouverts = pd.DataFrame(columns=['mois', 'Etablissement', 'ID Client', 'visites', 'dernier'])
+
+    def _cellule(self, mois, etablissement):
+        cle = (mois, etablissement)
+        if cle not in self.cellules:
+            self.cellules[cle] = {'clients': HyperLogLog(self.precision),
+                                  'visites': EsquisseQuantiles(self.alpha),
+                                  'anciennete': EsquisseQuantiles(self.alpha)}
+        return self.cellules[cle]
+
+    def ajouter(self, passages):
+        """Ajoute un bloc de passages (colonnes `Date Passage`, `Etablissement`, `ID Client`)."""
+        passages = passages[passages['Date Passage'].notna()]
+        if passages.empty:
+            return self
+        cles = pd.DataFrame({'mois': passages['Date Passage'].dt.strftime('%Y-%m'),
+                             'Etablissement': passages['Etablissement'].astype(str),
+                             'ID Client': passages['ID Client'].to_numpy(np.int64),
+                             'Date Passage': passages['Date Passage']})
+        for (mois, etablissement), groupe in cles.groupby(['mois', 'Etablissement'], sort=False):
+            self._cellule(mois, etablissement)['clients'].ajouter(groupe['ID Client'])
+
+        bloc = (cles.groupby(['mois', 'Etablissement', 'ID Client'], sort=False)['Date Passage']
+                .agg(visites='size', dernier='max').reset_index())
+        self._ajouter_ouverts(bloc)
+        return self
+
+    def _ajouter_ouverts(self, comptes):
+        # Regroupe par client les comptes des mois ouverts, puis clôture ceux qui précèdent le dernier
+        ouverts = pd.concat([self._ouverts, comptes], ignore_index=True) if len(self._ouverts) else comptes
+        self._ouverts = (ouverts.groupby(['mois', 'Etablissement', 'ID Client'], sort=False)
+                         .agg(visites=('visites', 'sum'), dernier=('dernier', 'max')).reset_index())
+        self.cloturer(avant=self._ouverts['mois'].max())
+
+    def cloturer(self, avant=None):
+        """Verse dans les esquisses les mois antérieurs à `avant` ('AAAA-MM'), tous si None."""
+        clos = self._ouverts['mois'] < avant if avant is not None else np.ones(len(self._ouverts), bool)
+        a_verser, self._ouverts = self._ouverts[clos], self._ouverts[~clos].reset_index(drop=True)
+        inscriptions = self.inscriptions.reindex(a_verser['ID Client']).to_numpy()
+        jours = (pd.to_datetime(a_verser['dernier']).dt.normalize().to_numpy()
+                 - pd.DatetimeIndex(inscriptions).normalize().to_numpy()) / np.timedelta64(1, 'D')
+        a_verser = a_verser.assign(jours=jours)
+        for (mois, etablissement), groupe in a_verser.groupby(['mois', 'Etablissement'], sort=False):
+            cellule = self._cellule(mois, etablissement)
+            cellule['visites'].ajouter(groupe['visites'])
+            # Comme l'analyse 7.1 : inscriptions inconnues et passages antérieurs exclus
+            cellule['anciennete'].ajouter(groupe['jours'][groupe['jours'] >= 0])
+        return self
+
+    def fusionner(self, autre):
+        """Ajoute les esquisses de `autre` (autres établissements), mois encore ouvert compris."""
+        for (mois, etablissement), cellule in autre.cellules.items():
+            cible = self._cellule(mois, etablissement)
+            for nom, esquisse in cellule.items():
+                cible[nom].fusionner(esquisse)
+        if len(autre._ouverts):
+            self._ajouter_ouverts(autre._ouverts)
+        return self
+
+    def _fusion(self, nom, mois=None, etablissements=None):
+        resultat = (HyperLogLog(self.precision) if nom == 'clients' else EsquisseQuantiles(self.alpha))
+        for (m, etablissement), cellule in self.cellules.items():
+            if (mois is None or m == mois) and (etablissements is None or etablissement in etablissements):
+                resultat.fusionner(cellule[nom])
+        return resultat
+
+    def clients_actifs(self, etablissements=None):
+        """Estimation du nombre de clients distincts de chaque mois."""
+        mois = sorted({m for m, _ in self.cellules})
+        return pd.DataFrame({'mois': mois,
+                             'clients': [round(self._fusion('clients', m, etablissements).estimation())
+                                         for m in mois]})
+
+    def quantiles_visites(self, quantiles=(0.25, 0.5, 0.75, 0.9), mois=None, etablissements=None):
+        esquisse = self._fusion('visites', mois, etablissements)
+        return pd.Series({q: esquisse.quantile(q) for q in quantiles}, name='visites')
+
+    def repartition_anciennete(self, mois=None, etablissements=None):
+        """Clients actifs par tranche d'ancienneté (`Tranche`, `clients`)."""
+        esquisse = self._fusion('anciennete', mois, etablissements)
+        return pd.DataFrame({
+            'Tranche': pd.Categorical(TRANCHES_ANCIENNETE, categories=TRANCHES_ANCIENNETE, ordered=True),
+            'clients': esquisse.repartition(BORNES_ANCIENNETE),
+        })
+
+    def vers_dict(self):
+        ouverts = self._ouverts.assign(dernier=pd.to_datetime(self._ouverts['dernier']).astype(str))
+        return {
+            'precision': self.precision, 'alpha': self.alpha,
+            'cellules': [{'mois': m, 'Etablissement': e, **{nom: s.vers_dict() for nom, s in c.items()}}
+                         for (m, e), c in sorted(self.cellules.items())],
+            'ouverts': ouverts.to_dict(orient='list'),
+        }
+
+    @classmethod
+    def depuis_dict(cls, d, inscriptions):
+        esquisses = cls(inscriptions, d['precision'], d['alpha'])
+        for cellule in d['cellules']:
+            esquisses.cellules[(cellule['mois'], cellule['Etablissement'])] = {
+                'clients': HyperLogLog.depuis_dict(cellule['clients']),
+                'visites': EsquisseQuantiles.depuis_dict(cellule['visites']),
+                'anciennete': EsquisseQuantiles.depuis_dict(cellule['anciennete']),
+            }
+        ouverts = pd.DataFrame(d['ouverts'])
+        if len(ouverts):
+            esquisses._ouverts = ouverts.assign(dernier=pd.to_datetime(ouverts['dernier']))
+        return esquisses
+
+    def enregistrer(self, chemin):
+        Path(chemin).write_text(json.dumps(self.vers_dict()), encoding='utf-8')
+
+    @classmethod
+    def charger(cls, chemin, inscriptions):
+        return cls.depuis_dict(json.loads(Path(chemin).read_text(encoding='utf-8')), inscriptions)
+
+
+def ecarts_exacts(esquisses, passages, clients, quantiles=(0.25, 0.5, 0.75, 0.9)):
+    """Écarts relatifs maximaux entre les esquisses et les valeurs exactes (calcul complet en GROUP BY).
+
+    Renvoie, avec les bornes documentées, l'écart des clients distincts par
+    mois, des quantiles de visites et d'ancienneté (tous mois et
+    établissements confondus) et le nombre de clients mal classés par tranche.
+    """
+    passages = passages[passages['Date Passage'].notna()]
+    cles = pd.DataFrame({'mois': passages['Date Passage'].dt.strftime('%Y-%m'),
+                         'Etablissement': passages['Etablissement'].astype(str),
+                         'ID Client': passages['ID Client'].to_numpy(np.int64),
+                         'Date Passage': passages['Date Passage']})
+    distincts = cles.groupby('mois')['ID Client'].nunique()
+    estimes = esquisses.clients_actifs().set_index('mois')['clients']
+    ecart_clients = float(((estimes.reindex(distincts.index) - distincts).abs() / distincts).max())
+
+    par_client = (cles.groupby(['mois', 'Etablissement', 'ID Client'])['Date Passage']
+                  .agg(visites='size', dernier='max').reset_index())
+    inscriptions = clients.set_index('ID Client')['Date Inscription'].reindex(par_client['ID Client'])
+    jours = (par_client['dernier'].dt.normalize().to_numpy() - inscriptions.dt.normalize().to_numpy())
+    jours = pd.Series(jours / np.timedelta64(1, 'D')).dropna()
+    jours = jours[jours >= 0].to_numpy()
+
+    def ecart_quantiles(exactes, esquisse):
+        exacts = np.quantile(exactes, quantiles, method='lower')
+        approches = np.array([esquisse.quantile(q) for q in quantiles])
+        return float(np.max(np.abs(approches - exacts) / np.maximum(exacts, 1)))
+
+    tranches = pd.cut(jours, bins=BORNES_ANCIENNETE, labels=False, right=False)
+    exactes_tranches = np.bincount(tranches.astype(np.int64), minlength=len(TRANCHES_ANCIENNETE))
+    return {
+        'clients_distincts': {'ecart_max': ecart_clients,
+                              'erreur_type': HyperLogLog(esquisses.precision).erreur_type},
+        'quantiles_visites': {'ecart_max': ecart_quantiles(par_client['visites'].to_numpy(),
+                                                           esquisses._fusion('visites')),
+                              'borne': esquisses.alpha},
+        'quantiles_anciennete': {'ecart_max': ecart_quantiles(jours, esquisses._fusion('anciennete')),
+                                 'borne': esquisses.alpha},
+        'tranches_anciennete': {
+            'mal_classes': int(np.abs(esquisses.repartition_anciennete()['clients'].to_numpy()
+                                      - exactes_tranches).sum()) // 2,
+            'proches_des_bornes': int(sum(np.count_nonzero(np.abs(jours - b) <= esquisses.alpha * b)
+                                          for b in BORNES_ANCIENNETE[1:-1])),
+        },
+    }
+
+
+def main(argv=None):
+    from arkose.ingestion import SCHEMA_PASSAGES, charger_clients, charger_passages, iterer_blocs
+
+    parser = argparse.ArgumentParser(prog='python -m arkose.esquisses',
+                                     description="Esquisses d'activité mensuelle alimentées en flux")
+    parser.add_argument('clients', type=Path)
+    parser.add_argument('passages', type=Path)
+    parser.add_argument('--etat', default=None, type=Path, help="fichier JSON où enregistrer les esquisses")
+    parser.add_argument('--verifier', action='store_true', help="compare aux valeurs exactes")
+    args = parser.parse_args(argv)
+
+    clients, _ = charger_clients(args.clients)
+    inscriptions = clients.set_index('ID Client')['Date Inscription']
+    esquisses = EsquissesActivite(inscriptions)
+    for bloc in iterer_blocs(args.passages, SCHEMA_PASSAGES):
+        esquisses.ajouter(bloc)
+    if args.etat is not None:
+        esquisses.enregistrer(args.etat)
+
+    # Le dernier mois n'est clôturé que pour l'affichage, l'état enregistré le garde ouvert
+    esquisses.cloturer()
+    print(esquisses.clients_actifs().tail(12).to_string(index=False))
+    print(esquisses.quantiles_visites().to_string())
+    print(esquisses.repartition_anciennete().to_string(index=False))
+    if args.verifier:
+        passages, _ = charger_passages(args.passages)
+        print(json.dumps(ecarts_exacts(esquisses, passages, clients), indent=1))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,200 @@
+"""Panel client x mois de variables de fréquentation, stocké sur disque en mémoire mappée.
+
+Le panel est un tableau float32 de forme (mois, clients, variables) rangé mois
+par mois dans `panel.f32` : ajouter un mois revient à écrire un bloc en fin
+de fichier, et extraire une fenêtre pour l'entraînement ou le scoring d'un
+modèle est une simple vue sur la mémoire mappée, sans recalcul ni copie.
+Les lignes correspondent aux identifiants de `ids.npy` ; chaque bloc mensuel
+réserve `capacite` lignes pour accueillir de nouveaux clients.
+
+Variables : passages du mois, moyennes glissantes sur 3, 6 et 12 mois,
+pentes (moindres carrés) sur 6 et 12 mois et part des passages en tarif
+réduit dans le mois.
+"""
+
+import json
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+
+from arkose.index_visites import en_jours, jours_en_mois
+
+VARIABLES = ['visites', 'moy_3', 'moy_6', 'moy_12', 'pente_6', 'pente_12', 'part_reduit']
+HISTORIQUE = 12
+
+_FICHIER_PANEL = 'panel.f32'
+_FICHIER_IDS = 'ids.npy'
+_FICHIER_META = 'meta.json'
+
+
+def _pente(historique, fenetre):
+    # Pente des moindres carrés de y(0..fenetre-1) sur les `fenetre` derniers mois
+    y = historique[-fenetre:]
+    x = np.arange(fenetre, dtype=np.float64) - (fenetre - 1) / 2
+    return (x[:, None] * y).sum(axis=0) / (x ** 2).sum()
+
+
+def _variables_du_mois(historique, reduits):
+    """Variables d'un mois à partir des passages des `HISTORIQUE` derniers mois (le dernier = ce mois)."""
+    visites = historique[-1]
+    variables = np.empty((historique.shape[1], len(VARIABLES)), dtype=np.float32)
+    variables[:, 0] = visites
+    variables[:, 1] = historique[-3:].mean(axis=0)
+    variables[:, 2] = historique[-6:].mean(axis=0)
+    variables[:, 3] = historique[-12:].mean(axis=0)
+    variables[:, 4] = _pente(historique, 6)
+    variables[:, 5] = _pente(historique, 12)
+    variables[:, 6] = np.divide(reduits, visites, out=np.zeros(len(visites)), where=visites > 0)
+    return variables
+
+
+class PanelFeatures:
+    """Panel de variables mensuelles par client, adossé à des fichiers d'un répertoire."""
+
+    def __init__(self, repertoire):
+        self.repertoire = Path(repertoire)
+        meta = json.loads((self.repertoire / _FICHIER_META).read_text())
+        self.premier_mois = meta['premier_mois']
+        self.n_mois = meta['n_mois']
+        self.capacite = meta['capacite']
+        self.ids = np.load(self.repertoire / _FICHIER_IDS)
+        self._lignes = pd.Series(np.arange(len(self.ids)), index=self.ids)
+        self._ouvrir()
+
+    @classmethod
+    def creer(cls, repertoire, premier_mois, ids=(), capacite=1024):
+        """Crée un panel vide commençant au mois absolu `premier_mois` (année * 12 + mois - 1)."""
+        repertoire = Path(repertoire)
+        repertoire.mkdir(parents=True, exist_ok=True)
+        ids = np.asarray(ids, dtype=np.int64)
+        np.save(repertoire / _FICHIER_IDS, ids)
+        (repertoire / _FICHIER_PANEL).write_bytes(b'')
+        cls._ecrire_meta(repertoire, premier_mois, 0, max(capacite, len(ids)))
+        return cls(repertoire)
+
+    @staticmethod
+    def _ecrire_meta(repertoire, premier_mois, n_mois, capacite):
+        (Path(repertoire) / _FICHIER_META).write_text(json.dumps({
+            'premier_mois': premier_mois, 'n_mois': n_mois, 'capacite': capacite, 'variables': VARIABLES,
+        }))
+
+    def _ouvrir(self):
+        forme = (self.n_mois, self.capacite, len(VARIABLES))
+        self.panel = (np.memmap(self.repertoire / _FICHIER_PANEL, dtype=np.float32, mode='r', shape=forme)
+                      if self.n_mois else np.zeros(forme, dtype=np.float32))
+
+    @property
+    def n_clients(self):
+        return len(self.ids)
+
+    @property
+    def mois(self):
+        """Mois couverts par le panel."""
+        absolus = self.premier_mois + np.arange(self.n_mois)
+        return pd.PeriodIndex.from_fields(year=absolus // 12, month=absolus % 12 + 1, freq='M')
+
+    def lignes(self, ids_clients):
+        """Lignes du panel des `ids_clients`, en ajoutant les clients inconnus."""
+        ids_clients = np.asarray(ids_clients, dtype=np.int64)
+        nouveaux = np.setdiff1d(ids_clients, self.ids)
+        if len(nouveaux):
+            self._ajouter_clients(nouveaux)
+        return self._lignes.loc[ids_clients].to_numpy()
+
+    def _ajouter_clients(self, nouveaux):
+        self.ids = np.concatenate([self.ids, nouveaux])
+        self._lignes = pd.Series(np.arange(len(self.ids)), index=self.ids)
+        np.save(self.repertoire / _FICHIER_IDS, self.ids)
+        if len(self.ids) <= self.capacite:
+            return
+
+        # Capacité dépassée : le fichier est réécrit avec des blocs plus grands
+        capacite = self.capacite
+        while capacite < len(self.ids):
+            capacite *= 2
+        temporaire = self.repertoire / (_FICHIER_PANEL + '.tmp')
+        with open(temporaire, 'wb') as f:
+            for t in range(self.n_mois):
+                bloc = np.zeros((capacite, len(VARIABLES)), dtype=np.float32)
+                bloc[:self.capacite] = self.panel[t]
+                f.write(bloc.tobytes())
+        del self.panel
+        temporaire.replace(self.repertoire / _FICHIER_PANEL)
+        self.capacite = capacite
+        self._ecrire_meta(self.repertoire, self.premier_mois, self.n_mois, self.capacite)
+        self._ouvrir()
+
+    def ajouter_mois(self, visites, reduits):
+        """Ajoute le mois suivant à partir des passages et passages réduits de chaque client.
+
+        `visites` et `reduits` sont alignés sur `ids`. Les moyennes et pentes
+        sont calculées à partir des mois précédents, lus dans le panel.
+        """
+        historique = np.zeros((HISTORIQUE, self.n_clients), dtype=np.float64)
+        precedents = min(self.n_mois, HISTORIQUE - 1)
+        if precedents:
+            historique[HISTORIQUE - 1 - precedents:-1] = self.panel[self.n_mois - precedents:, :self.n_clients, 0]
+        historique[-1] = visites
+
+        bloc = np.zeros((self.capacite, len(VARIABLES)), dtype=np.float32)
+        bloc[:self.n_clients] = _variables_du_mois(historique, np.asarray(reduits, dtype=np.float64))
+        with open(self.repertoire / _FICHIER_PANEL, 'ab') as f:
+            f.write(bloc.tobytes())
+        self.n_mois += 1
+        self._ecrire_meta(self.repertoire, self.premier_mois, self.n_mois, self.capacite)
+        self._ouvrir()
+
+    def fenetre(self, debut=None, fin=None, variables=None):
+        """Vue (mois de `debut` à `fin` inclus, clients, variables) sur le panel, sans copie.
+
+        `debut` et `fin` sont des mois (`'2022-01'`, Period ou date) ;
+        `variables` restreint les variables (une liste contiguë reste une vue).
+        """
+        t0 = 0 if debut is None else self._position(debut)
+        t1 = self.n_mois if fin is None else self._position(fin) + 1
+        vue = self.panel[max(t0, 0):max(t1, 0), :self.n_clients]
+        if variables is None:
+            return vue
+        positions = [VARIABLES.index(v) for v in variables]
+        if positions == list(range(positions[0], positions[-1] + 1)):
+            return vue[:, :, positions[0]:positions[-1] + 1]
+        return vue[:, :, positions]
+
+    def _position(self, mois):
+        periode = pd.Period(mois, freq='M')
+        return periode.year * 12 + periode.month - 1 - self.premier_mois
+
+    def mettre_a_jour(self, index, date_fin):
+        """Ajoute au panel tous les mois complets avant le mois de `date_fin` absents du panel.
+
+        `index` est l'`IndexVisites` des passages. Renvoie le nombre de mois ajoutés.
+        """
+        fin = pd.Timestamp(date_fin)
+        dernier_mois = fin.year * 12 + fin.month - 2
+        prochain = self.premier_mois + self.n_mois
+        if dernier_mois < prochain:
+            return 0
+
+        lignes = self.lignes(index.ids)[index.codes_visites]
+        mois = jours_en_mois(index.jours)
+        dans_periode = (mois >= prochain) & (mois <= dernier_mois)
+        lignes, mois, reduit = lignes[dans_periode], mois[dans_periode], index.reduit[dans_periode]
+
+        # Comptes de tous les mois à ajouter en un seul bincount
+        n_nouveaux = dernier_mois - prochain + 1
+        cles = (mois - prochain) * self.n_clients + lignes
+        visites = np.bincount(cles, minlength=n_nouveaux * self.n_clients).reshape(n_nouveaux, -1)
+        reduits = np.bincount(cles, weights=reduit, minlength=n_nouveaux * self.n_clients).reshape(n_nouveaux, -1)
+        for t in range(n_nouveaux):
+            self.ajouter_mois(visites[t], reduits[t])
+        return n_nouveaux
+
+
+def ouvrir_ou_creer(repertoire, index):
+    """Ouvre le panel de `repertoire`, ou le crée à partir du premier mois de visite de `index`."""
+    if (Path(repertoire) / _FICHIER_META).exists():
+        return PanelFeatures(repertoire)
+    premier_jour = index.jours.min() if len(index) else en_jours(pd.Timestamp.today())
+    premier_mois = int(jours_en_mois(premier_jour))
+    return PanelFeatures.creer(repertoire, premier_mois, index.ids, capacite=max(1024, 2 * index.n_clients))
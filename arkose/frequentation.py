@@ -0,0 +1,78 @@
+"""Fréquentation mensuelle des clients sur les mois précédant leur dernier passage."""
+
+import numpy as np
+import pandas as pd
+
+# Tranches de durée de fréquentation (jours entre l'inscription et le dernier passage)
+BORNES_ANCIENNETE = [0, 90, 180, 270, 360, 540, float('inf')]
+TRANCHES_ANCIENNETE = ['≤3 mois', '3-6 mois', '6-9 mois', '9-12 mois', '12-18 mois', '>18 mois']
+
+
+def _indices_mois(dates):
+    # Numéro de mois absolu (année * 12 + mois) : deux dates du même mois
+    # calendaire partagent le même indice
+    return (dates.dt.year * 12 + dates.dt.month - 1).to_numpy()
+
+
+def compter_mois_avant(codes, mois, n_clients, n_mois, dernier_mois):
+    """Matrice (n_clients, n_mois) des passages par mois, la dernière colonne étant `dernier_mois`.
+
+    `codes` donne le client (0 .. n_clients - 1) de chaque passage et `mois`
+    son numéro de mois absolu ; `dernier_mois` est un mois absolu commun à
+    tous les clients ou un tableau d'un mois par client. Les passages hors de
+    la fenêtre (avant ou après) sont ignorés.
+    """
+    # Décalage de chaque passage par rapport au dernier mois de son client,
+    # seuls les passages dans la fenêtre sont conservés
+    decalage = np.broadcast_to(dernier_mois, (n_clients,))[codes] - mois
+    dans_fenetre = (decalage >= 0) & (decalage < n_mois)
+    colonne = (n_mois - 1) - decalage[dans_fenetre]
+
+    return np.bincount(
+        codes[dans_fenetre] * n_mois + colonne,
+        minlength=n_clients * n_mois,
+    ).reshape(n_clients, n_mois)
+
+
+def compter_mois_avant_dernier(codes, mois, n_clients, n_mois):
+    """Matrice (n_clients, n_mois) des passages par mois, alignée sur le dernier mois de chaque client.
+
+    `codes` donne le client (0 .. n_clients - 1) de chaque passage et `mois`
+    son numéro de mois absolu ; la dernière colonne est le mois du dernier
+    passage du client.
+    """
+    # Mois du dernier passage de chaque client
+    dernier_mois = np.full(n_clients, np.iinfo(np.int64).min, dtype=np.int64)
+    np.maximum.at(dernier_mois, codes, mois)
+    return compter_mois_avant(codes, mois, n_clients, n_mois, dernier_mois)
+
+
+def calculate_monthly_visits(df, n_mois=12):
+    """Compte les passages de chaque client sur les `n_mois` mois calendaires
+    se terminant par le mois de son dernier passage.
+
+    Renvoie un DataFrame `ID Client, mois_1 .. mois_{n_mois}` (une ligne par
+    client, dans l'ordre d'apparition), `mois_{n_mois}` étant le mois du
+    dernier passage et `mois_1` le plus ancien.
+
+    Le calcul se fait en une seule passe : chaque passage est converti en
+    décalage (en mois) par rapport au dernier passage de son client, puis les
+    couples (client, décalage) sont comptés par `np.bincount`. Le coût est
+    linéaire en nombre de passages.
+    """
+    if n_mois < 1:
+        raise ValueError("n_mois doit être supérieur ou égal à 1")
+
+    codes, ids_clients = pd.factorize(df['ID Client'], sort=False)
+    n_clients = len(ids_clients)
+
+    dates = pd.to_datetime(df['Date Passage'])
+    valides = dates.notna().to_numpy()
+    codes = codes[valides]
+    mois = _indices_mois(dates[valides]).astype(np.int64)
+
+    comptes = compter_mois_avant_dernier(codes, mois, n_clients, n_mois)
+
+    result = pd.DataFrame(comptes, columns=[f'mois_{i}' for i in range(1, n_mois + 1)])
+    result.insert(0, 'ID Client', np.asarray(ids_clients))
+    return result
@@ -0,0 +1,158 @@
+"""Graphe d'étapes dont les sorties sont mises en cache selon l'empreinte de leur contenu.
+
+La clé d'une étape combine :
+- l'empreinte de son code : source de la fonction, des fonctions et
+  constantes d'`arkose` qu'elle utilise, récursivement ;
+- ses paramètres ;
+- l'empreinte des fichiers qu'elle lit ;
+- les clés des étapes dont elle reçoit les sorties.
+
+Une étape dont la clé est inchangée n'est pas réexécutée : sa sortie est
+relue dans `.cache_arkose/etapes/`, et seulement si une étape qui en dépend
+doit tourner. Modifier une requête d'analyse ne relance donc que cette
+analyse et ses descendantes.
+"""
+
+import hashlib
+import inspect
+import pickle
+import sys
+import time
+import types
+from pathlib import Path
+
+from arkose.cache import REPERTOIRE_CACHE, _ecrire_atomique, empreinte_fichier
+
+_CONSTANTES = (str, bytes, int, float, bool, type(None))
+
+
+def _noms(code):
+    # Noms globaux et attributs lus par un code et ses fonctions imbriquées (lambdas, compréhensions)
+    noms = set(code.co_names)
+    for constante in code.co_consts:
+        if isinstance(constante, types.CodeType):
+            noms |= _noms(constante)
+    return noms
+
+
+def _est_constante(valeur):
+    if isinstance(valeur, (tuple, list, frozenset, set)):
+        return all(_est_constante(v) for v in valeur)
+    if isinstance(valeur, dict):
+        return all(_est_constante(k) and _est_constante(v) for k, v in valeur.items())
+    return isinstance(valeur, _CONSTANTES)
+
+
+def _du_paquet(objet):
+    return (getattr(objet, '__module__', None) or '').split('.')[0] == 'arkose'
+
+
+def _empreindre(objet, h, vues):
+    if id(objet) in vues:
+        return
+    vues.add(id(objet))
+
+    if inspect.isfunction(objet):
+        try:
+            h.update(inspect.getsource(objet).encode())
+        except OSError:
+            h.update(objet.__code__.co_code)
+        h.update(repr(objet.__defaults__).encode())
+        noms = _noms(objet.__code__)
+        # Modules d'arkose visibles de la fonction, y compris ceux importés dans son corps
+        modules = [v for v in objet.__globals__.values() if inspect.ismodule(v) and v.__name__.startswith('arkose')]
+        modules += [sys.modules[f'arkose.{n}'] for n in noms if f'arkose.{n}' in sys.modules]
+        for nom in sorted(noms):
+            valeurs = [objet.__globals__[nom]] if nom in objet.__globals__ else []
+            valeurs += [getattr(m, nom) for m in modules if hasattr(m, nom)]
+            for valeur in valeurs:
+                if _est_constante(valeur):
+                    h.update(f'{nom}={valeur!r}'.encode())
+                elif (inspect.isfunction(valeur) or inspect.isclass(valeur)) and _du_paquet(valeur):
+                    _empreindre(valeur, h, vues)
+    elif inspect.isclass(objet) or inspect.ismodule(objet):
+        h.update(inspect.getsource(objet).encode())
+
+
+def empreinte_code(*fonctions):
+    """SHA-256 du code de `fonctions` et des fonctions, classes et constantes d'arkose qu'elles utilisent."""
+    h = hashlib.sha256()
+    vues = set()
+    for fonction in fonctions:
+        _empreindre(fonction, h, vues)
+    return h.hexdigest()
+
+
+class GrapheEtapes:
+    """Étapes nommées, exécutées à la demande avec mise en cache de leurs sorties."""
+
+    def __init__(self, repertoire=REPERTOIRE_CACHE / 'etapes'):
+        self.repertoire = Path(repertoire)
+        self.etapes = {}
+        self.statuts = {}
+
+    def ajouter(self, nom, fonction, entrees=(), parametres=None, fichiers=(), code=()):
+        """Déclare l'étape `nom` : `fonction(*sorties des entrees, **parametres)`.
+
+        Les `entrees` doivent être déclarées avant (le graphe est acyclique par
+        construction). `fichiers` sont les fichiers lus par l'étape, `code` des
+        fonctions, classes ou modules supplémentaires dont le code détermine le
+        résultat : appelés indirectement par `fonction`, par exemple par une
+        méthode, que l'empreinte (qui ne suit que les noms globaux) ne voit pas.
+        """
+        inconnues = [e for e in entrees if e not in self.etapes]
+        if inconnues:
+            raise ValueError(f"Étape {nom!r} : entrée(s) non déclarée(s) : {', '.join(inconnues)}")
+        self.etapes[nom] = {'fonction': fonction, 'entrees': list(entrees), 'parametres': parametres or {},
+                            'fichiers': [Path(f) for f in fichiers], 'code': list(code)}
+        return nom
+
+    def cles(self):
+        """Clé de chaque étape (les étapes sont déclarées dans un ordre topologique)."""
+        cles = {}
+        for nom, etape in self.etapes.items():
+            h = hashlib.sha256(nom.encode())
+            h.update(empreinte_code(etape['fonction'], *etape['code']).encode())
+            h.update(repr(sorted(etape['parametres'].items())).encode())
+            for fichier in etape['fichiers']:
+                h.update(empreinte_fichier(fichier).encode())
+            for entree in etape['entrees']:
+                h.update(cles[entree].encode())
+            cles[nom] = h.hexdigest()[:24]
+        return cles
+
+    def executer(self, cibles=None, forcer=(), rapport=None):
+        """Sorties des étapes `cibles` (toutes par défaut), recalculées seulement si leur clé a changé.
+
+        `forcer` liste des étapes à réexécuter quoi qu'il arrive. `rapport` est
+        appelé pour chaque étape consultée avec son nom, son statut
+        ('reutilisee' ou 'executee') et sa durée. Les statuts sont aussi
+        conservés dans `statuts`.
+        """
+        cles = self.cles()
+        sorties = {}
+
+        def sortie(nom):
+            if nom in sorties:
+                return sorties[nom]
+            etape = self.etapes[nom]
+            fichier = self.repertoire / f'{nom}-{cles[nom]}.pkl'
+            debut = time.perf_counter()
+            if fichier.exists() and nom not in forcer:
+                sorties[nom] = pickle.loads(fichier.read_bytes())
+                statut = 'reutilisee'
+            else:
+                valeurs = [sortie(e) for e in etape['entrees']]
+                debut = time.perf_counter()
+                sorties[nom] = etape['fonction'](*valeurs, **etape['parametres'])
+                # Une seule version conservée par étape
+                for ancien in self.repertoire.glob(f'{nom}-*.pkl'):
+                    ancien.unlink(missing_ok=True)
+                _ecrire_atomique(fichier, pickle.dumps(sorties[nom]))
+                statut = 'executee'
+            self.statuts[nom] = statut
+            if rapport is not None:
+                rapport(nom, statut, time.perf_counter() - debut)
+            return sorties[nom]
+
+        return {nom: sortie(nom) for nom in (cibles or list(self.etapes))}
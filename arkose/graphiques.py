@@ -0,0 +1,191 @@
+"""Graphiques de l'étude.
+
+Chaque fonction prend les données renvoyées par `arkose.analyses` et renvoie
+une figure matplotlib, sans l'afficher : le notebook l'affiche avec
+`plt.show()`, le mode batch l'enregistre avec `enregistrer`. matplotlib n'est
+importé qu'au premier graphique.
+"""
+
+MOIS_FR = ['Jan', 'Fév', 'Mar', 'Avr', 'Mai', 'Juin',
+           'Juil', 'Août', 'Sep', 'Oct', 'Nov', 'Déc']
+
+
+def _pyplot():
+    import matplotlib.pyplot as plt
+    return plt
+
+
+def utiliser_backend_sans_affichage():
+    """Bascule matplotlib sur le backend Agg (serveurs sans affichage)."""
+    import matplotlib
+    matplotlib.use('Agg')
+
+
+def figure_frequentation_mensuelle(df):
+    """Courbe des passages par mois, une courbe par année."""
+    plt = _pyplot()
+    fig, ax = plt.subplots(figsize=(10, 5))
+
+    for annee in df['annee'].unique():
+        data = df[df['annee'] == annee]
+        ax.plot(data['mois'], data['passages'],
+                marker='o',
+                label=annee,
+                linewidth=2)
+
+    ax.set_title('Fréquentation Mensuelle par Année', pad=20, fontweight='bold')
+    ax.set_xlabel('Mois', labelpad=10)
+    ax.set_ylabel('Nombre de Passages', labelpad=10)
+    ax.set_xticks(range(1, 13), MOIS_FR)
+    ax.grid(axis='y', linestyle='--', alpha=0.4)
+    ax.legend(title='Année', frameon=False)
+    fig.tight_layout()
+    return fig
+
+
+def figure_inscriptions(repartition):
+    """Histogramme du nombre de clients par année d'inscription."""
+    plt = _pyplot()
+    fig, ax = plt.subplots(figsize=(7, 5))
+
+    barres = ax.bar(repartition.index.astype(str), repartition.values, color='#1f77b4')
+    ax.bar_label(barres, padding=3)
+    ax.set_title("Répartition des clients par année d'inscription", pad=20)
+    ax.set_xlabel("Année d'inscription", labelpad=10)
+    ax.set_ylabel('Nombre de clients', labelpad=10)
+    ax.grid(axis='y', linestyle='--', alpha=0.4)
+    fig.tight_layout()
+    return fig
+
+
+def figure_anciennete(df_result):
+    """Camembert des tranches de durée de fréquentation (inscription -> dernier passage).
+
+    `df_result` donne l'effectif de chaque tranche, une ligne par tranche
+    (colonnes `Tranche`, `clients`, voir `analyses.repartition_anciennete`).
+    """
+    plt = _pyplot()
+    fig, ax = plt.subplots(figsize=(7, 7))
+
+    effectifs = df_result.set_index('Tranche')['clients']
+    pourcentages = effectifs / effectifs.sum() * 100
+
+    patches, texts, autotexts = ax.pie(
+        pourcentages,
+        colors=plt.cm.Pastel1(range(len(pourcentages))),
+        startangle=90,
+        pctdistance=0.8,
+        wedgeprops={'linewidth': 1, 'edgecolor': 'white'},
+        autopct=lambda p: f'{p:.1f}%' if p >= 5 else ''  # Masque les petits pourcentages
+    )
+
+    for texte in autotexts:
+        texte.set_color('black')
+        texte.set_fontsize(9)
+        texte.set_fontweight('bold')
+
+    ax.legend(
+        handles=patches,
+        labels=[f"{l} ({p:.1f}%)" for l, p in zip(pourcentages.index, pourcentages)],
+        title="Périodes depuis l'inscription",
+        loc='center left',
+        bbox_to_anchor=(1, 0.5),
+        frameon=False
+    )
+
+    ax.set_title("Durée de la fréquentation (depuis la date d'inscription -> dernier passage)", pad=20, fontsize=12)
+    fig.tight_layout()
+    return fig
+
+
+def figure_profil_mensuel(statistiques):
+    """Courbe de la fréquentation moyenne sur les mois précédant le départ."""
+    plt = _pyplot()
+    fig, ax = plt.subplots(figsize=(12, 6))
+
+    labels_mois = list(statistiques['Mois'])
+    moyenne_par_mois = list(statistiques['Moyenne'])
+
+    ax.plot(labels_mois, moyenne_par_mois, 'o-', linewidth=2, markersize=8, color='#1f77b4')
+    ax.fill_between(labels_mois, moyenne_par_mois, alpha=0.2, color='#1f77b4')
+
+    ax.set_title(f'Évolution de la fréquentation moyenne par mois sur les {len(labels_mois)} derniers mois', fontsize=14)
+    ax.set_xlabel(f'Mois relatif ({labels_mois[0]} = plus ancien, {labels_mois[-1]} = plus récent)', fontsize=12)
+    ax.set_ylabel('Nombre moyen de visites', fontsize=12)
+    ax.grid(True, linestyle='--', alpha=0.7)
+
+    for i, v in enumerate(moyenne_par_mois):
+        ax.text(i, v + 0.1, f"{v:.2f}", ha='center')
+
+    fig.tight_layout()
+    return fig
+
+
+def figure_forfaits(df):
+    """Camembert de la répartition des types de forfaits."""
+    plt = _pyplot()
+    fig, ax = plt.subplots(figsize=(5, 5))
+
+    ax.pie(df['nombre_utilisations'],
+           labels=df['Type Forfait'],
+           autopct='%1.1f%%',
+           startangle=140,
+           pctdistance=0.85,
+           textprops={'fontsize': 10})
+    ax.set_title("Répartition des types de forfaits sur l'ensemble des données", pad=20)
+    ax.axis('equal')
+
+    # Légende si trop de catégories
+    if len(df) > 5:
+        ax.legend(df['Type Forfait'],
+                  title="Types de forfaits",
+                  loc="center left",
+                  bbox_to_anchor=(1, 0.5))
+
+    fig.tight_layout()
+    return fig
+
+
+def figure_tranches_age(desertion_ages):
+    """Camembert de la répartition des clients par tranche d'âge."""
+    plt = _pyplot()
+    fig, ax = plt.subplots(figsize=(5, 5))
+
+    wedges, texts, autotexts = ax.pie(desertion_ages['percentage'], labels=None, autopct='%1.1f%%', startangle=140)
+    ax.set_title('Répartition des clients par tranche d\'âge')
+    ax.axis('equal')  # Assure que le camembert est un cercle
+    ax.legend(wedges, desertion_ages['age_group'], title="Tranches d'âge", loc="center left", bbox_to_anchor=(1, 0, 0.5, 1))
+    return fig
+
+
+def figure_retention(df, etablissement='Tous'):
+    """Courbes de rétention (part de clients actifs par mois écoulé), une courbe par cohorte."""
+    plt = _pyplot()
+    fig, ax = plt.subplots(figsize=(10, 5))
+
+    donnees = df[df['Etablissement Inscription'] == etablissement]
+    for cohorte in donnees['cohorte'].unique():
+        data = donnees[donnees['cohorte'] == cohorte]
+        ax.plot(data['mois_depuis_inscription'], data['taux_retention'] * 100,
+                label=str(cohorte),
+                linewidth=1.5)
+
+    ax.set_title(f"Rétention par cohorte d'inscription ({etablissement})", pad=20, fontweight='bold')
+    ax.set_xlabel("Mois depuis l'inscription", labelpad=10)
+    ax.set_ylabel('Clients actifs (%)', labelpad=10)
+    ax.grid(axis='y', linestyle='--', alpha=0.4)
+    ax.legend(title='Cohorte', frameon=False, loc='center left', bbox_to_anchor=(1, 0.5), fontsize=8)
+    fig.tight_layout()
+    return fig
+
+
+def enregistrer(fig, chemin_sans_extension, formats=('png',)):
+    """Enregistre `fig` dans chacun des `formats` puis la ferme. Renvoie les chemins écrits."""
+    plt = _pyplot()
+    chemins = []
+    for extension in formats:
+        chemin = f'{chemin_sans_extension}.{extension}'
+        fig.savefig(chemin, bbox_inches='tight')
+        chemins.append(chemin)
+    plt.close(fig)
+    return chemins
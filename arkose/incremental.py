@@ -0,0 +1,244 @@
+"""Ingestion incrémentale des passages et agrégats mensuels maintenus par différence.
+
+Un filigrane (watermark) par fichier source mémorise la position en octets
+déjà lue, la date du dernier passage ingéré et le nombre de lignes. À chaque
+mise à jour, seule la fin du fichier (les nouvelles visites) est lue, chargée
+dans `passages` et ajoutée aux agrégats `agg_passages_mensuels` et
+`agg_passages_forfait` : le coût d'un rafraîchissement quotidien dépend du
+volume de nouvelles données, pas de l'historique.
+
+Les exports sont supposés alimentés par ajout en fin de fichier. Si le fichier
+a été remplacé (taille plus petite ou début différent), il est relu en entier
+et seuls les passages datés du filigrane ou après sont retenus. Dans tous les
+cas, un passage déjà présent dans la base (même empreinte) n'est ni rechargé
+ni recompté dans les agrégats.
+"""
+
+import argparse
+import hashlib
+from datetime import datetime
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+from sqlalchemy import (BigInteger, Column, DateTime, Integer, SmallInteger,
+                        String, Table, delete, select, text)
+
+from arkose.backend import traduire
+from arkose.chargement import (TAILLE_LOT, charger_table, creer_schema, incrementer_version, metadata,
+                               passages_table, preparer_passages)
+from arkose.ingestion import SCHEMA_PASSAGES, TAILLE_BLOC, iterer_blocs
+from arkose.resume_clients import rafraichir_resume
+
+# Octets du début de fichier servant à reconnaître un export remplacé
+TAILLE_EMPREINTE_DEBUT = 4096
+
+etat_ingestion_table = Table(
+    'etat_ingestion', metadata,
+    Column('source', String(255), primary_key=True),
+    Column('octets', BigInteger),
+    Column('empreinte_debut', String(64)),
+    Column('derniere_date', DateTime),
+    Column('lignes', BigInteger),
+    Column('mis_a_jour', DateTime),
+)
+
+agg_mensuels_table = Table(
+    'agg_passages_mensuels', metadata,
+    Column('annee', SmallInteger, primary_key=True, autoincrement=False),
+    Column('mois', SmallInteger, primary_key=True, autoincrement=False),
+    Column('passages', Integer, nullable=False),
+)
+
+agg_forfait_table = Table(
+    'agg_passages_forfait', metadata,
+    Column('annee', SmallInteger, primary_key=True, autoincrement=False),
+    Column('mois', SmallInteger, primary_key=True, autoincrement=False),
+    Column('Type Forfait', String(20), primary_key=True),
+    Column('passages', Integer, nullable=False),
+)
+
+
+# Valeur de `Type Forfait` des passages sans forfait dans `agg_passages_forfait`
+FORFAIT_ABSENT = ''
+
+# Agrégats recalculés depuis la table `passages` (dialecte MySQL, traduit par le backend)
+REQUETES_AGREGATS = {
+    'agg_passages_mensuels': """
+        INSERT INTO agg_passages_mensuels (annee, mois, passages)
+        SELECT YEAR(`Date Passage`) AS annee, MONTH(`Date Passage`) AS mois, COUNT(*)
+        FROM passages
+        WHERE `Date Passage` IS NOT NULL
+        GROUP BY annee, mois
+    """,
+    'agg_passages_forfait': f"""
+        INSERT INTO agg_passages_forfait (annee, mois, `Type Forfait`, passages)
+        SELECT YEAR(`Date Passage`) AS annee, MONTH(`Date Passage`) AS mois,
+               COALESCE(`Type Forfait`, '{FORFAIT_ABSENT}') AS forfait, COUNT(*)
+        FROM passages
+        WHERE `Date Passage` IS NOT NULL
+        GROUP BY annee, mois, forfait
+    """,
+}
+
+
+def _empreinte_debut(chemin):
+    with open(chemin, 'rb') as f:
+        return hashlib.sha256(f.read(TAILLE_EMPREINTE_DEBUT)).hexdigest()
+
+
+def lire_etat(engine, source):
+    with engine.connect() as conn:
+        ligne = conn.execute(select(etat_ingestion_table)
+                             .where(etat_ingestion_table.c.source == source)).mappings().first()
+    return dict(ligne) if ligne else None
+
+
+def _nouveaux_blocs(chemin, etat, taille_bloc, rapport, ingestion=None):
+    """Blocs de passages postérieurs au filigrane `etat` (tous si `etat` est None).
+
+    `ingestion` est le résultat `(passages, rapport)` d'une lecture de
+    `chemin` déjà faite : il remplace la relecture complète du fichier.
+    """
+    taille = chemin.stat().st_size
+    if (etat is not None and etat['octets'] <= taille
+            and etat['empreinte_debut'] == _empreinte_debut(chemin)):
+        # Fichier prolongé : lecture à partir de la position mémorisée
+        f = open(chemin, 'rb')
+        f.seek(etat['octets'])
+        colonnes = pd.read_csv(chemin, nrows=0).columns.tolist()
+        options = {'header': None, 'names': colonnes}
+        with f:
+            if etat['octets'] < taille:
+                yield from iterer_blocs(f, SCHEMA_PASSAGES, taille_bloc, rapport=rapport,
+                                        options_lecture=options)
+        return
+
+    # Première ingestion ou fichier remplacé : relecture complète filtrée par date ; les
+    # passages datés du filigrane même sont repris, ceux déjà chargés sont écartés ensuite
+    if ingestion is None:
+        blocs = iterer_blocs(chemin, SCHEMA_PASSAGES, taille_bloc, rapport=rapport)
+    else:
+        passages, rapport_lecture = ingestion
+        rapport['lignes_lues'] = rapport_lecture['lignes_lues']
+        blocs = (passages.iloc[i:i + taille_bloc] for i in range(0, len(passages), taille_bloc))
+    for bloc in blocs:
+        if etat is not None and etat['derniere_date'] is not None:
+            bloc = bloc[bloc['Date Passage'] >= pd.Timestamp(etat['derniere_date'])]
+        yield bloc
+
+
+def _deja_charges(conn, empreintes):
+    """Masque des passages dont l'empreinte est déjà dans la table `passages`."""
+    colonne = passages_table.c.empreinte
+    existantes = []
+    for i in range(0, len(empreintes), TAILLE_LOT):
+        lot = empreintes[i:i + TAILLE_LOT].tolist()
+        existantes += conn.execute(select(colonne).where(colonne.in_(lot))).scalars().all()
+    return np.isin(empreintes, np.asarray(existantes, dtype=np.int64))
+
+
+def reconstruire_agregats(engine, conn):
+    """Recalcule les agrégats mensuels depuis la table `passages`."""
+    for table in (agg_mensuels_table, agg_forfait_table):
+        conn.execute(delete(table))
+        conn.execute(text(traduire(REQUETES_AGREGATS[table.name], engine.dialect.name)))
+        incrementer_version(engine, conn, table.name)
+
+
+def agreger_mensuel(passages):
+    """Comptes de passages par (annee, mois) et par (annee, mois, Type Forfait)."""
+    dates = passages['Date Passage']
+    cles = pd.DataFrame({
+        'annee': dates.dt.year,
+        'mois': dates.dt.month,
+        'Type Forfait': passages['Type Forfait'].astype(object).fillna(FORFAIT_ABSENT),
+    })[dates.notna()]
+    mensuels = cles.groupby(['annee', 'mois']).size().rename('passages').reset_index()
+    forfaits = cles.groupby(['annee', 'mois', 'Type Forfait']).size().rename('passages').reset_index()
+    return mensuels, forfaits
+
+
+def ingerer_passages(engine, chemin, taille_bloc=TAILLE_BLOC, ingestion=None):
+    """Ingère les nouveaux passages de `chemin` et met à jour les agrégats par différence.
+
+    Seuls les passages absents de la base sont chargés et comptés. Sans
+    filigrane pour `chemin`, les agrégats sont d'abord recalculés depuis la
+    table `passages`. `ingestion` est le résultat `(passages, rapport)` d'une
+    lecture de `chemin` déjà faite (par exemple `cache.charger_passages_cache`),
+    utilisé au lieu de relire tout le fichier.
+
+    La synthèse par client (`resume_clients`) des clients ayant de nouveaux
+    passages est ensuite recalculée dans la base (celle de tous les clients à
+    la première ingestion). Renvoie le nombre de passages ajoutés et le
+    nouveau filigrane.
+    """
+    creer_schema(engine)
+    chemin = Path(chemin).resolve()
+    source = str(chemin)
+    etat = lire_etat(engine, source)
+
+    rapport = {}
+    nouveaux = 0
+    clients_touches = []
+    derniere_date = etat['derniere_date'] if etat else None
+
+    with engine.begin() as conn:
+        if etat is None:
+            reconstruire_agregats(engine, conn)
+        # Les blocs sont dédoublonnés entre eux : sur une table vide, aucun n'est à vérifier
+        table_vide = conn.execute(select(passages_table.c.empreinte).limit(1)).first() is None
+
+        for bloc in _nouveaux_blocs(chemin, etat, taille_bloc, rapport, ingestion):
+            if bloc.empty:
+                continue
+            bloc = preparer_passages(engine, bloc, conn)
+            if not table_vide:
+                bloc = bloc[~_deja_charges(conn, bloc['empreinte'].to_numpy())]
+            if bloc.empty:
+                continue
+            mensuels, forfaits = agreger_mensuel(bloc)
+            charger_table(engine, bloc, passages_table, conn=conn)
+            charger_table(engine, mensuels, agg_mensuels_table, cumuler=('passages',), conn=conn)
+            charger_table(engine, forfaits, agg_forfait_table, cumuler=('passages',), conn=conn)
+
+            nouveaux += len(bloc)
+            clients_touches.append(bloc['ID Client'].unique())
+            maximum = bloc['Date Passage'].max()
+            if pd.notna(maximum) and (derniere_date is None or maximum > pd.Timestamp(derniere_date)):
+                derniere_date = maximum.to_pydatetime()
+
+        nouvel_etat = {
+            'source': source,
+            'octets': chemin.stat().st_size,
+            'empreinte_debut': _empreinte_debut(chemin),
+            'derniere_date': derniere_date,
+            'lignes': (etat['lignes'] if etat else 0) + rapport.get('lignes_lues', 0),
+            'mis_a_jour': datetime.now(),
+        }
+        charger_table(engine, pd.DataFrame([nouvel_etat]), etat_ingestion_table, conn=conn)
+
+    if etat is None:
+        rafraichir_resume(engine)
+    elif clients_touches:
+        rafraichir_resume(engine, np.concatenate(clients_touches))
+
+    return {'nouveaux_passages': nouveaux, **nouvel_etat}
+
+
+def main(argv=None):
+    from arkose.backend import URL_PAR_DEFAUT, VARIABLE_URL, creer_moteur
+
+    parser = argparse.ArgumentParser(prog='python -m arkose.incremental',
+                                     description="Ingestion incrémentale d'un export de passages")
+    parser.add_argument('passages', type=Path)
+    parser.add_argument('--url', default=None, help=f"URL SQLAlchemy (par défaut ${VARIABLE_URL} ou {URL_PAR_DEFAUT})")
+    args = parser.parse_args(argv)
+
+    resultat = ingerer_passages(creer_moteur(args.url), args.passages)
+    print(f"{resultat['nouveaux_passages']} nouveau(x) passage(s), "
+          f"dernier passage ingéré : {resultat['derniere_date']}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,146 @@
+"""Index compact des visites par client (format CSR).
+
+Les passages sont triés par client puis par date ; les dates sont stockées en
+jours depuis le 1970-01-01 (int32) avec un indicateur de tarif réduit, soit
+5 octets par visite. `offsets[c]:offsets[c + 1]` délimite les visites du
+client de code `c`, les codes étant la numérotation dense des `ID Client`
+triés. Les visites d'un client sur une période se trouvent par dichotomie.
+
+Les dates sont à la journée : l'heure des passages n'est pas conservée. Les
+recherches vectorisées sur de nombreux clients (`compter`, `positions`)
+construisent à leur première utilisation une clé triée (client, jour) de
+8 octets par visite.
+"""
+
+from functools import cached_property
+
+import numpy as np
+import pandas as pd
+
+from arkose.frequentation import compter_mois_avant_dernier
+from arkose.tarifs import est_tarif_reduit
+
+EPOQUE = np.datetime64('1970-01-01', 'D')
+
+
+def en_jours(dates):
+    """Dates (Series, Timestamp, chaîne...) -> jours depuis l'époque (int32)."""
+    valeurs = pd.to_datetime(dates)
+    if isinstance(valeurs, pd.Timestamp):
+        return np.int32((np.datetime64(valeurs, 'D') - EPOQUE).astype(np.int64))
+    return (np.asarray(valeurs, dtype='datetime64[D]') - EPOQUE).astype(np.int32)
+
+
+def en_dates(jours):
+    return EPOQUE + np.asarray(jours).astype('timedelta64[D]')
+
+
+def jours_en_mois(jours):
+    """Jours depuis l'époque -> numéro de mois absolu (année * 12 + mois - 1)."""
+    return en_dates(jours).astype('datetime64[M]').astype(np.int64) + 1970 * 12
+
+
+class IndexVisites:
+    """Visites groupées par client : `ids`, `offsets`, `jours` et `reduit`."""
+
+    def __init__(self, ids, offsets, jours, reduit):
+        self.ids = ids
+        self.offsets = offsets
+        self.jours = jours
+        self.reduit = reduit
+
+    @classmethod
+    def depuis_passages(cls, passages):
+        """Construit l'index à partir d'un DataFrame `ID Client`, `Date Passage` (et `Designation`)."""
+        passages = passages[passages['Date Passage'].notna()]
+        ids, codes = np.unique(passages['ID Client'].to_numpy(dtype=np.int64), return_inverse=True)
+        jours = en_jours(passages['Date Passage'])
+        if 'Designation' in passages:
+            reduit = est_tarif_reduit(passages['Designation']).to_numpy()
+        else:
+            reduit = np.zeros(len(passages), dtype=bool)
+
+        ordre = np.lexsort((jours, codes))
+        offsets = np.zeros(len(ids) + 1, dtype=np.int64)
+        np.cumsum(np.bincount(codes, minlength=len(ids)), out=offsets[1:])
+        return cls(ids, offsets, jours[ordre], reduit[ordre])
+
+    def __len__(self):
+        return len(self.jours)
+
+    @property
+    def n_clients(self):
+        return len(self.ids)
+
+    @property
+    def nbytes(self):
+        return self.ids.nbytes + self.offsets.nbytes + self.jours.nbytes + self.reduit.nbytes
+
+    @cached_property
+    def codes_visites(self):
+        """Code client de chaque visite (construit à la première utilisation)."""
+        return np.repeat(np.arange(self.n_clients, dtype=np.int64), np.diff(self.offsets))
+
+    @cached_property
+    def _cles(self):
+        # Clé globale triée (client, jour) pour les recherches vectorisées
+        return (self.codes_visites << 32) + (self.jours.astype(np.int64) - np.iinfo(np.int32).min)
+
+    def codes(self, ids_clients):
+        """Codes denses des `ids_clients` (-1 pour un client inconnu)."""
+        ids_clients = np.asarray(ids_clients, dtype=np.int64)
+        positions = np.searchsorted(self.ids, ids_clients)
+        positions[positions == self.n_clients] = 0
+        return np.where(self.ids[positions] == ids_clients, positions, -1)
+
+    def visites(self, id_client, debut=None, fin=None):
+        """Jours des visites de `id_client` entre `debut` et `fin` inclus (vue, sans copie)."""
+        code = self.codes([id_client])[0]
+        if code < 0:
+            return self.jours[:0]
+        segment = self.jours[self.offsets[code]:self.offsets[code + 1]]
+        gauche = 0 if debut is None else np.searchsorted(segment, en_jours(debut), side='left')
+        droite = len(segment) if fin is None else np.searchsorted(segment, en_jours(fin), side='right')
+        return segment[gauche:droite]
+
+    def positions(self, codes, jours, side='right'):
+        """Pour chaque couple (client, jour), position de recherche dans les visites du client.
+
+        Avec `side='right'`, `positions(...) - offsets[codes]` est le nombre
+        de visites du client jusqu'au jour inclus.
+        """
+        codes = np.asarray(codes, dtype=np.int64)
+        cles = (codes << 32) + (np.asarray(jours, dtype=np.int64) - np.iinfo(np.int32).min)
+        return np.searchsorted(self._cles, cles, side=side)
+
+    def compter(self, ids_clients, debut, fin):
+        """Nombre de visites de chaque client entre `debut` et `fin` inclus (vectorisé)."""
+        codes = self.codes(ids_clients)
+        connus = codes >= 0
+        comptes = np.zeros(len(codes), dtype=np.int64)
+        c = codes[connus]
+        comptes[connus] = (self.positions(c, np.full(len(c), en_jours(fin)), 'right')
+                           - self.positions(c, np.full(len(c), en_jours(debut)), 'left'))
+        return comptes
+
+    def nb_passages(self):
+        return np.diff(self.offsets)
+
+    def premier_jour(self):
+        # Un client de l'index a toujours au moins une visite
+        return self.jours[self.offsets[:-1]]
+
+    def dernier_jour(self):
+        return self.jours[self.offsets[1:] - 1]
+
+    def nb_reduits(self):
+        cumul = np.concatenate([[0], np.cumsum(self.reduit, dtype=np.int64)])
+        return cumul[self.offsets[1:]] - cumul[self.offsets[:-1]]
+
+    def profil_mensuel(self, n_mois=12):
+        """Équivalent de `calculate_monthly_visits`, clients triés par `ID Client`."""
+        comptes = compter_mois_avant_dernier(self.codes_visites, jours_en_mois(self.jours),
+                                             self.n_clients, n_mois)
+        result = pd.DataFrame(comptes, columns=[f'mois_{i}' for i in range(1, n_mois + 1)])
+        result.insert(0, 'ID Client', self.ids)
+        return result
@@ -0,0 +1,171 @@
+"""Ingestion typée et par blocs des exports CSV clients et passages."""
+
+import numpy as np
+import pandas as pd
+from pandas.api.types import union_categoricals
+
+# Taille par défaut des blocs lus en mémoire (en lignes)
+TAILLE_BLOC = 100_000
+
+# Schémas déclarés des deux exports : types des colonnes, format des dates et
+# colonnes entières obligatoires (lues en entiers nullables pour compter les
+# valeurs manquantes, puis converties une fois les lignes incomplètes écartées)
+SCHEMA_CLIENTS = {
+    'types': {
+        'ID Client': 'Int64',
+        'Etablissement Inscription': 'category',
+    },
+    'dates': {
+        'Date Inscription': '%Y-%m-%d %H:%M:%S',
+        'Date de naissance': '%Y-%m-%d',
+    },
+    'entiers': {
+        'ID Client': 'int64',
+    },
+}
+
+SCHEMA_PASSAGES = {
+    'types': {
+        'Etablissement': 'category',
+        'ID Client': 'Int64',
+        'Type Forfait': 'category',
+        'Designation': 'category',
+        'Quantite': 'Int16',
+    },
+    'dates': {
+        'Date Passage': '%Y-%m-%d %H:%M:%S',
+    },
+    'entiers': {
+        'ID Client': 'int64',
+        'Quantite': 'int16',
+    },
+}
+
+
+class _EmpreintesVues:
+    """Empreintes (hash 64 bits) des lignes déjà vues, pour dédupliquer entre blocs.
+
+    Les empreintes sont rangées en quelques tableaux triés de tailles
+    décroissantes, fusionnés au fil de l'eau comme dans un arbre LSM : la
+    recherche se fait par dichotomie et la mémoire reste de 8 octets par ligne
+    distincte.
+    """
+
+    def __init__(self):
+        self._niveaux = []
+
+    def filtrer_nouvelles(self, empreintes):
+        nouvelles = ~pd.Series(empreintes).duplicated().to_numpy()
+        for niveau in self._niveaux:
+            positions = np.searchsorted(niveau, empreintes)
+            positions[positions == len(niveau)] = 0
+            nouvelles &= niveau[positions] != empreintes
+        self._ajouter(np.sort(empreintes[nouvelles]))
+        return nouvelles
+
+    def _ajouter(self, niveau):
+        while self._niveaux and len(self._niveaux[-1]) <= len(niveau):
+            niveau = np.sort(np.concatenate([self._niveaux.pop(), niveau]))
+        if len(niveau):
+            self._niveaux.append(niveau)
+
+
+def _cumuler(compteurs, valeurs):
+    for colonne, n in valeurs.items():
+        compteurs[colonne] = compteurs.get(colonne, 0) + int(n)
+
+
+def iterer_blocs(chemin, schema, taille_bloc=TAILLE_BLOC, dedupliquer=True, rapport=None,
+                 options_lecture=None, controles=()):
+    """Lit `chemin` (chemin ou fichier ouvert) par blocs de `taille_bloc` lignes typés selon `schema`.
+
+    Les dates sont converties avec leur format déclaré (les valeurs invalides
+    deviennent NaT), les lignes sans valeur dans une colonne entière
+    obligatoire (`schema['entiers']`) sont écartées et, si `dedupliquer` est
+    vrai, les lignes identiques à une ligne déjà lue (dans le bloc ou dans un
+    bloc précédent) le sont aussi. Les compteurs de lecture sont cumulés dans
+    le dictionnaire `rapport` : lignes lues, lignes incomplètes, doublons,
+    valeurs manquantes et dates invalides par colonne.
+    Chaque fonction de `controles` est appelée avec le bloc dédoublonné et
+    `rapport`, pour des contrôles supplémentaires dans la même passe (voir
+    `arkose.qualite`). `options_lecture` est transmis à `pd.read_csv`.
+    """
+    if rapport is None:
+        rapport = {}
+    rapport.setdefault('lignes_lues', 0)
+    rapport.setdefault('lignes_incompletes', 0)
+    rapport.setdefault('doublons_supprimes', 0)
+    rapport.setdefault('valeurs_manquantes', {})
+    rapport.setdefault('dates_invalides', {})
+
+    vues = _EmpreintesVues() if dedupliquer else None
+    lecteur = pd.read_csv(
+        chemin,
+        dtype=schema['types'],
+        chunksize=taille_bloc,
+        **(options_lecture or {}),
+    )
+    with lecteur:
+        for bloc in lecteur:
+            rapport['lignes_lues'] += len(bloc)
+            manquantes = bloc.isna().sum()
+            _cumuler(rapport['valeurs_manquantes'], manquantes)
+            for colonne, format_date in schema['dates'].items():
+                bloc[colonne] = pd.to_datetime(bloc[colonne], format=format_date, errors='coerce')
+                # Valeurs présentes mais illisibles au format déclaré
+                _cumuler(rapport['dates_invalides'], {colonne: bloc[colonne].isna().sum() - manquantes[colonne]})
+
+            incompletes = bloc[list(schema['entiers'])].isna().any(axis=1)
+            rapport['lignes_incompletes'] += int(incompletes.sum())
+            bloc = bloc[~incompletes].astype(schema['entiers'])
+
+            if vues is not None:
+                empreintes = pd.util.hash_pandas_object(bloc, index=False).to_numpy()
+                nouvelles = vues.filtrer_nouvelles(empreintes)
+                rapport['doublons_supprimes'] += int((~nouvelles).sum())
+                bloc = bloc[nouvelles]
+
+            for controle in controles:
+                controle(bloc, rapport)
+            yield bloc
+
+
+def _concatener(blocs, schema):
+    colonnes = list(blocs[0].columns)
+    categorielles = [c for c, t in schema['types'].items() if t == 'category' and c in colonnes]
+
+    # Les blocs ont chacun leurs propres catégories : on les unifie avant de
+    # concaténer pour ne pas retomber sur des colonnes de type object
+    unifiees = {c: union_categoricals([b[c] for b in blocs], sort_categories=True) for c in categorielles}
+    df = pd.concat([b.drop(columns=categorielles) for b in blocs], ignore_index=True)
+    for colonne, valeurs in unifiees.items():
+        df[colonne] = valeurs
+    return df[colonnes]
+
+
+def charger_csv(chemin, schema, taille_bloc=TAILLE_BLOC, dedupliquer=True, controles=()):
+    """Charge `chemin` par blocs et renvoie `(df, rapport)` (`controles` : voir `iterer_blocs`)."""
+    rapport = {}
+    blocs = list(iterer_blocs(chemin, schema, taille_bloc, dedupliquer, rapport, controles=controles))
+    if not blocs:
+        blocs = [pd.read_csv(chemin, dtype=schema['types'], nrows=0, parse_dates=list(schema['dates']))
+                 .astype(schema['entiers'])]
+    return _concatener(blocs, schema), rapport
+
+
+def charger_clients(chemin, taille_bloc=TAILLE_BLOC, controles=()):
+    return charger_csv(chemin, SCHEMA_CLIENTS, taille_bloc, controles=controles)
+
+
+def charger_passages(chemin, taille_bloc=TAILLE_BLOC, controles=()):
+    return charger_csv(chemin, SCHEMA_PASSAGES, taille_bloc, controles=controles)
+
+
+def ajouter_age(clients, date_reference):
+    """Ajoute la colonne `age` (en années révolues à `date_reference`)."""
+    naissance = clients['Date de naissance']
+    clients['age'] = ((date_reference.year - naissance.dt.year) -
+                      ((date_reference.month < naissance.dt.month) |
+                       ((date_reference.month == naissance.dt.month) &
+                        (date_reference.day < naissance.dt.day))))
+    return clients
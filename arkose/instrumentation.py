@@ -0,0 +1,242 @@
+"""Mesures par étape : temps, CPU, mémoire, lignes traitées et temps passé en SQL.
+
+    mesures = Instrumentation()
+    with mesures.etape('ingestion') as etape:
+        clients, rapport = charger_clients(chemin)
+        etape.lignes(entree=rapport['lignes_lues'], sortie=len(clients))
+    mesures.exporter_jsonl('instrumentation.jsonl')
+    mesures.ecrire_prometheus('metriques.prom')
+
+Chaque étape relève :
+- le temps écoulé ;
+- le temps CPU du thread qui l'exécute (les étapes peuvent tourner en parallèle) ;
+- la hausse du pic de mémoire résidente du processus (RSS) ;
+- les lignes en entrée et en sortie ;
+- le nombre et la durée des requêtes SQL exécutées dans l'étape, en erreur
+  comprises (via les événements SQLAlchemy).
+
+Une étape peut être profilée (cProfile, ou pyinstrument par échantillonnage).
+"""
+
+import contextvars
+import json
+import sys
+import threading
+import time
+import uuid
+from contextlib import contextmanager
+from datetime import datetime
+from pathlib import Path
+
+try:
+    import resource
+except ImportError:  # Windows
+    resource = None
+
+PROFILEURS = ('cprofile', 'echantillonnage')
+
+# Étape en cours dans le thread (ou la tâche) courant, pour y imputer lignes et requêtes
+_etape_courante = contextvars.ContextVar('etape_courante', default=None)
+
+_ecoute_sql = threading.Lock()
+_ecoute_installee = False
+
+
+def _pic_rss():
+    # Pic de mémoire résidente du processus, en octets (None si indisponible)
+    if resource is None:
+        return None
+    pic = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return pic if sys.platform == 'darwin' else pic * 1024
+
+
+def _imputer_requete(contexte):
+    # Le début est porté par le contexte d'exécution de la requête, et non par
+    # la connexion : une requête en erreur ne décale pas les suivantes
+    debut = getattr(contexte, '_arkose_debut', None)
+    etape = _etape_courante.get()
+    if debut is not None and etape is not None:
+        etape.requetes += 1
+        etape.secondes_sql += time.perf_counter() - debut
+
+
+def _avant_requete(conn, curseur, instruction, parametres, contexte, plusieurs):
+    if contexte is not None:
+        contexte._arkose_debut = time.perf_counter()
+
+
+def _apres_requete(conn, curseur, instruction, parametres, contexte, plusieurs):
+    _imputer_requete(contexte)
+
+
+def _erreur_requete(contexte_exception):
+    _imputer_requete(contexte_exception.execution_context)
+
+
+def ecouter_sql():
+    """Installe (une fois) l'écoute des requêtes de tous les moteurs SQLAlchemy.
+
+    Appelée par `backend.creer_moteur`, et par `Instrumentation` si SQLAlchemy
+    est déjà importé : une exécution qui n'utilise pas la base ne l'importe pas.
+    """
+    from sqlalchemy import event
+    from sqlalchemy.engine import Engine
+
+    global _ecoute_installee
+    with _ecoute_sql:
+        if not _ecoute_installee:
+            event.listen(Engine, 'before_cursor_execute', _avant_requete)
+            event.listen(Engine, 'after_cursor_execute', _apres_requete)
+            event.listen(Engine, 'handle_error', _erreur_requete)
+            _ecoute_installee = True
+
+
+class MesureEtape:
+    """Compteurs d'une étape en cours, complétés par le code de l'étape (`lignes`)."""
+
+    def __init__(self, nom):
+        self.nom = nom
+        self.lignes_entree = None
+        self.lignes_sortie = None
+        self.requetes = 0
+        self.secondes_sql = 0.0
+
+    def lignes(self, entree=None, sortie=None):
+        """Ajoute des lignes lues (`entree`) ou produites (`sortie`) par l'étape."""
+        if entree is not None:
+            self.lignes_entree = (self.lignes_entree or 0) + int(entree)
+        if sortie is not None:
+            self.lignes_sortie = (self.lignes_sortie or 0) + int(sortie)
+
+
+def lignes(entree=None, sortie=None):
+    """Impute des lignes à l'étape en cours ; sans effet hors d'une étape instrumentée."""
+    etape = _etape_courante.get()
+    if etape is not None:
+        etape.lignes(entree, sortie)
+
+
+class Instrumentation:
+    """Collecte des mesures des étapes d'une exécution.
+
+    `profiler` désigne l'étape à profiler, avec `profileur` ('cprofile' ou
+    'echantillonnage') ; le profil est écrit dans `repertoire_profils`.
+    """
+
+    def __init__(self, profiler=None, profileur='cprofile', repertoire_profils='.'):
+        if profileur not in PROFILEURS:
+            raise ValueError(f"Profileur inconnu : {profileur!r} (choix : {', '.join(PROFILEURS)})")
+        self.execution = uuid.uuid4().hex[:12]
+        self.profiler = profiler
+        self.profileur = profileur
+        self.repertoire_profils = Path(repertoire_profils)
+        self.mesures = []
+        self._verrou = threading.Lock()
+        if 'sqlalchemy' in sys.modules:
+            ecouter_sql()
+
+    @contextmanager
+    def etape(self, nom, lignes_entree=None):
+        mesure = MesureEtape(nom)
+        mesure.lignes(entree=lignes_entree)
+        jeton = _etape_courante.set(mesure)
+        profil = self._demarrer_profil() if nom == self.profiler else None
+        debut = datetime.now()
+        pic_avant = _pic_rss()
+        cpu, horloge = time.thread_time(), time.perf_counter()
+        erreur = None
+        try:
+            yield mesure
+        except BaseException as exc:
+            erreur = type(exc).__name__
+            raise
+        finally:
+            secondes = time.perf_counter() - horloge
+            cpu = time.thread_time() - cpu
+            pic_apres = _pic_rss()
+            if profil is not None:
+                self._terminer_profil(profil, nom)
+            _etape_courante.reset(jeton)
+            with self._verrou:
+                self.mesures.append({
+                    'execution': self.execution,
+                    'etape': nom,
+                    'debut': debut.isoformat(timespec='milliseconds'),
+                    'secondes': round(secondes, 6),
+                    'cpu_secondes': round(cpu, 6),
+                    'rss_pic_delta_octets': None if pic_avant is None else pic_apres - pic_avant,
+                    'lignes_entree': mesure.lignes_entree,
+                    'lignes_sortie': mesure.lignes_sortie,
+                    'requetes_sql': mesure.requetes,
+                    'sql_secondes': round(mesure.secondes_sql, 6),
+                    'erreur': erreur,
+                })
+
+    def envelopper(self, nom, fonction):
+        """`fonction` exécutée dans l'étape `nom`."""
+        def executer(*args, **kwargs):
+            with self.etape(nom):
+                return fonction(*args, **kwargs)
+        return executer
+
+    def _demarrer_profil(self):
+        if self.profileur == 'cprofile':
+            import cProfile
+            profil = cProfile.Profile()
+            profil.enable()
+            return profil
+        try:
+            from pyinstrument import Profiler
+        except ImportError as exc:
+            raise ImportError("Le profilage par échantillonnage nécessite pyinstrument "
+                              "(pip install pyinstrument)") from exc
+        profil = Profiler(interval=0.001)
+        profil.start()
+        return profil
+
+    def _terminer_profil(self, profil, nom):
+        self.repertoire_profils.mkdir(parents=True, exist_ok=True)
+        base = self.repertoire_profils / f'profil-{nom}'
+        if self.profileur == 'cprofile':
+            import io
+            import pstats
+            profil.disable()
+            profil.dump_stats(base.with_suffix('.prof'))
+            texte = io.StringIO()
+            pstats.Stats(profil, stream=texte).sort_stats('cumulative').print_stats(30)
+            base.with_suffix('.txt').write_text(texte.getvalue(), encoding='utf-8')
+        else:
+            profil.stop()
+            base.with_suffix('.txt').write_text(profil.output_text(), encoding='utf-8')
+
+    def exporter_jsonl(self, chemin):
+        """Ajoute une ligne JSON par étape mesurée à la fin de `chemin`."""
+        with open(chemin, 'a', encoding='utf-8') as f:
+            for mesure in self.mesures:
+                f.write(json.dumps(mesure, ensure_ascii=False) + '\n')
+
+    def texte_prometheus(self):
+        """Mesures de la dernière exécution au format texte de Prometheus (collecteur de fichiers)."""
+        series = [
+            ('arkose_etape_secondes', "Durée de l'étape", 'secondes'),
+            ('arkose_etape_cpu_secondes', "Temps CPU de l'étape", 'cpu_secondes'),
+            ('arkose_etape_rss_pic_delta_octets', 'Hausse du pic de mémoire résidente', 'rss_pic_delta_octets'),
+            ('arkose_etape_lignes_entree', "Lignes lues par l'étape", 'lignes_entree'),
+            ('arkose_etape_lignes_sortie', "Lignes produites par l'étape", 'lignes_sortie'),
+            ('arkose_etape_requetes_sql', 'Requêtes SQL exécutées', 'requetes_sql'),
+            ('arkose_etape_sql_secondes', 'Temps passé en requêtes SQL', 'sql_secondes'),
+        ]
+        lignes_texte = []
+        for metrique, aide, cle in series:
+            lignes_texte += [f'# HELP {metrique} {aide}', f'# TYPE {metrique} gauge']
+            for mesure in self.mesures:
+                if mesure[cle] is not None:
+                    etape = mesure['etape'].replace('\\', '\\\\').replace('"', '\\"')
+                    lignes_texte.append(f'{metrique}{{etape="{etape}"}} {mesure[cle]}')
+        return '\n'.join(lignes_texte) + '\n'
+
+    def ecrire_prometheus(self, chemin):
+        chemin = Path(chemin)
+        temporaire = chemin.with_name(chemin.name + '.tmp')
+        temporaire.write_text(self.texte_prometheus(), encoding='utf-8')
+        temporaire.replace(chemin)
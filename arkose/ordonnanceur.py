@@ -0,0 +1,71 @@
+"""Exécution concurrente des étapes selon leurs dépendances.
+
+Chaque étape ne démarre qu'une fois ses dépendances terminées ; les étapes
+indépendantes (les analyses, qui ne font que lire la base) s'exécutent en
+même temps sur un pool de threads. Les requêtes passent par le pool de
+connexions borné du moteur : le temps total tend vers celui de la chaîne
+d'étapes la plus longue plutôt que vers la somme des étapes.
+"""
+
+import time
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+
+
+def ordre_topologique(noms, dependances):
+    """Étapes de `noms` dans un ordre compatible avec `dependances` ; lève ValueError sur un cycle."""
+    restantes = {n: {d for d in dependances.get(n, ()) if d in noms} for n in noms}
+    ordre = []
+    while restantes:
+        pretes = [n for n in noms if n in restantes and not restantes[n]]
+        if not pretes:
+            raise ValueError(f"Dépendances circulaires entre les étapes : {', '.join(restantes)}")
+        for n in pretes:
+            del restantes[n]
+            for attentes in restantes.values():
+                attentes.discard(n)
+        ordre += pretes
+    return ordre
+
+
+def executer_etapes(etapes, dependances, contexte, paralleles=4, rapport=None):
+    """Exécute `etapes` ({nom: fonction(contexte)}) en respectant `dependances` ({nom: [noms]}).
+
+    Seules les dépendances présentes dans `etapes` sont attendues. `rapport`
+    est appelé à la fin de chaque étape avec son nom et sa durée. Renvoie
+    `{nom: {'debut', 'secondes'}}` (début relatif au lancement). Si une
+    étape échoue, les étapes non démarrées sont abandonnées et l'exception
+    est relevée une fois les étapes en cours terminées.
+    """
+    ordre = ordre_topologique(list(etapes), dependances)
+    attentes = {n: {d for d in dependances.get(n, ()) if d in etapes} for n in ordre}
+    durees = {}
+    origine = time.perf_counter()
+
+    def executer(nom):
+        debut = time.perf_counter()
+        etapes[nom](contexte)
+        durees[nom] = {'debut': debut - origine, 'secondes': time.perf_counter() - debut}
+        return nom
+
+    with ThreadPoolExecutor(max_workers=paralleles, thread_name_prefix='etape') as pool:
+        en_cours, terminees, erreur = {}, set(), None
+        while True:
+            if erreur is None:
+                for nom in ordre:
+                    if nom not in terminees and nom not in en_cours.values() and attentes[nom] <= terminees:
+                        en_cours[pool.submit(executer, nom)] = nom
+            if not en_cours:
+                break
+            finis, _ = wait(en_cours, return_when=FIRST_COMPLETED)
+            for futur in finis:
+                nom = en_cours.pop(futur)
+                if futur.exception() is not None:
+                    erreur = erreur or futur.exception()
+                    continue
+                terminees.add(nom)
+                if rapport is not None:
+                    rapport(nom, durees[nom]['secondes'])
+
+    if erreur is not None:
+        raise erreur
+    return durees
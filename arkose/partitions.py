@@ -0,0 +1,198 @@
+"""Exécution partitionnée (map-reduce) des agrégats de l'étude.
+
+    python -m arkose.partitions clients.csv passages.csv --partitions 8 --sortie sortie_partitions/
+
+Passages et clients sont répartis en N partitions selon une empreinte de
+`ID Client` : toutes les lignes d'un client tombent dans la même partition,
+si bien que les agrégats par client (ancienneté, profil mensuel) se calculent
+sans échange entre partitions. Chaque partition produit, dans un pool de
+processus, des agrégats partiels qui ne sont que des comptes et des sommes
+entières : ils se combinent exactement par addition, dans n'importe quel
+ordre. Les résultats finaux sont identiques à ceux d'un calcul en un seul
+processus (`n_partitions=1`) et ont la forme des fonctions de
+`arkose.analyses`.
+"""
+
+import argparse
+import os
+from concurrent.futures import ProcessPoolExecutor
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+
+from arkose.frequentation import BORNES_ANCIENNETE, TRANCHES_ANCIENNETE, calculate_monthly_visits
+from arkose.resume_clients import N_MOIS
+from arkose.tarifs import LIBELLES_TARIF, TARIF_REDUIT, classes_tarif
+
+# Tranches d'âge de la section 6 (bornes incluses), comme REQUETE_TRANCHES_AGE
+TRANCHES_AGE = [(17, 20), (21, 25), (26, 30), (31, 35), (36, 40), (41, 45), (46, 47)]
+
+
+def numeros_partition(ids_clients, n_partitions):
+    """Partition (0 .. n_partitions - 1) de chaque identifiant client.
+
+    L'empreinte (`pd.util.hash_array`, à clé fixe) ne dépend ni du processus
+    ni de la machine : un client est toujours affecté à la même partition.
+    """
+    empreintes = pd.util.hash_array(np.asarray(ids_clients, dtype=np.int64))
+    return (empreintes % np.uint64(n_partitions)).astype(np.int64)
+
+
+def partitionner(passages, clients, n_partitions):
+    """Liste de `n_partitions` couples `(passages, clients)` répartis par client."""
+    numeros_passages = numeros_partition(passages['ID Client'], n_partitions)
+    numeros_clients = numeros_partition(clients['ID Client'], n_partitions)
+    return [(passages[numeros_passages == i], clients[numeros_clients == i]) for i in range(n_partitions)]
+
+
+def agreger_partition(passages, clients, n_mois=N_MOIS):
+    """Agrégats partiels d'une partition (tous les passages de ses clients).
+
+    `clients` doit porter la colonne `age` (voir `ingestion.ajouter_age`).
+    """
+    dates = passages['Date Passage']
+    datees = passages[dates.notna()]
+
+    mensuels = (pd.DataFrame({'annee': datees['Date Passage'].dt.year, 'mois': datees['Date Passage'].dt.month})
+                .groupby(['annee', 'mois']).size())
+    # GROUP BY `Type Forfait` : les forfaits absents forment un groupe
+    forfaits = passages['Type Forfait'].astype(object).value_counts(dropna=False)
+    classes = classes_tarif(passages['Designation'])
+    tarifs = classes[classes >= 0].value_counts()
+    ages = clients['age'].dropna().astype(np.int64).value_counts()
+
+    # Ancienneté : jours entre l'inscription et le dernier passage, à la journée
+    derniers = datees.groupby('ID Client')['Date Passage'].max()
+    inscriptions = clients.set_index('ID Client')['Date Inscription']
+    jours = (derniers.dt.normalize() - inscriptions.reindex(derniers.index).dt.normalize()).dt.days
+    tranches = pd.cut(jours, bins=BORNES_ANCIENNETE, labels=False, right=False)
+    anciennete = np.bincount(tranches.dropna().astype(np.int64), minlength=len(TRANCHES_ANCIENNETE))
+
+    profils = calculate_monthly_visits(datees, n_mois)
+    return {
+        'mensuels': mensuels,
+        'forfaits': forfaits,
+        'tarifs': tarifs,
+        'ages': ages,
+        'anciennete': anciennete,
+        'profil_sommes': profils.drop(columns='ID Client').sum().to_numpy(dtype=np.int64),
+        'profil_clients': len(profils),
+    }
+
+
+def _sommer(series):
+    # Somme par étiquette de comptes partiels ; les étiquettes absentes (NaN) forment un groupe
+    serie = pd.concat(series)
+    niveaux = list(range(serie.index.nlevels))
+    return serie.groupby(level=niveaux, dropna=False).sum()
+
+
+def combiner(partiels):
+    """Combine des agrégats partiels (de partitions ou de combinaisons précédentes)."""
+    partiels = list(partiels)
+    return {
+        **{cle: _sommer([p[cle] for p in partiels]) for cle in ('mensuels', 'forfaits', 'tarifs', 'ages')},
+        **{cle: sum(p[cle] for p in partiels) for cle in ('anciennete', 'profil_sommes', 'profil_clients')},
+    }
+
+
+def finaliser(partiel, n_mois=N_MOIS):
+    """Résultats de l'étude à partir des agrégats combinés (mêmes formes que `arkose.analyses`)."""
+    ages = partiel['ages'].sort_index()
+    nb_ages = int(ages.sum())
+    # ROUND(AVG(age)) : arrondi au plus proche, moitiés vers le haut (âges positifs)
+    age_moyen = float(np.floor(float((ages.index * ages).sum()) / nb_ages + 0.5)) if nb_ages else None
+
+    tarifs = partiel['tarifs'].sort_index()
+    nb_tarifes = int(tarifs.sum())
+    proportion_reduit = round(int(tarifs.get(TARIF_REDUIT, 0)) * 100.0 / nb_tarifes, 2) if nb_tarifes else None
+    repartition_tarifs = pd.DataFrame({'classe_tarif': tarifs.index.astype(np.int64),
+                                       'tarif': tarifs.index.map(LIBELLES_TARIF),
+                                       'passages': tarifs.to_numpy(np.int64)})
+    repartition_tarifs['Proportion'] = (repartition_tarifs['passages'] / repartition_tarifs['passages'].sum()) * 100
+
+    frequentation = partiel['mensuels'].rename('passages').reset_index().sort_values(['annee', 'mois'],
+                                                                                      ignore_index=True)
+
+    forfaits = (partiel['forfaits'].rename('nombre_utilisations').rename_axis('Type Forfait').reset_index()
+                .sort_values(['nombre_utilisations', 'Type Forfait'], ascending=[False, True], ignore_index=True))
+    forfaits['Proportion'] = (forfaits['nombre_utilisations'] / forfaits['nombre_utilisations'].sum()) * 100
+
+    dans_tranches = ages[(ages.index >= TRANCHES_AGE[0][0]) & (ages.index <= TRANCHES_AGE[-1][1])]
+    effectifs = [int(dans_tranches[(dans_tranches.index >= bas) & (dans_tranches.index <= haut)].sum())
+                 for bas, haut in TRANCHES_AGE]
+    tranches_age = pd.DataFrame({'age_group': [f'{bas}-{haut}' for bas, haut in TRANCHES_AGE],
+                                 'count': effectifs})
+    tranches_age = tranches_age[tranches_age['count'] > 0].reset_index(drop=True)
+    tranches_age['percentage'] = tranches_age['count'] * 100.0 / int(dans_tranches.sum())
+
+    repartition_anciennete = pd.DataFrame({
+        'Tranche': pd.Categorical(TRANCHES_ANCIENNETE, categories=TRANCHES_ANCIENNETE, ordered=True),
+        'clients': np.asarray(partiel['anciennete'], dtype=np.int64),
+    })
+
+    nb_profils = partiel['profil_clients']
+    profil_mensuel = pd.DataFrame({
+        'Mois': [f'M-{i}' for i in range(1, n_mois + 1)],
+        'Moyenne': np.asarray(partiel['profil_sommes']) / nb_profils if nb_profils else np.full(n_mois, np.nan),
+    })
+
+    return {
+        'age_moyen': age_moyen,
+        'proportion_tarif_reduit': proportion_reduit,
+        'repartition_tarifs': repartition_tarifs,
+        'frequentation_mensuelle': frequentation,
+        'types_forfaits': forfaits,
+        'tranches_age': tranches_age,
+        'repartition_anciennete': repartition_anciennete,
+        'profil_mensuel': profil_mensuel,
+    }
+
+
+def analyser_partitions(passages, clients, n_partitions=None, processus=None):
+    """Agrégats de l'étude calculés sur `n_partitions` partitions par client, dans un pool de processus.
+
+    Par défaut, une partition par cœur. `processus=1` calcule les partitions
+    dans le processus courant.
+    """
+    n_partitions = n_partitions or os.cpu_count() or 1
+    processus = processus or min(n_partitions, os.cpu_count() or 1)
+    partitions = partitionner(passages, clients, n_partitions)
+    if processus == 1:
+        partiels = [agreger_partition(p, c) for p, c in partitions]
+    else:
+        with ProcessPoolExecutor(max_workers=processus) as pool:
+            partiels = list(pool.map(agreger_partition, *zip(*partitions)))
+    return finaliser(combiner(partiels))
+
+
+def main(argv=None):
+    from arkose.ingestion import ajouter_age, charger_clients, charger_passages
+
+    parser = argparse.ArgumentParser(prog='python -m arkose.partitions',
+                                     description="Agrégats de l'étude calculés par partitions de clients")
+    parser.add_argument('clients', type=Path)
+    parser.add_argument('passages', type=Path)
+    parser.add_argument('--partitions', default=None, type=int, help="nombre de partitions (une par cœur par défaut)")
+    parser.add_argument('--processus', default=None, type=int)
+    parser.add_argument('--date-reference', default='2022-12-31', type=pd.Timestamp)
+    parser.add_argument('--sortie', default='sortie_partitions', type=Path)
+    args = parser.parse_args(argv)
+
+    clients, _ = charger_clients(args.clients)
+    clients = ajouter_age(clients, args.date_reference)
+    passages, _ = charger_passages(args.passages)
+    resultats = analyser_partitions(passages, clients, args.partitions, args.processus)
+
+    args.sortie.mkdir(parents=True, exist_ok=True)
+    for nom, resultat in resultats.items():
+        if isinstance(resultat, pd.DataFrame):
+            resultat.to_csv(args.sortie / f'{nom}.csv', index=False)
+        else:
+            print(f"{nom} : {resultat}")
+    print(f"tables -> {args.sortie}")
+
+
+if __name__ == '__main__':
+    main()
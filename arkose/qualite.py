@@ -0,0 +1,134 @@
+"""Contrôle de qualité des exports en une seule lecture, bloc par bloc.
+
+    python -m arkose.qualite clients.csv passages.csv --sortie qualite.json
+
+Chaque export est lu une fois, en flux : les contrôles sont faits pendant
+l'ingestion par blocs (`ingestion.iterer_blocs`), sur le bloc déjà typé et
+dédoublonné :
+- valeurs manquantes et dates illisibles par colonne ;
+- lignes incomplètes (sans identifiant client ou quantité), écartées ;
+- doublons (nombre et pourcentage) ;
+- âges hors de [0, 120] ans à la date de référence ;
+- passages orphelins (client absent de l'export des clients).
+
+Seuls les identifiants des clients sont conservés entre les deux lectures.
+
+Les mêmes contrôles peuvent être confiés aux chargeurs de l'étude
+(`cache.charger_clients_cache(..., controles=[controle_ages(date)])`, etc.) :
+le rapport est alors tiré de l'ingestion elle-même (`rapport_qualite`), sans
+lecture supplémentaire des exports.
+"""
+
+import argparse
+import json
+import sys
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+
+from arkose.ingestion import SCHEMA_CLIENTS, SCHEMA_PASSAGES, TAILLE_BLOC, ajouter_age, iterer_blocs
+
+AGE_MINIMUM = 0
+AGE_MAXIMUM = 120
+
+
+def controle_ages(date_reference, minimum=AGE_MINIMUM, maximum=AGE_MAXIMUM):
+    """Contrôle comptant dans `ages_incoherents` les clients d'âge hors de [minimum, maximum]."""
+    date_reference = pd.Timestamp(date_reference)
+
+    def controler(bloc, rapport):
+        ages = ajouter_age(bloc[['Date de naissance']].copy(), date_reference)['age']
+        incoherents = int(((ages < minimum) | (ages > maximum)).sum())
+        rapport['ages_incoherents'] = rapport.get('ages_incoherents', 0) + incoherents
+    # Clé du contrôle pour le cache des données nettoyées (arkose/cache.py)
+    controler.cle = f'ages{pd.Timestamp(date_reference):%Y%m%d}_{minimum}_{maximum}'
+    return controler
+
+
+def controle_orphelins(ids_clients):
+    """Contrôle comptant dans `passages_orphelins` les passages d'un client absent de `ids_clients`.
+
+    Il dépend de l'export des clients : sans clé, il n'entre pas dans celle
+    du cache des passages et se refait sur les passages relus du cache.
+    """
+    connus = np.unique(np.asarray(ids_clients, dtype=np.int64))
+
+    def controler(bloc, rapport):
+        ids = bloc['ID Client'].to_numpy(np.int64)
+        positions = np.minimum(np.searchsorted(connus, ids), max(len(connus) - 1, 0))
+        orphelins = len(ids) if not len(connus) else int(np.count_nonzero(connus[positions] != ids))
+        rapport['passages_orphelins'] = rapport.get('passages_orphelins', 0) + orphelins
+    controler.cle = None
+    return controler
+
+
+def _resumer(rapport):
+    lues = rapport['lignes_lues']
+    incompletes = rapport.get('lignes_incompletes', 0)
+    resume = {
+        'lignes_lues': lues,
+        'lignes_conservees': lues - incompletes - rapport['doublons_supprimes'],
+        'lignes_incompletes': incompletes,
+        'doublons': rapport['doublons_supprimes'],
+        'pourcentage_doublons': round(rapport['doublons_supprimes'] / lues * 100, 4) if lues else 0.0,
+        'valeurs_manquantes': rapport['valeurs_manquantes'],
+        'dates_invalides': rapport['dates_invalides'],
+    }
+    for cle in ('ages_incoherents', 'passages_orphelins'):
+        if cle in rapport:
+            resume[cle] = rapport[cle]
+    if 'passages_orphelins' in rapport:
+        conservees = resume['lignes_conservees']
+        resume['pourcentage_orphelins'] = (round(rapport['passages_orphelins'] / conservees * 100, 4)
+                                           if conservees else 0.0)
+    return resume
+
+
+def rapport_qualite(rapport_clients, rapport_passages, date_reference):
+    """Rapport de qualité à partir des rapports d'ingestion des deux exports.
+
+    Les rapports doivent avoir été produits avec `controle_ages` (clients) et
+    `controle_orphelins` (passages).
+    """
+    return {'date_reference': pd.Timestamp(date_reference).date().isoformat(),
+            'clients': _resumer({'ages_incoherents': 0, **rapport_clients}),
+            'passages': _resumer({'passages_orphelins': 0, **rapport_passages})}
+
+
+def valider(chemin_clients, chemin_passages, date_reference, taille_bloc=TAILLE_BLOC):
+    """Rapport de qualité `{'clients': {...}, 'passages': {...}}` des deux exports, lus une fois chacun, en flux."""
+    date_reference = pd.Timestamp(date_reference)
+
+    rapport_clients, ids = {}, []
+    controles = [controle_ages(date_reference), lambda bloc, _: ids.append(bloc['ID Client'].to_numpy(np.int64))]
+    for _ in iterer_blocs(chemin_clients, SCHEMA_CLIENTS, taille_bloc, rapport=rapport_clients, controles=controles):
+        pass
+
+    rapport_passages = {}
+    controles = [controle_orphelins(np.concatenate(ids) if ids else [])]
+    for _ in iterer_blocs(chemin_passages, SCHEMA_PASSAGES, taille_bloc, rapport=rapport_passages, controles=controles):
+        pass
+
+    return rapport_qualite(rapport_clients, rapport_passages, date_reference)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(prog='python -m arkose.qualite',
+                                     description="Rapport de qualité des exports clients et passages")
+    parser.add_argument('clients', type=Path)
+    parser.add_argument('passages', type=Path)
+    parser.add_argument('--date-reference', default='2022-12-31')
+    parser.add_argument('--sortie', default=None, type=Path, help="fichier JSON du rapport (sortie standard sinon)")
+    args = parser.parse_args(argv)
+
+    texte = json.dumps(valider(args.clients, args.passages, args.date_reference), indent=2, ensure_ascii=False)
+    if args.sortie is None:
+        print(texte)
+    else:
+        args.sortie.write_text(texte, encoding='utf-8')
+        print(f"rapport de qualité -> {args.sortie}", file=sys.stderr)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,196 @@
+"""Rapport HTML de l'étude, régénéré par un graphe d'étapes à empreintes (voir `arkose.graphe`).
+
+    python -m arkose.rapport --clients clients.csv --passages passages.csv --sortie sortie/
+
+Les étapes sont :
+- l'ingestion des clients, leur nettoyage (âge, incohérences) et le
+  chargement de la base (passages compris) ;
+- chaque analyse de `arkose.analyses` et chaque figure ;
+- l'assemblage du rapport.
+
+Seules les étapes dont le code, les paramètres ou les fichiers lus ont
+changé sont réexécutées, avec leurs descendantes. Par exemple, modifier la
+requête des tranches d'âge relance l'analyse `tranches_age`, sa figure et
+l'assemblage ; le reste est relu du cache.
+
+Le cache suppose que la base n'est alimentée que par ce rapport ou par
+`arkose` ; après une modification externe, `--forcer chargement`.
+"""
+
+import argparse
+import base64
+import html
+import io
+import os
+import sys
+from datetime import date
+from pathlib import Path
+
+from arkose import analyses, backend, cache_requetes, graphiques
+from arkose.backend import URL_PAR_DEFAUT, VARIABLE_URL, creer_moteur
+from arkose.cache import REPERTOIRE_CACHE
+from arkose.graphe import GrapheEtapes
+
+# Analyses du rapport dans leur ordre de présentation : titre et figure éventuelle
+ANALYSES = {
+    'age_moyen': ("Âge moyen des clients", None),
+    'proportion_tarif_reduit': ("Proportion des passages en tarif réduit (%)", None),
+    'frequentation_mensuelle': ("Fréquentation mensuelle", 'figure_frequentation_mensuelle'),
+    'repartition_inscriptions': ("Inscriptions par année", 'figure_inscriptions'),
+    'repartition_anciennete': ("Durée de fréquentation (inscription -> dernier passage)", 'figure_anciennete'),
+    'profil_mensuel': ("Fréquentation moyenne sur les 12 mois précédant le départ", 'figure_profil_mensuel'),
+    'types_forfaits': ("Types de forfaits", 'figure_forfaits'),
+    'tranches_age': ("Tranches d'âge", 'figure_tranches_age'),
+}
+
+# Modules des requêtes (traduction SQL, cache des résultats) joints au code des
+# étapes qui lisent la base : ils sont appelés par des méthodes (`CACHE.lire_sql`)
+MODULES_SQL = [backend, cache_requetes]
+
+_MOTEURS = {}
+
+
+def _moteur(url):
+    # Un moteur par base pour toutes les étapes d'une exécution
+    if url not in _MOTEURS:
+        _MOTEURS[url] = creer_moteur(url)
+    return _MOTEURS[url]
+
+
+def _ingerer_clients(chemin):
+    from arkose.ingestion import charger_clients
+    return charger_clients(chemin)
+
+
+def _nettoyer(ingestion, date_reference):
+    import pandas as pd
+    from arkose.ingestion import ajouter_age
+    from arkose.qualite import controle_ages
+
+    clients, rapport = ingestion
+    controles = {}
+    controle_ages(date_reference)(clients, controles)
+    clients = ajouter_age(clients.copy(), pd.Timestamp(date_reference))
+    return clients, {**rapport, 'clients': len(clients), 'incoherences_age': controles['ages_incoherents']}
+
+
+def _charger(nettoyage, url, chemin_passages):
+    from arkose.chargement import charger_table, clients_table, creer_schema
+    from arkose.incremental import ingerer_passages
+
+    clients, _ = nettoyage
+    engine = _moteur(url)
+    creer_schema(engine)
+    stats = charger_table(engine, clients, clients_table)
+    ingestion = ingerer_passages(engine, chemin_passages)
+    return {'clients': stats['lignes'], 'nouveaux_passages': ingestion['nouveaux_passages'],
+            'dernier_passage': str(ingestion['derniere_date'])}
+
+
+def _analyser(chargement, nom, url):
+    return getattr(analyses, nom)(_moteur(url))
+
+
+def _dessiner(donnees, fabrique):
+    graphiques.utiliser_backend_sans_affichage()
+    import matplotlib.pyplot as plt
+
+    fig = getattr(graphiques, fabrique)(donnees)
+    tampon = io.BytesIO()
+    fig.savefig(tampon, format='png', bbox_inches='tight')
+    plt.close(fig)
+    return tampon.getvalue()
+
+
+def _section(titre, resultat, image):
+    import pandas as pd
+
+    morceaux = [f'<h2>{html.escape(titre)}</h2>']
+    if isinstance(resultat, pd.Series):
+        resultat = resultat.reset_index()
+    if isinstance(resultat, pd.DataFrame):
+        morceaux.append(resultat.to_html(index=False, float_format=lambda v: f'{v:.2f}', border=0))
+    else:
+        morceaux.append(f'<p class="valeur">{html.escape(str(resultat))}</p>')
+    if image is not None:
+        morceaux.append(f'<img alt="{html.escape(titre)}" src="data:image/png;base64,'
+                        f'{base64.b64encode(image).decode()}">')
+    return '\n'.join(morceaux)
+
+
+def _assembler(nettoyage, chargement, *sorties, noms):
+    _, qualite = nettoyage
+    resultats = dict(zip(noms, sorties))
+    sections = [_section(titre, resultats[nom], resultats.get(f'figure_{nom}'))
+                for nom, (titre, _) in ANALYSES.items()]
+    donnees = (f"<p>{qualite['clients']} clients ({qualite['doublons_supprimes']} doublon(s) supprimé(s), "
+               f"{qualite['incoherences_age']} âge(s) incohérent(s)) ; {chargement['nouveaux_passages']} "
+               f"nouveau(x) passage(s) chargé(s), dernier passage : {html.escape(chargement['dernier_passage'])}.</p>")
+    return '\n'.join([
+        '<!DOCTYPE html>',
+        '<html lang="fr"><head><meta charset="utf-8"><title>Étude de fidélisation Arkose</title>',
+        '<style>body{font-family:sans-serif;max-width:60em;margin:auto}img{max-width:100%}'
+        'table{border-collapse:collapse}td,th{padding:.2em .6em;text-align:right}'
+        '.valeur{font-size:1.6em}</style></head><body>',
+        '<h1>Étude de fidélisation Arkose</h1>',
+        donnees,
+        *sections,
+        '</body></html>',
+    ])
+
+
+def construire_graphe(chemin_clients, chemin_passages, date_reference, url=None,
+                      repertoire=REPERTOIRE_CACHE / 'etapes'):
+    """Graphe des étapes du rapport ; l'étape finale `rapport` renvoie le HTML."""
+    url = url or os.environ.get(VARIABLE_URL) or URL_PAR_DEFAUT
+    chemin_clients, chemin_passages = str(Path(chemin_clients).resolve()), str(Path(chemin_passages).resolve())
+
+    graphe = GrapheEtapes(repertoire)
+    graphe.ajouter('ingestion_clients', _ingerer_clients, parametres={'chemin': chemin_clients},
+                   fichiers=[chemin_clients])
+    graphe.ajouter('nettoyage', _nettoyer, ['ingestion_clients'],
+                   parametres={'date_reference': str(date_reference)})
+    graphe.ajouter('chargement', _charger, ['nettoyage'],
+                   parametres={'url': url, 'chemin_passages': chemin_passages}, fichiers=[chemin_passages],
+                   code=MODULES_SQL)
+
+    entrees = []
+    for nom, (_, fabrique) in ANALYSES.items():
+        entrees.append(graphe.ajouter(nom, _analyser, ['chargement'], parametres={'nom': nom, 'url': url},
+                                      code=[getattr(analyses, nom), *MODULES_SQL]))
+        if fabrique is not None:
+            entrees.append(graphe.ajouter(f'figure_{nom}', _dessiner, [nom], parametres={'fabrique': fabrique},
+                                          code=[getattr(graphiques, fabrique)]))
+
+    graphe.ajouter('rapport', _assembler, ['nettoyage', 'chargement', *entrees], parametres={'noms': entrees})
+    return graphe
+
+
+def main(argv=None):
+    from arkose.cli import CLIENTS_PAR_DEFAUT, DATE_REFERENCE_PAR_DEFAUT, PASSAGES_PAR_DEFAUT
+
+    parser = argparse.ArgumentParser(prog='python -m arkose.rapport',
+                                     description="Rapport HTML de l'étude, régénéré étape par étape")
+    parser.add_argument('--clients', default=CLIENTS_PAR_DEFAUT, type=Path)
+    parser.add_argument('--passages', default=PASSAGES_PAR_DEFAUT, type=Path)
+    parser.add_argument('--date-reference', default=DATE_REFERENCE_PAR_DEFAUT, type=date.fromisoformat)
+    parser.add_argument('--url', default=None, help="URL SQLAlchemy de la base (SQLite local par défaut)")
+    parser.add_argument('--sortie', default='sortie', type=Path)
+    parser.add_argument('--forcer', default=[], type=lambda v: v.split(','),
+                        help="étapes à réexécuter même si elles sont à jour, séparées par des virgules")
+    args = parser.parse_args(argv)
+
+    graphe = construire_graphe(args.clients, args.passages, args.date_reference, args.url)
+    page = graphe.executer(['rapport'], forcer=args.forcer,
+                           rapport=lambda nom, statut, secondes: print(f"{nom} : {statut} ({secondes:.2f} s)",
+                                                                        file=sys.stderr))['rapport']
+    args.sortie.mkdir(parents=True, exist_ok=True)
+    (args.sortie / 'rapport.html').write_text(page, encoding='utf-8')
+    executees = sum(statut == 'executee' for statut in graphe.statuts.values())
+    print(f"rapport -> {args.sortie / 'rapport.html'} ({executees} étape(s) exécutée(s), "
+          f"{len(graphe.statuts) - executees} relue(s))", file=sys.stderr)
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
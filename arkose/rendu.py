@@ -0,0 +1,90 @@
+"""Rendu parallèle des graphiques à partir des tables agrégées.
+
+Chaque figure est décrite par son nom, la fonction de `arkose.graphiques` qui
+la dessine et ses données. Les figures sont dessinées dans un pool de
+processus (matplotlib n'étant pas thread-safe) et enregistrées dans les
+formats demandés. Une figure n'est pas redessinée si l'empreinte de ses
+données, de sa fonction et du code de `arkose.graphiques` n'a pas changé
+depuis le rendu précédent (empreintes conservées dans `.empreintes.json`).
+"""
+
+import hashlib
+import inspect
+import json
+import os
+from concurrent.futures import ProcessPoolExecutor
+from pathlib import Path
+
+import pandas as pd
+
+from arkose import graphiques
+
+FICHIER_EMPREINTES = '.empreintes.json'
+
+
+def empreinte_donnees(donnees):
+    """Empreinte SHA-256 du contenu d'un DataFrame, d'une Series ou d'une valeur simple."""
+    h = hashlib.sha256()
+    if isinstance(donnees, (pd.DataFrame, pd.Series)):
+        h.update(pd.util.hash_pandas_object(donnees, index=True).to_numpy().tobytes())
+        if isinstance(donnees, pd.DataFrame):
+            h.update(repr(list(donnees.columns)).encode())
+            h.update(repr(list(donnees.dtypes.astype(str))).encode())
+        else:
+            h.update(repr((donnees.name, str(donnees.dtype), donnees.index.name)).encode())
+    else:
+        h.update(repr(donnees).encode())
+    return h.hexdigest()
+
+
+def _empreinte_code():
+    return hashlib.sha256(inspect.getsource(graphiques).encode()).hexdigest()
+
+
+def _rendre(nom_fonction, donnees, chemin_sans_extension, formats):
+    # Exécuté dans un processus du pool
+    graphiques.utiliser_backend_sans_affichage()
+    fabrique = getattr(graphiques, nom_fonction)
+    return graphiques.enregistrer(fabrique(donnees), chemin_sans_extension, formats)
+
+
+def rendre_figures(figures, repertoire, formats=('png',), processus=None):
+    """Dessine et enregistre `figures` dans `repertoire`.
+
+    `figures` associe à chaque nom de figure un couple
+    `(nom de la fonction de arkose.graphiques, données)`. Renvoie, pour chaque
+    figure, la liste des fichiers écrits et si elle a été réutilisée.
+    `processus=1` dessine dans le processus courant.
+    """
+    repertoire = Path(repertoire)
+    repertoire.mkdir(parents=True, exist_ok=True)
+    fichier_empreintes = repertoire / FICHIER_EMPREINTES
+    empreintes = json.loads(fichier_empreintes.read_text()) if fichier_empreintes.exists() else {}
+    code = _empreinte_code()
+
+    resultats, a_rendre = {}, {}
+    for nom, (nom_fonction, donnees) in figures.items():
+        empreinte = hashlib.sha256(
+            f'{nom_fonction}|{code}|{empreinte_donnees(donnees)}'.encode()).hexdigest()
+        chemins = [str(repertoire / f'{nom}.{extension}') for extension in formats]
+        if empreintes.get(nom) == empreinte and all(os.path.exists(c) for c in chemins):
+            resultats[nom] = {'fichiers': chemins, 'reutilisee': True}
+        else:
+            a_rendre[nom] = (nom_fonction, donnees, empreinte)
+
+    if a_rendre:
+        processus = processus or min(len(a_rendre), os.cpu_count() or 1)
+        if processus == 1:
+            rendus = {nom: _rendre(f, d, repertoire / nom, formats) for nom, (f, d, _) in a_rendre.items()}
+        else:
+            with ProcessPoolExecutor(max_workers=processus) as pool:
+                futurs = {nom: pool.submit(_rendre, f, d, repertoire / nom, formats)
+                          for nom, (f, d, _) in a_rendre.items()}
+                rendus = {nom: futur.result() for nom, futur in futurs.items()}
+
+        for nom, chemins in rendus.items():
+            empreintes[nom] = a_rendre[nom][2]
+            resultats[nom] = {'fichiers': [str(c) for c in chemins], 'reutilisee': False}
+        fichier_empreintes.write_text(json.dumps(empreintes, indent=1, sort_keys=True))
+
+    return resultats
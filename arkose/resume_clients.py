@@ -0,0 +1,149 @@
+"""Table de synthèse par client, partagée par les analyses d'ancienneté et de désertion.
+
+Pour chaque client ayant au moins un passage : premier et dernier passage,
+nombre de passages, part des passages en tarif réduit, ancienneté (jours
+entre l'inscription et le dernier passage, comme le DATEDIFF de la section
+7.1) et fréquentation des 12 mois précédant le dernier passage
+(`mois_1` .. `mois_12`, comme `calculate_monthly_visits`).
+
+La synthèse est calculée dans la base (`REQUETE_RESUME`, fonctions de
+fenêtre) et rafraîchie client par client : seuls les clients ayant de
+nouveaux passages sont recalculés, et aucun passage ne quitte la base.
+"""
+
+import numpy as np
+import pandas as pd
+from sqlalchemy import (BigInteger, Column, DateTime, Float, Integer, Table,
+                        bindparam, delete, text)
+
+from arkose.backend import traduire
+from arkose.chargement import creer_schema, incrementer_version, metadata
+from arkose.tarifs import TARIF_REDUIT
+
+N_MOIS = 12
+
+# Nombre d'identifiants par requête IN (...) lors du rafraîchissement
+TAILLE_LOT_CLIENTS = 500
+
+resume_clients_table = Table(
+    'resume_clients', metadata,
+    Column('ID Client', BigInteger, primary_key=True, autoincrement=False),
+    Column('Date Inscription', DateTime),
+    Column('premier_passage', DateTime),
+    Column('dernier_passage', DateTime),
+    Column('nb_passages', Integer),
+    Column('nb_passages_reduit', Integer),
+    Column('part_reduit', Float),
+    Column('anciennete_jours', Integer),
+    *[Column(f'mois_{i}', Integer) for i in range(1, N_MOIS + 1)],
+)
+
+# Synthèse des clients retenus par `{filtre}` (dialecte MySQL, traduite par le
+# backend). Profil : passages comptés par client et par mois absolu, décalage
+# au dernier mois du client par fenêtre, puis un compte par décalage
+# (mois_N_MOIS = mois du dernier passage).
+REQUETE_RESUME = f"""
+    INSERT INTO resume_clients ({', '.join(f'`{c.name}`' for c in resume_clients_table.columns)})
+    WITH passages_clients AS (
+        SELECT `ID Client`, `Date Passage`, classe_tarif
+        FROM passages
+        WHERE `Date Passage` IS NOT NULL {{filtre}}
+    ),
+    totaux AS (
+        SELECT
+            `ID Client`,
+            MIN(`Date Passage`) AS premier_passage,
+            MAX(`Date Passage`) AS dernier_passage,
+            COUNT(*) AS nb_passages,
+            SUM(CASE WHEN classe_tarif = {TARIF_REDUIT} THEN 1 ELSE 0 END) AS nb_passages_reduit
+        FROM passages_clients
+        GROUP BY `ID Client`
+    ),
+    passages_mois AS (
+        SELECT
+            `ID Client`,
+            YEAR(`Date Passage`) * 12 + MONTH(`Date Passage`) - 1 AS mois,
+            COUNT(*) AS passages
+        FROM passages_clients
+        GROUP BY `ID Client`, mois
+    ),
+    decalages AS (
+        SELECT
+            `ID Client`,
+            passages,
+            MAX(mois) OVER (PARTITION BY `ID Client`) - mois AS decalage
+        FROM passages_mois
+    ),
+    profils AS (
+        SELECT
+            `ID Client`,
+            {', '.join(f'SUM(CASE WHEN decalage = {N_MOIS - i} THEN passages ELSE 0 END) AS mois_{i}'
+                       for i in range(1, N_MOIS + 1))}
+        FROM decalages
+        WHERE decalage < {N_MOIS}
+        GROUP BY `ID Client`
+    )
+    SELECT
+        t.`ID Client`,
+        c.`Date Inscription`,
+        t.premier_passage,
+        t.dernier_passage,
+        t.nb_passages,
+        t.nb_passages_reduit,
+        t.nb_passages_reduit * 1.0 / t.nb_passages AS part_reduit,
+        DATEDIFF(t.dernier_passage, c.`Date Inscription`) AS anciennete_jours,
+        {', '.join(f'p.mois_{i}' for i in range(1, N_MOIS + 1))}
+    FROM totaux AS t
+    JOIN profils AS p ON p.`ID Client` = t.`ID Client`
+    LEFT JOIN clients AS c ON c.`ID Client` = t.`ID Client`
+"""
+
+
+def resumer_index(index, clients):
+    """Même synthèse que `REQUETE_RESUME`, calculée en mémoire sur un `IndexVisites`.
+
+    Les premier et dernier passages sont à la journée (l'index ne conserve
+    pas l'heure).
+    """
+    from arkose.index_visites import en_dates
+
+    resume = pd.DataFrame({
+        'ID Client': index.ids,
+        'premier_passage': pd.to_datetime(en_dates(index.premier_jour())),
+        'dernier_passage': pd.to_datetime(en_dates(index.dernier_jour())),
+        'nb_passages': index.nb_passages(),
+        'nb_passages_reduit': index.nb_reduits(),
+    })
+    resume['part_reduit'] = resume['nb_passages_reduit'] / resume['nb_passages']
+
+    inscriptions = clients.set_index('ID Client')['Date Inscription']
+    resume['Date Inscription'] = inscriptions.reindex(resume['ID Client']).to_numpy()
+    resume['anciennete_jours'] = (resume['dernier_passage']
+                                  - resume['Date Inscription'].dt.normalize()).dt.days
+
+    return resume.merge(index.profil_mensuel(N_MOIS), on='ID Client', how='left')
+
+
+def rafraichir_resume(engine, ids_clients=None, taille_lot=TAILLE_LOT_CLIENTS):
+    """Recalcule dans la base la synthèse des clients `ids_clients` (de tous les clients si None).
+
+    Les clients sont traités par lots via l'index (ID Client, Date Passage) :
+    le coût est proportionnel à l'historique des clients touchés. Renvoie le
+    nombre de clients recalculés (None pour un recalcul complet).
+    """
+    creer_schema(engine)
+    dialecte = engine.dialect.name
+    with engine.begin() as conn:
+        if ids_clients is None:
+            conn.execute(delete(resume_clients_table))
+            conn.execute(text(traduire(REQUETE_RESUME.format(filtre=''), dialecte)))
+        else:
+            ids_clients = np.unique(np.asarray(ids_clients, dtype=np.int64)).tolist()
+            requete = text(traduire(REQUETE_RESUME.format(filtre='AND `ID Client` IN :ids'), dialecte))
+            requete = requete.bindparams(bindparam('ids', expanding=True))
+            for i in range(0, len(ids_clients), taille_lot):
+                lot = ids_clients[i:i + taille_lot]
+                conn.execute(delete(resume_clients_table).where(resume_clients_table.c['ID Client'].in_(lot)))
+                conn.execute(requete, {'ids': lot})
+        incrementer_version(engine, conn, resume_clients_table.name)
+    return None if ids_clients is None else len(ids_clients)
@@ -0,0 +1,140 @@
+"""Score de risque de désertion de tous les clients à une date donnée.
+
+Applique en une passe vectorisée la recommandation de l'étude (« surveiller
+taux de fréquentation en baisse sur + de 2 mois », inactivité de plus de 90
+jours) : pour chaque client venu avant la date, la fréquentation des 12 mois
+complets précédents (même comptage que `calculate_monthly_visits`, aligné
+sur la date de score), le nombre de mois consécutifs en baisse, les jours
+d'inactivité et la tendance récente. Le score est une combinaison pondérée de
+ces indicateurs, ou la probabilité donnée par un modèle (`predict_proba`) si
+l'on en fournit un.
+
+Les scores sont classés, et la liste des clients à risque (hors clients déjà
+perdus) est enregistrée dans la table `scores_clients`.
+"""
+
+import numpy as np
+import pandas as pd
+from sqlalchemy import BigInteger, Boolean, Column, DateTime, Float, Integer, Table, delete
+
+from arkose.chargement import charger_table, creer_schema, incrementer_version, metadata
+from arkose.frequentation import compter_mois_avant
+from arkose.index_visites import en_dates, en_jours, jours_en_mois
+
+N_MOIS = 12
+SEUIL_MOIS_BAISSE = 2
+SEUIL_JOURS_INACTIVITE = 90
+# Au-delà, le client est considéré comme perdu et sort des listes à relancer
+SEUIL_JOURS_PERDU = 365
+
+# Poids des indicateurs (ramenés entre 0 et 1) dans le score par règles
+POIDS = {'baisse': 0.4, 'inactivite': 0.4, 'tendance': 0.2}
+
+COLONNES_MODELE = [f'mois_{i}' for i in range(1, N_MOIS + 1)] + [
+    'mois_baisse', 'jours_inactivite', 'tendance', 'nb_passages']
+
+scores_clients_table = Table(
+    'scores_clients', metadata,
+    Column('date_score', DateTime, primary_key=True),
+    Column('ID Client', BigInteger, primary_key=True, autoincrement=False),
+    Column('score', Float),
+    Column('rang', Integer),
+    Column('a_risque', Boolean),
+    Column('mois_baisse', Integer),
+    Column('jours_inactivite', Integer),
+    Column('tendance', Float),
+)
+
+
+def _baisses_consecutives(comptes):
+    # Nombre de mois consécutifs en baisse (par rapport au mois précédent)
+    # se terminant par le dernier mois de la fenêtre
+    baisse = np.diff(comptes, axis=1)[:, ::-1] < 0
+    return np.where(baisse.all(axis=1), baisse.shape[1], baisse.argmin(axis=1))
+
+
+def indicateurs(index, date_score, n_mois=N_MOIS):
+    """Indicateurs de désertion à `date_score` des clients de `index` venus avant cette date.
+
+    Les `n_mois` mois sont les mois calendaires complets à `date_score`
+    (`mois_{n_mois}` est le dernier) ; les passages postérieurs sont ignorés.
+    """
+    date_score = pd.Timestamp(date_score)
+    jour = en_jours(date_score)
+    dernier_mois = int(jours_en_mois(jour + 1)) - 1
+
+    # Passages jusqu'à la date de score incluse, par client
+    fins = index.positions(np.arange(index.n_clients), np.full(index.n_clients, jour), 'right')
+    nb_passages = fins - index.offsets[:-1]
+    venus = nb_passages > 0
+
+    codes = index.codes_visites
+    retenus = index.jours <= jour
+    comptes = compter_mois_avant(codes[retenus], jours_en_mois(index.jours[retenus]),
+                                 index.n_clients, n_mois, dernier_mois)[venus]
+
+    recents = comptes[:, -3:].mean(axis=1)
+    anciens = comptes[:, :-3].mean(axis=1)
+    df = pd.DataFrame(comptes, columns=[f'mois_{i}' for i in range(1, n_mois + 1)])
+    df.insert(0, 'ID Client', index.ids[venus])
+    df['nb_passages'] = nb_passages[venus]
+    df['dernier_passage'] = pd.to_datetime(en_dates(index.jours[fins[venus] - 1]))
+    df['jours_inactivite'] = jour - index.jours[fins[venus] - 1]
+    df['mois_baisse'] = _baisses_consecutives(comptes)
+    # Rapport fréquentation des 3 derniers mois / mois précédents (1 si pas d'historique)
+    df['tendance'] = np.divide(recents, anciens, out=np.ones(len(df)), where=anciens > 0)
+    return df
+
+
+def score_clients(index, date_score, modele=None, poids=POIDS, seuil_mois=SEUIL_MOIS_BAISSE,
+                  seuil_jours=SEUIL_JOURS_INACTIVITE, seuil_perdu=SEUIL_JOURS_PERDU):
+    """Score de risque de désertion de chaque client à `date_score`, du plus au moins risqué.
+
+    Sans `modele`, le score est la somme pondérée (`poids`) de la série de
+    baisses rapportée à `seuil_mois`, de l'inactivité rapportée à
+    `seuil_jours` et de la chute de fréquentation récente, chaque terme étant
+    borné à 1. Un `modele` doit exposer `predict_proba` et reçoit les
+    colonnes `COLONNES_MODELE`.
+
+    `a_risque` reprend la règle de l'étude (au moins `seuil_mois` mois de
+    baisse ou plus de `seuil_jours` jours sans passage) ; `perdu` marque les
+    clients absents depuis plus de `seuil_perdu` jours.
+    """
+    df = indicateurs(index, date_score)
+
+    if modele is None:
+        df['score'] = (poids['baisse'] * np.minimum(df['mois_baisse'] / seuil_mois, 1)
+                       + poids['inactivite'] * np.minimum(df['jours_inactivite'] / seuil_jours, 1)
+                       + poids['tendance'] * np.clip(1 - df['tendance'], 0, 1))
+    else:
+        df['score'] = modele.predict_proba(df[COLONNES_MODELE].to_numpy())[:, 1]
+
+    df['a_risque'] = (df['mois_baisse'] >= seuil_mois) | (df['jours_inactivite'] > seuil_jours)
+    df['perdu'] = df['jours_inactivite'] > seuil_perdu
+
+    df = df.sort_values(['score', 'ID Client'], ascending=[False, True], ignore_index=True)
+    df['rang'] = np.arange(1, len(df) + 1)
+    return df
+
+
+def clients_a_risque(scores):
+    """Clients à risque encore récupérables, classés par score."""
+    liste = scores[scores['a_risque'] & ~scores['perdu']].reset_index(drop=True)
+    liste['rang'] = np.arange(1, len(liste) + 1)
+    return liste
+
+
+def enregistrer_scores(engine, scores, date_score):
+    """Enregistre la liste à risque de `scores` dans `scores_clients` pour `date_score`.
+
+    La liste précédente de la même date est remplacée, dans la même transaction.
+    """
+    creer_schema(engine)
+    date_score = pd.Timestamp(date_score)
+    liste = clients_a_risque(scores).assign(date_score=date_score)
+    with engine.begin() as conn:
+        supprimees = conn.execute(delete(scores_clients_table)
+                                  .where(scores_clients_table.c.date_score == date_score)).rowcount
+        if supprimees:
+            incrementer_version(engine, conn, scores_clients_table.name)
+        return charger_table(engine, liste, scores_clients_table, conn=conn)
@@ -0,0 +1,222 @@
+"""Génération de jeux de données synthétiques au format des exports clients et passages.
+
+Les données reprennent les caractéristiques de l'extrait de l'étude :
+- saisonnalité (creux estival) ;
+- fermetures sanitaires de 2020-2021 ;
+- mélange de forfaits et de tarifs (environ deux tiers de passages en tarif réduit) ;
+- trajectoires de désengagement : chaque client a une durée de vie, et sa
+  fréquentation décroît sur ses derniers mois.
+
+Les passages sont produits mois par mois, dans l'ordre chronologique comme
+l'export réel, et écrits au fil de l'eau : la mémoire dépend du nombre de
+clients et de passages d'un mois, pas de la taille totale du fichier.
+
+    python -m arkose.synthetique --passages 1000000 --sortie donnees/
+"""
+
+import argparse
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+
+from arkose.index_visites import en_dates, en_jours, jours_en_mois
+
+DEBUT = '2020-01-01'
+FIN = '2022-12-31'
+
+# Fermetures des salles (passages quasi nuls, hors quelques accès dérogatoires)
+FERMETURES = [('2020-03-17', '2020-06-01'), ('2020-10-30', '2021-05-18')]
+TAUX_DEROGATOIRE = 0.02
+
+# Poids relatifs de fréquentation par mois calendaire (janvier -> décembre)
+SAISONNALITE = np.array([1.2, 1.1, 1.1, 1.05, 1.0, 0.85, 0.65, 0.6, 0.95, 1.1, 1.15, 0.95])
+
+# Répartition des heures de passage (0 h -> 23 h)
+HEURES = np.array([0, 0, 0, 0, 0, 0, 0, 2, 2, 3, 6, 5, 5, 5, 7, 9, 6, 8, 15, 10, 6, 9, 2, 0.3])
+
+ETABLISSEMENTS = {'Arkose Nation': 0.3, 'Arkose Lille': 0.2, 'Arkose Didot': 0.14, 'Arkose Toulouse': 0.1,
+                  'Arkose Pont de Sèvres': 0.07, 'Arkose Montreuil': 0.05, 'Arkose Pantin': 0.04,
+                  'Arkose Massy': 0.03, 'Arkose Canal - Bruxelles': 0.03, 'Arkose Prado': 0.02,
+                  'Arkose Genevois': 0.01, 'Arkose Nice': 0.01}
+# Part des passages effectués hors de la salle d'inscription
+TAUX_AUTRE_SALLE = 0.15
+
+# (Type Forfait, désignation plein tarif, désignation tarif réduit, poids)
+FORFAITS = [
+    ('Mensuel', 'Abonnement mensuel', 'Abonnement mensuel Réduit', 0.3),
+    ('Mensuel', 'Abonnement mensuel HH', 'Abonnement mensuel HH Réduit', 0.2),
+    ('Mensuel', 'Abonnement mensuel Couple', 'Abonnement mensuel Couple Réduit', 0.07),
+    ('Mensuel', 'Infinity (mensu)', 'Infinity Réduit', 0.05),
+    ('Annuel', 'Abonnement annuel', 'Abonnement annuel Réduit', 0.15),
+    ('Annuel', 'Abonnement annuel HH', 'Abonnement annuel HH Réduit', 0.04),
+    ('Annuel', 'Infinity', 'Infinity Réduit', 0.02),
+    ('Carnet', 'Carnet de 10 \n Plein tarif', 'Carnet de 10\n Tarif réduit', 0.08),
+    ('Carnet', 'Carnet de 10\n HH', 'Carnet de 10\n HH Réduit', 0.05),
+    ('Unité', '1 séance Plein tarif', '1 séance Tarif réduit', 0.04),
+]
+TAUX_REDUIT = 0.64
+
+# Fréquentation de base (passages par mois actif, loi log-normale) et durée de vie (mois)
+PASSAGES_PAR_MOIS = 6.0
+DUREE_VIE_MOYENNE = 14
+# Nombre maximal de mois de déclin avant le départ (la fréquentation y descend jusqu'à 30 %)
+MOIS_DECLIN_MAX = 4
+
+TAUX_DOUBLONS = 0.0003
+
+
+def _jours_fermes(debut, fin):
+    fermes = np.zeros(fin - debut + 1, dtype=bool)
+    for ouverture, fermeture in FERMETURES:
+        a, b = en_jours(ouverture) - debut, en_jours(fermeture) - debut
+        fermes[max(a, 0):max(b + 1, 0)] = True
+    return fermes
+
+
+class _Population:
+    """Attributs tirés une fois pour tous les clients."""
+
+    def __init__(self, n_clients, debut, fin, rng):
+        self.n = n_clients
+        jours = np.arange(debut, fin - 30)
+        poids = SAISONNALITE[jours_en_mois(jours) % 12] * np.linspace(0.5, 1.5, len(jours))
+        self.inscription = np.sort(rng.choice(jours, n_clients, p=poids / poids.sum())).astype(np.int64)
+        self.depart = self.inscription + np.maximum(
+            rng.exponential(DUREE_VIE_MOYENNE * 30.4, n_clients), 60).astype(np.int64)
+        self.declin = rng.integers(0, MOIS_DECLIN_MAX + 1, n_clients)
+        self.frequence = rng.lognormal(np.log(PASSAGES_PAR_MOIS) - 0.18, 0.6, n_clients)
+        self.salle = rng.choice(len(ETABLISSEMENTS), n_clients, p=_probas(ETABLISSEMENTS.values()))
+        self.forfait = rng.choice(len(FORFAITS), n_clients, p=_probas(f[3] for f in FORFAITS))
+        self.reduit = rng.random(n_clients) < TAUX_REDUIT
+        self.ids = 1_000_000 + np.cumsum(rng.integers(1, 4, n_clients))
+        rng.shuffle(self.ids)
+
+    def intensites(self, premier_jour, dernier_jour, fermes_mois):
+        """Nombre moyen de passages de chaque client sur le mois [premier_jour, dernier_jour]."""
+        debut = np.maximum(self.inscription, premier_jour)
+        fin = np.minimum(self.depart, dernier_jour)
+        actifs = np.clip(fin - debut + 1, 0, None) / (dernier_jour - premier_jour + 1)
+        # Fréquentation décroissante sur les derniers mois avant le départ
+        restant = (self.depart - (premier_jour + dernier_jour) / 2) / 30.4
+        trajectoire = np.where(restant < self.declin,
+                               0.3 + 0.7 * np.clip(restant, 0, None) / np.maximum(self.declin, 1), 1.0)
+        ouverts = 1 - fermes_mois.mean() * (1 - TAUX_DEROGATOIRE)
+        saison = SAISONNALITE[jours_en_mois(premier_jour) % 12]
+        return self.frequence * trajectoire * actifs * saison * ouverts
+
+
+def _probas(poids):
+    poids = np.fromiter(poids, dtype=float)
+    return poids / poids.sum()
+
+
+def _mois(debut, fin):
+    # (premier jour, dernier jour) de chaque mois de [debut, fin]
+    mois = np.arange(jours_en_mois(debut), jours_en_mois(fin) + 1)
+    premiers = ((mois - 1970 * 12).astype('datetime64[M]').astype('datetime64[D]')
+                - np.datetime64('1970-01-01', 'D')).astype(np.int64)
+    return [(max(p, debut), min(d, fin)) for p, d in zip(premiers, np.append(premiers[1:], fin + 1) - 1)]
+
+
+def _passages_du_mois(population, premier_jour, dernier_jour, fermes, rng):
+    intensites = population.intensites(premier_jour, dernier_jour, fermes[premier_jour:dernier_jour + 1])
+    nombres = rng.poisson(intensites)
+    clients = np.repeat(np.arange(population.n), nombres)
+
+    # Jour tiré dans la période d'activité du client pendant le mois
+    debut = np.maximum(population.inscription[clients], premier_jour)
+    fin = np.minimum(population.depart[clients], dernier_jour)
+    jours = debut + (rng.random(len(clients)) * (fin - debut + 1)).astype(np.int64)
+    gardes = ~fermes[jours] | (rng.random(len(jours)) < TAUX_DEROGATOIRE)
+    clients, jours = clients[gardes], jours[gardes]
+    secondes = (rng.choice(24, len(jours), p=HEURES / HEURES.sum()) * 3600
+                + rng.integers(0, 3600, len(jours)))
+    ordre = np.argsort(jours * 86400 + secondes, kind='stable')
+    clients, jours, secondes = clients[ordre], jours[ordre], secondes[ordre]
+
+    salles = population.salle[clients]
+    ailleurs = rng.random(len(clients)) < TAUX_AUTRE_SALLE
+    salles[ailleurs] = rng.choice(len(ETABLISSEMENTS), ailleurs.sum(), p=_probas(ETABLISSEMENTS.values()))
+    forfaits = population.forfait[clients]
+    designations = np.where(population.reduit[clients], 2, 1)
+
+    noms_salles = np.array(list(ETABLISSEMENTS), dtype=object)
+    forfaits_tableau = np.array([f[:3] for f in FORFAITS], dtype=object)
+    return pd.DataFrame({
+        'Date Passage': en_dates(jours) + secondes.astype('timedelta64[s]'),
+        'Etablissement': noms_salles[salles],
+        'ID Client': population.ids[clients],
+        'Type Forfait': forfaits_tableau[forfaits, 0],
+        'Designation': forfaits_tableau[forfaits, designations],
+        'Quantite': 1,
+    })
+
+
+def _population_calibree(n_passages, debut, fin, fermes, rng):
+    # Première population d'essai pour estimer le nombre moyen de passages par
+    # client, puis population définitive à la taille voulue
+    essai = _Population(10_000, debut, fin, np.random.default_rng(rng.integers(2 ** 32)))
+    attendus = sum(essai.intensites(p, d, fermes[p:d + 1]).sum() for p, d in _mois(debut, fin)) / essai.n
+    return _Population(max(int(round(n_passages / attendus)), 1), debut, fin, rng)
+
+
+def generer(repertoire, n_passages, graine=0, debut=DEBUT, fin=FIN, taux_doublons=TAUX_DOUBLONS):
+    """Écrit `clients.csv` et `passages.csv` (environ `n_passages` lignes) dans `repertoire`.
+
+    Renvoie les chemins des deux fichiers et le nombre de lignes écrites.
+    """
+    repertoire = Path(repertoire)
+    repertoire.mkdir(parents=True, exist_ok=True)
+    rng = np.random.default_rng(graine)
+    debut, fin = int(en_jours(debut)), int(en_jours(fin))
+    fermes = np.zeros(fin + 1, dtype=bool)
+    fermes[debut:] = _jours_fermes(debut, fin)
+
+    population = _population_calibree(n_passages, debut, fin, fermes, rng)
+
+    chemin_clients = repertoire / 'clients.csv'
+    ages = rng.integers(17 * 365, 60 * 365, population.n)
+    clients = pd.DataFrame({
+        'ID Client': population.ids,
+        'Etablissement Inscription': np.array(list(ETABLISSEMENTS), dtype=object)[population.salle],
+        'Date Inscription': en_dates(population.inscription) + rng.integers(9 * 3600, 22 * 3600, population.n)
+        .astype('timedelta64[s]'),
+        # La date de naissance est exportée sans heure
+        'Date de naissance': pd.Series(en_dates(population.inscription - ages)).dt.strftime('%Y-%m-%d'),
+    }).sample(frac=1, random_state=graine)
+    clients.to_csv(chemin_clients, index=False, date_format='%Y-%m-%d %H:%M:%S')
+
+    chemin_passages = repertoire / 'passages.csv'
+    lignes = 0
+    with open(chemin_passages, 'w', encoding='utf-8', newline='') as f:
+        for i, (premier_jour, dernier_jour) in enumerate(_mois(debut, fin)):
+            mois = _passages_du_mois(population, premier_jour, dernier_jour, fermes, rng)
+            # Quelques lignes exportées deux fois, comme dans l'extrait réel
+            doublons = np.flatnonzero(rng.random(len(mois)) < taux_doublons)
+            mois = mois.iloc[np.sort(np.concatenate([np.arange(len(mois)), doublons]))]
+            mois.to_csv(f, index=False, header=(i == 0), date_format='%Y-%m-%d %H:%M:%S')
+            lignes += len(mois)
+
+    return {'clients': chemin_clients, 'passages': chemin_passages,
+            'lignes_clients': population.n, 'lignes_passages': lignes}
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(prog='python -m arkose.synthetique',
+                                     description="Génère des exports clients/passages synthétiques")
+    parser.add_argument('--passages', default=1_000_000, type=lambda v: int(float(v)),
+                        help="nombre approximatif de passages (ex : 1e6)")
+    parser.add_argument('--sortie', default='donnees_synthetiques', type=Path)
+    parser.add_argument('--graine', default=0, type=int)
+    parser.add_argument('--debut', default=DEBUT)
+    parser.add_argument('--fin', default=FIN)
+    args = parser.parse_args(argv)
+
+    resultat = generer(args.sortie, args.passages, args.graine, args.debut, args.fin)
+    print(f"{resultat['lignes_clients']} clients -> {resultat['clients']}")
+    print(f"{resultat['lignes_passages']} passages -> {resultat['passages']}")
+
+
+if __name__ == '__main__':
+    main()
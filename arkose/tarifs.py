@@ -0,0 +1,52 @@
+"""Classification des désignations de passage par tarif.
+
+La classe tarifaire est un petit entier, calculé une fois par désignation
+distincte au chargement (table `tarifs` et colonne `passages.classe_tarif`) :
+les proportions et ventilations par tarif deviennent des agrégations
+indexées sur un entier au lieu d'un filtre texte sur chaque ligne.
+"""
+
+import pandas as pd
+
+TARIF_PLEIN = 0
+TARIF_REDUIT = 1
+
+LIBELLES_TARIF = {TARIF_PLEIN: 'plein', TARIF_REDUIT: 'reduit'}
+
+
+def _normaliser(designation):
+    return designation.replace('é', 'e').lower()
+
+
+def classe_tarif(designation):
+    """Classe tarifaire d'une désignation.
+
+    Même règle que la requête SQL de l'étude :
+    `LOWER(REPLACE(Designation, 'é', 'e')) LIKE '%reduit'`.
+    """
+    return TARIF_REDUIT if _normaliser(designation).endswith('reduit') else TARIF_PLEIN
+
+
+def classes_tarif(designations):
+    """Classe tarifaire de chaque désignation (-1 si absente).
+
+    La règle n'est évaluée qu'une fois par désignation distincte.
+    """
+    designations = pd.Series(designations).astype('category')
+    categories = designations.cat.categories
+    classes = pd.Series([classe_tarif(d) for d in categories] + [-1], dtype='int8').to_numpy()
+    # Une valeur absente (code -1) tombe sur le dernier élément, la classe -1
+    return pd.Series(classes[designations.cat.codes.to_numpy()], index=designations.index)
+
+
+def dimension_tarifs(designations):
+    """Table `Designation, classe_tarif, libelle` des désignations distinctes."""
+    distinctes = pd.Series(pd.unique(pd.Series(designations).dropna().astype(str)), dtype=object)
+    classes = distinctes.map(classe_tarif)
+    return pd.DataFrame({'Designation': distinctes, 'classe_tarif': classes,
+                         'libelle': classes.map(LIBELLES_TARIF)})
+
+
+def est_tarif_reduit(designations):
+    """Vrai pour les désignations en tarif réduit (voir `classe_tarif`)."""
+    return classes_tarif(designations) == TARIF_REDUIT
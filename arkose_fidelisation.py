@@ -25,10 +25,10 @@
 # Les outils et techniques suivants seront employés pour l'analyse :
 # - **Python** : Pour des analyses avancées et des visualisations.
 # - **Jupyter Notebook** : Pour documenter et exécuter le code de manière interactive.
-# - **MySQL** : Pour stocker et interroger les données de manière efficace.
+# - **SQL** : Pour stocker et interroger les données de manière efficace (SQLite embarqué par défaut, MySQL en option).
 # - **Bibliothèques Python** :
 #   - `pandas` pour la manipulation et l'analyse des données.
-#   - `sqlalchemy` et `pymysql` pour l'interaction avec la base de données MySQL.
+#   - `sqlalchemy` pour l'interaction avec la base de données (et `pymysql` pour un serveur MySQL).
 #   - `matplotlib` pour la création de visualisations.
 # 
 # 
@@ -39,19 +39,35 @@
 
 
 # Cellule des imports
+import json
+from pathlib import Path
+
 import pandas as pd
-from sqlalchemy import create_engine
-from sqlalchemy import text
-from urllib.parse import quote
-import pymysql
 import matplotlib.pyplot as plt
+from arkose.ingestion import ajouter_age
+from arkose.cache import charger_clients_cache, charger_passages_cache
+from arkose.backend import creer_moteur, lire_sql
+from arkose import analyses, graphiques
+from arkose.instrumentation import Instrumentation
+from arkose.qualite import controle_ages, controle_orphelins, rapport_qualite
+
+# Mesures de chaque étape (temps, CPU, mémoire, lignes, SQL), exportées en fin de script
+mesures = Instrumentation()
 
 
 # In[3]:
 
 
-# Import des données clients
-clients = pd.read_csv(r'C:\Users\Windows\Desktop\projets\1a\Jupyter\arkose - data analyst test - clients.csv')
+# Chemins des exports
+chemin_clients = r'C:\Users\Windows\Desktop\projets\1a\Jupyter\arkose - data analyst test - clients.csv'
+chemin_passages = r'C:\Users\Windows\Desktop\projets\1a\Jupyter\arkose - data analyst test - passages.csv'
+
+# Import des données clients (lecture par blocs, types et formats de dates déclarés, doublons écartés)
+# Les données nettoyées sont mises en cache (.cache_arkose/) tant que l'export ne change pas.
+# Les contrôles de qualité (âges incohérents, passages orphelins) sont faits pendant cette lecture
+with mesures.etape('ingestion_clients') as etape:
+    clients, rapport_clients = charger_clients_cache(chemin_clients, controles=[controle_ages('2022-12-31')])
+    etape.lignes(entree=rapport_clients['lignes_lues'], sortie=len(clients))
 
 # Affichage de premières lignes pour verification
 print("premières lignes des clients : ")
@@ -62,7 +78,10 @@ print(clients.head())
 
 
 # Import des données des passages
-passages = pd.read_csv(r'C:\Users\Windows\Desktop\projets\1a\Jupyter\arkose - data analyst test - passages.csv')
+with mesures.etape('ingestion_passages') as etape:
+    passages, rapport_passages = charger_passages_cache(chemin_passages,
+                                                        controles=[controle_orphelins(clients['ID Client'])])
+    etape.lignes(entree=rapport_passages['lignes_lues'], sortie=len(passages))
 print("premières lignes des passages: ")
 print(passages.head())
 
@@ -94,28 +113,34 @@ print (passages.info())
 # In[12]:
 
 
+# Contrôle de qualité des deux exports, tiré des rapports de l'ingestion par blocs ci-dessus
+# (voir arkose/qualite.py) : valeurs manquantes, dates illisibles, doublons, âges incohérents
+# et passages orphelins, sans relire les fichiers
+with mesures.etape('qualite'):
+    qualite = rapport_qualite(rapport_clients, rapport_passages, '2022-12-31')
+Path('qualite.json').write_text(json.dumps(qualite, indent=2, ensure_ascii=False), encoding='utf-8')
+
 # Valeurs manquantes dans les clients : 
 print("Valeurs manquantes dans les clients : ")
-print(clients.isnull().sum())
+print(pd.Series(qualite['clients']['valeurs_manquantes']))
 
 # Valeurs manquantes des les passages
 print("\nValeurs manquantes dans les passages :")
-print(passages.isnull().sum())
+print(pd.Series(qualite['passages']['valeurs_manquantes']))
+
+# Dates présentes mais illisibles au format déclaré, et passages sans client correspondant
+print("\nDates invalides :", qualite['clients']['dates_invalides'], qualite['passages']['dates_invalides'])
+print(f"Passages orphelins : {qualite['passages']['passages_orphelins']}")
 
 
 # Parfait, nous n'avons aucune valeur manquante
 
 # ### Conversion des colonnes de date
-# Nous allons convertir les dates au format datetime
+# Les dates sont converties au format datetime dès l'import, avec leur format déclaré (voir arkose/ingestion.py)
 
 # In[14]:
 
 
-# Conversion en datetime dans les datasets
-clients['Date Inscription'] = pd.to_datetime(clients['Date Inscription'], errors='coerce')
-clients['Date de naissance'] = pd.to_datetime(clients['Date de naissance'], errors ='coerce')
-passages['Date Passage'] = pd.to_datetime(passages['Date Passage'], errors='coerce')
-
 # Vérification des types de données
 print("Types de données de clients :")
 print(clients.dtypes)
@@ -129,12 +154,12 @@ print(passages.dtypes)
 # In[16]:
 
 
+# Les doublons sont comptés et écartés pendant l'import, bloc par bloc
 print("\nNombre de doublons dans clients :")
-print(clients.duplicated().sum())
+print(qualite['clients']['doublons'])
 print("\nNombre de doublons dans passages :")
-print(passages.duplicated().sum())
-passages_duplicates = passages.duplicated().sum() / len(passages) * 100
-print(f"Pourcentage de doublons dans le dataset passages : {passages_duplicates:.2f} %")
+print(qualite['passages']['doublons'])
+print(f"Pourcentage de doublons dans le dataset passages : {qualite['passages']['pourcentage_doublons']:.2f} %")
 
 
 # Observations: 
@@ -144,8 +169,8 @@ print(f"Pourcentage de doublons dans le dataset passages : {passages_duplicates:
 # In[18]:
 
 
-# Suppression des doublons 
-passages.drop_duplicates(inplace=True)
+# Suppression des doublons : déjà effectuée à l'import
+print(f"- passages conservés : {len(passages)} / {rapport_passages['lignes_lues']}")
 
 
 # ### Incohérence des données
@@ -158,10 +183,8 @@ passages.drop_duplicates(inplace=True)
 date_reference = pd.to_datetime('2022-12-31')
 
 # Calcul de l'age des clients
-clients['age'] = ((date_reference.year - clients['Date de naissance'].dt.year) - 
-                  ((date_reference.month < clients['Date de naissance'].dt.month) |
-                   ((date_reference.month == clients['Date de naissance'].dt.month) &
-                    (date_reference.day < clients['Date de naissance'].dt.day))))
+with mesures.etape('age', lignes_entree=len(clients)):
+    clients = ajouter_age(clients, date_reference)
 
 # Vérification de la création de la variavble 'age'
 print(clients[['Date de naissance', 'age']].sample(1))
@@ -170,9 +193,8 @@ print(clients[['Date de naissance', 'age']].sample(1))
 # In[22]:
 
 
-# Compte des incohérences liées a 'age'
-incoherence_age = clients[(clients['age'] < 0) | (clients['age'] > 120)]
-print(f"Nombres d'incohérences trouvées : {len(incoherence_age)}")
+# Compte des incohérences liées a 'age' (âges hors de 0-120 ans, comptés par le contrôle de qualité)
+print(f"Nombres d'incohérences trouvées : {qualite['clients']['ages_incoherents']}")
 
 
 # ### Bilan du Prétraitement :
@@ -184,39 +206,43 @@ print(f"Nombres d'incohérences trouvées : {len(incoherence_age)}")
 # In[24]:
 
 
-# Connection à au serveur SQL local (à remplacer pour vos paramètres de connection)
-connection = pymysql.connect(
-    host='localhost',
-    user= 'root',
-    password= 'cN06+#P34'
-)
+# Connection à la base de données : SQLite embarqué (arkose.db) par défaut, ou le moteur
+# désigné par la variable d'environnement ARKOSE_DB_URL, par exemple
+# mysql+pymysql://root:<mot de passe>@localhost:3306/ARKOSE (la base est alors créée si besoin)
+engine = creer_moteur()
+
+# Création des tables (clés primaires et index) puis chargement par lots en upsert :
+# les lignes existantes sont mises à jour, les nouvelles ajoutées (voir arkose/chargement.py)
+from arkose.chargement import clients_table, charger_table, creer_schema
+from arkose.incremental import ingerer_passages
 
-# Création de la base de données
-with connection.cursor() as cursor:
-    cursor.execute("CREATE DATABASE IF NOT EXISTS ARKOSE CHARACTER SET utf8mb4 COLLATE utf8MB4_unicode_ci")
-    connection.close()
+with mesures.etape('chargement') as etape:
+    creer_schema(engine)
+    stats = charger_table(engine, clients, clients_table)
 
-# Connection à la base de données
-engine = create_engine('mysql+pymysql://root:%s@localhost:3306/ARKOSE' % quote('cN06+#P34'))
+    # Les passages sont ingérés de façon incrémentale : seules les visites postérieures au
+    # dernier chargement sont lues et ajoutées aux agrégats mensuels (voir arkose/incremental.py).
+    # Les passages déjà lus plus haut sont réutilisés : l'export n'est pas relu.
+    ingestion = ingerer_passages(engine, chemin_passages, ingestion=(passages, rapport_passages))
+    etape.lignes(sortie=stats['lignes'] + ingestion['nouveaux_passages'])
 
-#Import simple des données nettoyées des dataframes et création des tables
-clients.to_sql('clients', engine, if_exists='replace', index=False)
-passages.to_sql('passages', engine, if_exists='replace', index=False)
-                
-print("Tables créées avec succès !")
-print(f"- clients : {len(clients)} lignes")
-print(f"- passages : {len(passages)} lignes")
+print("Tables chargées avec succès !")
+print(f"- {stats['table']} : {stats['lignes']} lignes ({stats['lignes_par_seconde']:.0f} lignes/s)")
+print(f"- passages : {ingestion['nouveaux_passages']} nouvelles lignes (dernier passage : {ingestion['derniere_date']})")
 
 
 # In[26]:
 
 
 print("Structure de la table 'clients':")
-print(pd.read_sql("DESCRIBE clients", engine))
+print(lire_sql("DESCRIBE clients", engine))
 
 
 print("Structure de la table 'passages' : ")
-print(pd.read_sql("DESCRIBE passages", engine))
+print(lire_sql("DESCRIBE passages", engine))
+
+print("Index de la table 'passages' : ")
+print(lire_sql("SHOW INDEX FROM passages", engine)[['Key_name', 'Seq_in_index', 'Column_name']])
 
 
 
@@ -224,10 +250,10 @@ print(pd.read_sql("DESCRIBE passages", engine))
 
 
 # Afficher les 5 premiers clients
-print(pd.read_sql(text("SELECT * FROM clients LIMIT 3"), engine))
+print(lire_sql("SELECT * FROM clients LIMIT 3", engine))
 
 # Afficher les 5 premiers passages
-print(pd.read_sql(text("SELECT * FROM passages LIMIT 3"), engine))
+print(lire_sql("SELECT * FROM passages LIMIT 3", engine))
 
 
 # ## 6.Analyse Exploratoire des Données
@@ -236,14 +262,8 @@ print(pd.read_sql(text("SELECT * FROM passages LIMIT 3"), engine))
 # In[30]:
 
 
-with engine.connect() as conn:
-    result = conn.execute(text("""
-        SELECT ROUND(AVG(age)) AS age_moyen
-        FROM clients
-        WHERE age IS NOT NULL
-    """))
-
-    age_moyen = result.scalar()
+with mesures.etape('age_moyen'):
+    age_moyen = analyses.age_moyen(engine)
 
 print(f"Age moyen des clients: {age_moyen} ans")
 
@@ -255,27 +275,12 @@ print(f"Age moyen des clients: {age_moyen} ans")
 
 # Pour calculer la proportion en "Tarif Réduit" il va filtrer "réduit" dans les strings contenues dans "Designation"
 # On prendra en compte les différentes cassses (Réduit, Reduit, réduit, reduit)
+# (requête : arkose/analyses.py, REQUETE_TARIF_REDUIT)
 
-with engine.connect() as conn:
-    result = conn.execute(text("""
-               SELECT
-                 ROUND(
-                     SUM(
-                      CASE
-                         WHEN LOWER(REPLACE(Designation,'é', 'e')) LIKE '%reduit'
-                         THEN 1 ELSE 0
-                      END
-                 ) *100.0 /COUNT(*),
-                  2
-            ) AS prop_tarif_reduit
-            FROM passages
-            WHERE Designation IS NOT NULL;
-    """))
-
-proportion_tarif_reduit = result.scalar()
+with mesures.etape('proportion_tarif_reduit'):
+    proportion_tarif_reduit = analyses.proportion_tarif_reduit(engine)
 
 print(f"Proportion de passages en Tarif  Réduit : {proportion_tarif_reduit:.2f}%")
-                         
 
 
 # ### Courbes des fréquentations
@@ -283,42 +288,14 @@ print(f"Proportion de passages en Tarif  Réduit : {proportion_tarif_reduit:.2f}
 # In[52]:
 
 
-from sqlalchemy import text
-
-#  Récupérer les données
-df = pd.read_sql(text("""
-    SELECT 
-        YEAR(`Date Passage`) AS annee,
-        MONTH(`Date Passage`) AS mois,
-        COUNT(*) AS passages
-    FROM passages
-    GROUP BY annee, mois
-    ORDER BY annee, mois
-"""), engine)
-
-#  Préparer les mois 
-mois_fr = ['Jan', 'Fév', 'Mar', 'Avr', 'Mai', 'Juin', 
-           'Juil', 'Août', 'Sep', 'Oct', 'Nov', 'Déc']
+#  Récupérer les données : agrégat mensuel maintenu à chaque ingestion
+with mesures.etape('frequentation_mensuelle') as etape:
+    df = analyses.frequentation_mensuelle(engine)
+    etape.lignes(sortie=len(df))
 
 # Créer le graphique
-plt.figure(figsize=(10, 5))
-
-for annee in df['annee'].unique():
-    data = df[df['annee'] == annee]
-    plt.plot(data['mois'], data['passages'], 
-             marker='o', 
-             label=annee, 
-             linewidth=2)
-
-# Affichage perso
-plt.title('Fréquentation Mensuelle par Année', pad=20, fontweight='bold')
-plt.xlabel('Mois', labelpad=10)
-plt.ylabel('Nombre de Passages', labelpad=10)
-plt.xticks(range(1, 13), mois_fr)
-plt.grid(axis='y', linestyle='--', alpha=0.4)
-plt.legend(title='Année', frameon=False)
-
-plt.tight_layout()  
+with mesures.etape('figure_frequentation_mensuelle'):
+    graphiques.figure_frequentation_mensuelle(df)
 plt.show()
 
 
@@ -335,33 +312,18 @@ plt.show()
 # In[55]:
 
 
-from sqlalchemy import text
-query = """
-SELECT `ID Client`, `Date Inscription`
-FROM clients
-WHERE `Date Inscription` IS NOT NULL
-"""
-
-df = pd.read_sql(text(query), engine)
-
-# Conversion des dates en format pandas
-df['Date Inscription'] = pd.to_datetime(df['Date Inscription'])
-
-#  Extraction de l'année d'inscription
-df['annee_inscription'] = df['Date Inscription'].dt.year
-
-# Comptage des clients par année d'inscription
-repartition = df['annee_inscription'].value_counts().sort_index()
-
-# Définir un intervalle d'années pour l'affichage
-annees_completes = range(df['annee_inscription'].min(), df['annee_inscription'].max() + 1)
-
-# ompléter la répartition pour chaque année de l'intervalle, même celles avec 0
-repartition_complete = repartition.reindex(annees_completes, fill_value=0)
+# Comptage des clients par année d'inscription, en complétant les années sans inscription
+with mesures.etape('repartition_inscriptions') as etape:
+    repartition_complete = analyses.repartition_inscriptions(engine)
+    etape.lignes(sortie=len(repartition_complete))
 
 print("Répartition des clients démissionnaires par année d'inscription :")
 print(repartition_complete)
 
+with mesures.etape('figure_inscriptions'):
+    graphiques.figure_inscriptions(repartition_complete)
+plt.show()
+
 
 # **Observations: 
 # -39/99 se sont inscrits en 2020
@@ -387,64 +349,20 @@ print(repartition_complete)
 # In[44]:
 
 
-from sqlalchemy import text
-
 ## 1. Requête SQL
-with engine.connect() as conn:
-    df_result = pd.read_sql(text("""
-        SELECT
-            c.`ID Client`,
-            c.`Date Inscription`,
-            MAX(p.`Date Passage`) AS Dernier_Passage,
-            DATEDIFF(MAX(p.`Date Passage`), c.`Date Inscription`) AS Jours_absence
-        FROM clients c
-        JOIN passages p ON c.`ID Client` = p.`ID Client`
-        GROUP BY c.`ID Client`, c.`Date Inscription`
-    """), conn)
-
-## 2. Préparation des données
-bins = [0, 90, 180, 270, 360, 540, float('inf')]
-labels = ['≤3 mois', '3-6 mois', '6-9 mois', '9-12 mois', '12-18 mois', '>18 mois']
-df_result['Tranche'] = pd.cut(df_result['Jours_absence'], bins=bins, labels=labels, right=False)
+# Effectif par tranche calculé dans la base (une ligne par tranche) :
+# jours = DATEDIFF(MAX(`Date Passage`), `Date Inscription`)
+with mesures.etape('tranches_anciennete') as etape:
+    df_result = analyses.repartition_anciennete(engine)
+    etape.lignes(sortie=len(df_result))
 
 # Vérification des données
 print("Répartition des données:")
-print(df_result['Tranche'].value_counts().sort_index())
-
-## 3. Création du graphique
-plt.figure(figsize=(7, 7))  # Taille intermédiaire pour meilleur équilibre
-
-# Calcul des pourcentages
-pourcentages = df_result['Tranche'].value_counts(normalize=True).sort_index() * 100
-
-# Création du pie chart avec tous les éléments
-patches, texts, autotexts = plt.pie(
-    pourcentages,
-    colors=plt.cm.Pastel1(range(len(labels))),
-    startangle=90,
-    pctdistance=0.8,
-    wedgeprops={'linewidth': 1, 'edgecolor': 'white'},
-    autopct=lambda p: f'{p:.1f}%' if p >= 5 else ''  # Masque les petits pourcentages
-)
-
-# Amélioration de l'affichage des pourcentages
-for text in autotexts:
-    text.set_color('black')
-    text.set_fontsize(9)
-    text.set_fontweight('bold')
-
-# Légende corrigée (sans avertissement)
-plt.legend(
-    handles=patches,
-    labels=[f"{l} ({p:.1f}%)" for l, p in zip(pourcentages.index, pourcentages)],
-    title="Périodes depuis l'inscription",
-    loc='center left',
-    bbox_to_anchor=(1, 0.5),
-    frameon=False
-)
-
-plt.title("Durée de la fréquentation (depuis la date d'inscription -> dernier passage)", pad=20, fontsize=12)
-plt.tight_layout()
+print(df_result)
+
+## 2. Création du graphique
+with mesures.etape('figure_anciennete'):
+    graphiques.figure_anciennete(df_result)
 plt.show()
 
 
@@ -452,97 +370,26 @@ plt.show()
 # 
 # **Pour répondre au point 5 du sujet, nous pensons que la métrique à considérer pour identifier la clientèle démissionnaire est la fréquentation des clients sur les mois précédant leurs départs.**
 # 
-# En étudiant la courbe de fréquentation moyenne par client sur les 12 derniers mois, on observe qu'après un pic autour de 5 visites par mois (M-5), cette dernière diminue de manière inexorable sur les 7 derniers mois. Par rapport au point haut, le nombre de visites moyen par mois est presque divisé par deux le mois précédant le départ des clients (M-12). De plus, leurs départs se produisent après une baisse constante sur les 3 derniers mois, avec une chute notable de 3,42 visites (M-10) à 2,65 visites (M-12).
+# En étudiant la courbe de fréquentation moyenne par client sur les 12 derniers mois, on observe qu'après un pic autour de 5 visites par mois (M-5), cette dernière diminue de manière inexorable sur les 7 derniers mois. Par rapport au point haut, le nombre de visites moyen par mois est presque divisé par deux le mois précédant le départ des clients (M-12). De plus, leurs départs se produisent après une baisse constante sur les 3 derniers mois, avec une chute notable de 3,64 visites (M-11) à 2,67 visites (M-12).
 
 # In[46]:
 
 
-from sqlalchemy import text
-
-# Chargement des données depuis la base
-query = text("SELECT `Date Passage`, `ID Client` FROM passages")
-passages_df = pd.read_sql(query, engine)
-
-# Conversion des dates
-passages_df['Date Passage'] = pd.to_datetime(passages_df['Date Passage'])
-
-# Calcul des fréquentations mensuelles par client
-def calculate_monthly_visits(df):
-    # Trouver la dernière date de passage pour chaque client
-    last_visits = df.groupby('ID Client')['Date Passage'].max().reset_index()
-    
-    # Initialiser le DataFrame résultat
-    result = pd.DataFrame({'ID Client': df['ID Client'].unique()})
-    
-    # Initialiser les colonnes des mois avec des zéros
-    for i in range(1, 13):
-        result[f'mois_{i}'] = 0
-    
-    # Pour chaque client
-    for index, row in last_visits.iterrows():
-        client_id = row['ID Client']
-        last_date = row['Date Passage']
-        
-        # Passages de ce client uniquement
-        client_passages = df[df['ID Client'] == client_id]
-        
-        # Pour chaque mois en remontant à partir de la dernière visite
-        for month_offset in range(12):
-            # Calculer la période du mois
-            end_month = last_date.replace(day=1) - pd.DateOffset(months=month_offset)
-            end_date = end_month + pd.DateOffset(months=1) - pd.DateOffset(days=1)
-            start_date = end_month
-            
-            # Compter les passages dans ce mois
-            month_visits = client_passages[
-                (client_passages['Date Passage'] >= start_date) & 
-                (client_passages['Date Passage'] <= end_date)
-            ]
-            
-            # Stocker le résultat (mois_12 = plus récent)
-            month_col = f'mois_{12 - month_offset}'
-            result.loc[result['ID Client'] == client_id, month_col] = len(month_visits)
-    
-    return result
-
-# Exécuter le calcul
-frequentations_mensuelles = calculate_monthly_visits(passages_df)
-
-# Calcul de la fréquentation moyenne par mois
-moyenne_par_mois = []
-labels_mois = []
-
-for i in range(1, 13):
-    mois_col = f'mois_{i}'
-    moyenne = frequentations_mensuelles[mois_col].mean()
-    moyenne_par_mois.append(moyenne)
-    labels_mois.append(f"M-{i}")  # M-12 est le plus récent, M-1 est le plus ancien
+# Les fréquentations mensuelles des 12 mois précédant le dernier passage de chaque client
+# (comme calculate_monthly_visits, voir arkose/frequentation.py) sont comptées et moyennées
+# dans la base par fonctions de fenêtre : seules les 12 moyennes sont transférées.
+# Calcul de la fréquentation moyenne par mois (M-12 est le plus récent, M-1 est le plus ancien)
+with mesures.etape('profil_mensuel') as etape:
+    statistiques = analyses.profil_mensuel(engine)
+    etape.lignes(sortie=len(statistiques))
 
 # Création de la courbe de fréquentation moyenne
-plt.figure(figsize=(12, 6))
-
-# Tracé de la courbe principale
-plt.plot(labels_mois, moyenne_par_mois, 'o-', linewidth=2, markersize=8, color='#1f77b4')
-
-# Affichage
-plt.fill_between(labels_mois, moyenne_par_mois, alpha=0.2, color='#1f77b4')
-
-plt.title('Évolution de la fréquentation moyenne par mois sur les 12 derniers mois', fontsize=14)
-plt.xlabel('Mois relatif (M-1 = plus ancien, M-12 = plus récent)', fontsize=12)
-plt.ylabel('Nombre moyen de visites', fontsize=12)
-plt.grid(True, linestyle='--', alpha=0.7)
-
-for i, v in enumerate(moyenne_par_mois):
-    plt.text(i, v + 0.1, f"{v:.2f}", ha='center')
-
-plt.tight_layout()
+with mesures.etape('figure_profil_mensuel'):
+    graphiques.figure_profil_mensuel(statistiques)
 plt.show()
 
 # Afficher également les statistiques numériques
-statistiques = pd.DataFrame({
-    'Mois': labels_mois,
-    'Moyenne': moyenne_par_mois,
-})
+print(statistiques)
 
 
 # ### Conclusion
@@ -571,47 +418,18 @@ statistiques = pd.DataFrame({
 # In[50]:
 
 
-query = """
-SELECT 
-    `Type Forfait`, 
-    COUNT(*) AS nombre_utilisations
-FROM 
-    passages
-GROUP BY 
-    `Type Forfait`
-ORDER BY 
-    nombre_utilisations DESC;
-"""
-
-# Charger les résultats 
-df = pd.read_sql(query, engine)
-
-# Calculer la proportion de chaque type d'abonnement
-df['Proportion'] = (df['nombre_utilisations'] / df['nombre_utilisations'].sum()) * 100
+# Charger les résultats et calculer la proportion de chaque type d'abonnement
+with mesures.etape('types_forfaits') as etape:
+    df = analyses.types_forfaits(engine)
+    etape.lignes(sortie=len(df))
 
 # Afficher les données sous forme de tableau
 print("Répartition des types de forfaits :")
 print(df[['Type Forfait', 'nombre_utilisations', 'Proportion']].to_string(index=False))
 
 # Afficher 
-plt.figure(figsize=(5, 5))
-plt.pie(df['nombre_utilisations'], 
-        labels=df['Type Forfait'], 
-        autopct='%1.1f%%', 
-        startangle=140,
-        pctdistance=0.85,
-        textprops={'fontsize': 10})
-plt.title("Répartition des types de forfaits sur l'ensemble des données", pad=20)
-plt.axis('equal')
-
-# Ajouter une légende si trop de catégories
-if len(df) > 5:
-    plt.legend(df['Type Forfait'], 
-               title="Types de forfaits",
-               loc="center left",
-               bbox_to_anchor=(1, 0.5))
-
-plt.tight_layout()
+with mesures.etape('figure_forfaits'):
+    graphiques.figure_forfaits(df)
 plt.show()
 
 
@@ -629,49 +447,16 @@ plt.show()
 # In[48]:
 
 
-query = """
-SELECT
-    CASE
-        WHEN age BETWEEN 17 AND 20 THEN '17-20'
-        WHEN age BETWEEN 21 AND 25 THEN '21-25'
-        WHEN age BETWEEN 26 AND 30 THEN '26-30'
-        WHEN age BETWEEN 31 AND 35 THEN '31-35'
-        WHEN age BETWEEN 36 AND 40 THEN '36-40'
-        WHEN age BETWEEN 41 AND 45 THEN '41-45'
-        WHEN age BETWEEN 46 AND 47 THEN '46-47'
-        ELSE 'Autre'
-    END AS age_group,
-    COUNT(*) AS count,
-    (COUNT(*) * 100.0 / (SELECT COUNT(*) FROM clients WHERE age BETWEEN 17 AND 47)) AS percentage
-FROM
-    clients
-WHERE
-    age BETWEEN 17 AND 47
-GROUP BY
-    age_group
-ORDER BY
-    MIN(age);
-"""
-
 # Exécution de la requête SQL et stockage des résultats dans un DataFrame
-desertion_ages = pd.read_sql(query, engine)
+with mesures.etape('tranches_age') as etape:
+    desertion_ages = analyses.tranches_age(engine)
+    etape.lignes(sortie=len(desertion_ages))
 print(desertion_ages)
 
-
-# Vérifier si les colonnes nécessaires existent
-if 'age_group' in desertion_ages.columns and 'percentage' in desertion_ages.columns:
-    # Créer le graphique en camembert
-    plt.figure(figsize=(5, 5))
-    wedges, texts, autotexts = plt.pie(desertion_ages['percentage'], labels=None, autopct='%1.1f%%', startangle=140)
-    plt.title('Répartition des clients par tranche d\'âge')
-    plt.axis('equal')  # Assure que le camembert est un cercle
-
-    # Ajouter une légende
-    plt.legend(wedges, desertion_ages['age_group'], title="Tranches d'âge", loc="center left", bbox_to_anchor=(1, 0, 0.5, 1))
-
-    plt.show()
-else:
-    print("Les colonnes nécessaires 'age_group' et 'percentage' ne sont pas présentes dans le DataFrame.")
+# Créer le graphique en camembert
+with mesures.etape('figure_tranches_age'):
+    graphiques.figure_tranches_age(desertion_ages)
+plt.show()
 
 
 # ## Recommandations: 
@@ -723,7 +508,6 @@ else:
 # > "La fidélisation post-12 mois nécessite une approche systémique combinant leviers sociaux et mécaniques de progression." — [Paul-Emmanuel Buffe]
 
 
-
-
-
-
+# Export des mesures de l'exécution : une ligne JSON par étape, et format texte Prometheus
+mesures.exporter_jsonl('instrumentation.jsonl')
+mesures.ecrire_prometheus('metriques.prom')
@@ -0,0 +1,175 @@
+"""Mesure du temps et de la mémoire de chaque étape du traitement, sur des données synthétiques de tailles croissantes.
+
+    python benchmarks/pipeline.py --tailles 1e4,1e5,1e6
+    python benchmarks/pipeline.py --tailles 1e5 --reference benchmarks/reference.json
+
+Les jeux de données sont générés une fois (`arkose.synthetique`) et conservés
+dans `benchmarks/donnees/`. Chaque étape est mesurée en temps écoulé et en pic
+de mémoire allouée (tracemalloc, qui ralentit l'exécution ; `--sans-memoire`
+pour des temps exacts). Avec `--reference`, les mesures sont comparées à une
+exécution précédente : toute étape plus lente ou plus gourmande au-delà de la
+tolérance est signalée et le code de sortie vaut 1.
+"""
+
+import argparse
+import json
+import platform
+import sys
+import tempfile
+import time
+import tracemalloc
+from datetime import datetime
+from pathlib import Path
+
+import pandas as pd
+
+RACINE = Path(__file__).resolve().parent
+sys.path.insert(0, str(RACINE.parent))
+
+from arkose import analyses, cache_requetes  # noqa: E402
+from arkose.backend import creer_moteur  # noqa: E402
+from arkose.chargement import charger_table, clients_table, creer_schema  # noqa: E402
+from arkose.cohortes import matrice_retention  # noqa: E402
+from arkose.frequentation import calculate_monthly_visits  # noqa: E402
+from arkose.incremental import ingerer_passages  # noqa: E402
+from arkose.index_visites import IndexVisites  # noqa: E402
+from arkose.ingestion import SCHEMA_PASSAGES, ajouter_age, charger_clients, charger_csv, charger_passages  # noqa: E402
+from arkose.scores import score_clients  # noqa: E402
+from arkose.synthetique import generer  # noqa: E402
+
+DATE_REFERENCE = pd.Timestamp('2022-12-31')
+
+# En deçà, les écarts de temps relèvent du bruit de mesure
+SECONDES_MINIMALES = 0.05
+
+
+class Mesures:
+    """Temps et pic mémoire des étapes successives d'une taille de données."""
+
+    def __init__(self, memoire=True):
+        self.memoire = memoire
+        self.resultats = {}
+
+    def __call__(self, nom, fonction, *args, **kwargs):
+        if self.memoire:
+            tracemalloc.start()
+        debut = time.perf_counter()
+        try:
+            resultat = fonction(*args, **kwargs)
+        finally:
+            secondes = time.perf_counter() - debut
+            pic = tracemalloc.get_traced_memory()[1] if self.memoire else None
+            tracemalloc.stop()
+        self.resultats[nom] = {'secondes': round(secondes, 4),
+                               'memoire_mo': None if pic is None else round(pic / 1024 ** 2, 2)}
+        print(f"  {nom:<28} {secondes:9.3f} s" + ('' if pic is None else f" {pic / 1024 ** 2:10.1f} Mo"),
+              file=sys.stderr)
+        return resultat
+
+
+def donnees(taille, repertoire, graine=0):
+    """Chemins des exports synthétiques de `taille` passages, générés s'ils n'existent pas."""
+    dossier = Path(repertoire) / f'{taille:.0e}-{graine}'
+    if not (dossier / 'passages.csv').exists():
+        print(f"génération de {taille:.0e} passages dans {dossier}", file=sys.stderr)
+        generer(dossier, taille, graine)
+    return dossier / 'clients.csv', dossier / 'passages.csv'
+
+
+def mesurer_taille(chemin_clients, chemin_passages, memoire=True, graphiques=True):
+    mesure = Mesures(memoire)
+    cache_requetes.CACHE.actif = False
+
+    mesure('ingestion_sans_dedoublonnage', charger_csv, chemin_passages, SCHEMA_PASSAGES, dedupliquer=False)
+    passages, _ = mesure('ingestion_passages', charger_passages, chemin_passages)
+    clients, _ = mesure('ingestion_clients', charger_clients, chemin_clients)
+    clients = mesure('age', ajouter_age, clients, DATE_REFERENCE)
+
+    with tempfile.TemporaryDirectory() as temporaire:
+        engine = creer_moteur(f'sqlite:///{temporaire}/bench.db')
+        creer_schema(engine)
+        mesure('chargement_clients', charger_table, engine, clients, clients_table)
+        mesure('chargement_passages', ingerer_passages, engine, chemin_passages)
+
+        resultats = {nom: mesure(f'analyse_{nom}', getattr(analyses, nom), engine) for nom in [
+            'age_moyen', 'proportion_tarif_reduit', 'frequentation_mensuelle', 'repartition_inscriptions',
+            'repartition_anciennete', 'profil_mensuel', 'types_forfaits', 'tranches_age']}
+        engine.dispose()
+
+        mesure('frequentation_pandas', calculate_monthly_visits, passages)
+        index = mesure('index_visites', IndexVisites.depuis_passages, passages)
+        retention = mesure('cohortes', matrice_retention, clients, index, par_etablissement=False)
+        mesure('scores', score_clients, index, DATE_REFERENCE)
+
+        if graphiques:
+            from arkose.rendu import rendre_figures
+            figures = {
+                'frequentation_mensuelle': ('figure_frequentation_mensuelle', resultats['frequentation_mensuelle']),
+                'inscriptions': ('figure_inscriptions', resultats['repartition_inscriptions']),
+                'anciennete': ('figure_anciennete', resultats['repartition_anciennete']),
+                'profil_mensuel': ('figure_profil_mensuel', resultats['profil_mensuel']),
+                'forfaits': ('figure_forfaits', resultats['types_forfaits']),
+                'tranches_age': ('figure_tranches_age', resultats['tranches_age']),
+                'retention_cohortes': ('figure_retention', retention),
+            }
+            mesure('rendu_graphiques', rendre_figures, figures, Path(temporaire) / 'figures')
+
+    mesure.resultats['_lignes'] = {'clients': len(clients), 'passages': len(passages)}
+    return mesure.resultats
+
+
+def regressions(resultats, reference, tolerance):
+    """Étapes plus lentes ou plus gourmandes que dans `reference` de plus de `tolerance` (relative)."""
+    ecarts = []
+    for taille, etapes in resultats.items():
+        for etape, mesures in etapes.items():
+            avant = reference.get(taille, {}).get(etape)
+            if etape.startswith('_') or avant is None:
+                continue
+            for critere, minimum in (('secondes', SECONDES_MINIMALES), ('memoire_mo', 1.0)):
+                if mesures.get(critere) is None or avant.get(critere) is None:
+                    continue
+                if mesures[critere] > max(avant[critere] * (1 + tolerance), minimum):
+                    ecarts.append((taille, etape, critere, avant[critere], mesures[critere]))
+    return ecarts
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--tailles', default='1e4,1e5,1e6',
+                        type=lambda v: [int(float(t)) for t in v.split(',')],
+                        help="nombres de passages à mesurer, séparés par des virgules (1e4 à 1e8)")
+    parser.add_argument('--donnees', default=RACINE / 'donnees', type=Path)
+    parser.add_argument('--sortie', default=RACINE / 'resultats.json', type=Path)
+    parser.add_argument('--reference', default=None, type=Path, help="résultats d'une exécution précédente")
+    parser.add_argument('--tolerance', default=0.25, type=float, help="écart relatif toléré (0.25 = +25 %%)")
+    parser.add_argument('--sans-memoire', action='store_true', help="ne mesure pas la mémoire (temps sans surcoût)")
+    parser.add_argument('--sans-graphiques', action='store_true')
+    args = parser.parse_args(argv)
+
+    resultats = {}
+    for taille in args.tailles:
+        print(f"{taille:.0e} passages", file=sys.stderr)
+        chemin_clients, chemin_passages = donnees(taille, args.donnees)
+        resultats[f'{taille:.0e}'] = mesurer_taille(chemin_clients, chemin_passages,
+                                                     not args.sans_memoire, not args.sans_graphiques)
+
+    args.sortie.write_text(json.dumps({
+        'date': datetime.now().isoformat(timespec='seconds'),
+        'machine': {'python': platform.python_version(), 'plateforme': platform.platform(),
+                    'pandas': pd.__version__},
+        'memoire': not args.sans_memoire,
+        'resultats': resultats,
+    }, indent=1), encoding='utf-8')
+    print(f"résultats -> {args.sortie}", file=sys.stderr)
+
+    if args.reference is not None:
+        ecarts = regressions(resultats, json.loads(args.reference.read_text())['resultats'], args.tolerance)
+        for taille, etape, critere, avant, apres in ecarts:
+            print(f"RÉGRESSION {taille} {etape} {critere} : {avant} -> {apres}")
+        return 1 if ecarts else 0
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
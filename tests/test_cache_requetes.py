@@ -0,0 +1,43 @@
+import pandas as pd
+
+from arkose.backend import creer_moteur
+from arkose.cache_requetes import CacheRequetes
+from arkose.chargement import charger_table, clients_table, creer_schema
+
+REQUETE = 'SELECT SUM(`ID Client`) FROM clients'
+
+
+def _base(chemin, ids):
+    engine = creer_moteur(f'sqlite:///{chemin}')
+    creer_schema(engine)
+    charger_table(engine, pd.DataFrame({'ID Client': ids}), clients_table)
+    return engine
+
+
+def test_resultat_relu_tant_que_la_table_ne_change_pas(tmp_path):
+    engine = _base(tmp_path / 'arkose.db', [1, 2])
+    cache = CacheRequetes(tmp_path / 'requetes')
+
+    assert cache.executer_scalaire(REQUETE, engine) == 3
+    assert cache.executer_scalaire(REQUETE, engine) == 3
+    assert cache.statistiques == {'succes': 1, 'echecs': 1}
+
+    charger_table(engine, pd.DataFrame({'ID Client': [10]}), clients_table)
+    assert cache.executer_scalaire(REQUETE, engine) == 13
+    assert cache.statistiques['echecs'] == 2
+
+
+def test_base_recreee_invalide_le_cache(tmp_path):
+    chemin = tmp_path / 'arkose.db'
+    cache = CacheRequetes(tmp_path / 'requetes')
+    engine = _base(chemin, [1, 2])
+    assert cache.executer_scalaire(REQUETE, engine) == 3
+
+    # Même URL, mêmes versions de tables (1), autres données
+    engine.dispose()
+    for fichier in tmp_path.glob('arkose.db*'):
+        fichier.unlink()
+    engine = _base(chemin, [5, 6])
+
+    assert cache.executer_scalaire(REQUETE, engine) == 11
+    assert cache.statistiques == {'succes': 0, 'echecs': 2}
@@ -0,0 +1,90 @@
+import pandas as pd
+from sqlalchemy import func, select, text
+
+from arkose.backend import creer_moteur
+from arkose.chargement import (charger_donnees, charger_table, clients_table, creer_schema, empreintes_passages,
+                               passages_table)
+
+
+def _passages(**colonnes):
+    passages = pd.DataFrame({
+        'Date Passage': pd.to_datetime(['2022-03-01 10:00:00', '2022-03-01 10:00:00', '2022-03-02 18:30:00']),
+        'Etablissement': pd.Series(['A', 'A', 'B'], dtype='category'),
+        'ID Client': [1, 1, 2],
+        'Type Forfait': pd.Series(['Entrée', 'Carnet', None], dtype='category'),
+        'Designation': pd.Series(['Entrée adulte', 'Entrée adulte', 'Entrée réduite'], dtype='category'),
+        'Quantite': pd.Series([1, 1, 2], dtype='int16'),
+    })
+    return passages.assign(**colonnes)
+
+
+def _clients():
+    return pd.DataFrame({'ID Client': [1, 2], 'Date Inscription': pd.to_datetime(['2021-01-01', None]),
+                         'age': [30.0, None]})
+
+
+def _lire(engine, table):
+    with engine.connect() as conn:
+        return pd.read_sql(select(table), conn)
+
+
+def test_passages_differant_par_le_forfait_ou_la_quantite_restent_distincts():
+    engine = creer_moteur('sqlite://')
+    passages = _passages()
+    passages.loc[2, 'Quantite'] = 1
+    passages = pd.concat([passages, _passages(Quantite=pd.Series([3, 1, 2], dtype='int16'))], ignore_index=True)
+    charger_donnees(engine, _clients(), passages)
+
+    assert len(_lire(engine, passages_table)) == len(passages.drop_duplicates())
+
+
+def test_upsert_idempotent():
+    engine = creer_moteur('sqlite://')
+    charger_donnees(engine, _clients(), _passages())
+    charger_donnees(engine, _clients(), _passages())
+
+    with engine.connect() as conn:
+        assert conn.execute(select(func.count()).select_from(passages_table)).scalar() == 3
+        assert conn.execute(select(func.count()).select_from(clients_table)).scalar() == 2
+
+
+def test_valeurs_relues_a_l_identique():
+    engine = creer_moteur('sqlite://')
+    creer_schema(engine)
+    charger_table(engine, _clients(), clients_table)
+    charger_table(engine, _clients().assign(age=[31.0, 40.0]), clients_table)
+
+    clients = _lire(engine, clients_table).sort_values('ID Client', ignore_index=True)
+    assert clients['Date Inscription'].iloc[0] == pd.Timestamp('2021-01-01')
+    assert pd.isna(clients['Date Inscription'].iloc[1])
+    assert clients['age'].tolist() == [31, 40]
+
+
+def test_empreinte_identique_depuis_le_csv_et_depuis_la_base():
+    engine = creer_moteur('sqlite://')
+    passages = _passages()
+    charger_donnees(engine, _clients(), passages)
+
+    relus = _lire(engine, passages_table)
+    assert sorted(relus['empreinte']) == sorted(empreintes_passages(passages))
+    assert sorted(empreintes_passages(relus)) == sorted(relus['empreinte'])
+
+
+def test_migration_d_une_table_passages_sans_empreinte():
+    engine = creer_moteur('sqlite://')
+    with engine.begin() as conn:
+        conn.execute(text('CREATE TABLE passages ("ID Client" BIGINT, "Date Passage" DATETIME, '
+                          '"Etablissement" VARCHAR(100), "Designation" VARCHAR(100), "Type Forfait" VARCHAR(20), '
+                          '"Quantite" SMALLINT, PRIMARY KEY ("ID Client", "Date Passage", "Etablissement", '
+                          '"Designation"))'))
+        conn.execute(text("INSERT INTO passages VALUES (1, '2022-03-01 10:00:00.000000', 'A', 'Entrée adulte', "
+                          "'Entrée', 1), (2, '2022-03-02 18:30:00.000000', 'B', 'Entrée réduite', NULL, 2)"))
+
+    creer_schema(engine)
+    charger_table(engine, _passages().iloc[[0]].assign(empreinte=empreintes_passages(_passages().iloc[[0]])),
+                  passages_table)
+
+    migres = _lire(engine, passages_table)
+    assert len(migres) == 2
+    assert migres['classe_tarif'].notna().all()
+    assert sorted(migres['empreinte']) == sorted(empreintes_passages(migres))
@@ -0,0 +1,60 @@
+import numpy as np
+import pandas as pd
+
+from arkose.esquisses import EsquissesActivite
+
+
+def _donnees():
+    rng = np.random.default_rng(0)
+    n = 600
+    clients = pd.DataFrame({'ID Client': np.arange(1, 41),
+                            'Date Inscription': pd.Timestamp('2020-01-01')
+                            + pd.to_timedelta(rng.integers(0, 900, 40), unit='D')})
+    passages = pd.DataFrame({
+        'Date Passage': pd.Timestamp('2022-10-01') + pd.to_timedelta(rng.integers(0, 92 * 24, n), unit='h'),
+        'Etablissement': rng.choice(['A', 'B'], n),
+        'ID Client': rng.integers(1, 41, n),
+    }).sort_values('Date Passage', ignore_index=True)
+    return clients.set_index('ID Client')['Date Inscription'], passages
+
+
+def _resultats(esquisses):
+    return (esquisses.clients_actifs(),
+            [esquisses.quantiles_visites(mois=m) for m in ('2022-11', '2022-12')],
+            [esquisses.repartition_anciennete(mois=m)['clients'].tolist() for m in ('2022-11', '2022-12')])
+
+
+def test_fusion_par_etablissement_identique_a_un_passage_unique():
+    inscriptions, passages = _donnees()
+    unique = EsquissesActivite(inscriptions)
+    for debut in range(0, len(passages), 150):
+        unique.ajouter(passages.iloc[debut:debut + 150])
+
+    # États enregistrés par salle avec le dernier mois encore ouvert, puis fusionnés
+    fusion = None
+    for etablissement in ('A', 'B'):
+        etat = EsquissesActivite(inscriptions).ajouter(passages[passages['Etablissement'] == etablissement])
+        assert len(etat._ouverts)
+        etat = EsquissesActivite.depuis_dict(etat.vers_dict(), inscriptions)
+        fusion = etat if fusion is None else fusion.fusionner(etat)
+
+    unique.cloturer()
+    fusion.cloturer()
+    clients_u, visites_u, anciennete_u = _resultats(unique)
+    clients_f, visites_f, anciennete_f = _resultats(fusion)
+    pd.testing.assert_frame_equal(clients_u, clients_f)
+    for attendu, obtenu in zip(visites_u, visites_f):
+        assert not obtenu.isna().any()
+        pd.testing.assert_series_equal(attendu, obtenu)
+    assert anciennete_u == anciennete_f
+    assert sum(anciennete_f[1]) > 0
+
+
+def test_fusion_sans_mois_ouvert_en_commun():
+    inscriptions, passages = _donnees()
+    novembre = passages[passages['Date Passage'] < '2022-12-01']
+    decembre = passages[passages['Date Passage'] >= '2022-12-01']
+    unique = EsquissesActivite(inscriptions).ajouter(passages).cloturer()
+    fusion = (EsquissesActivite(inscriptions).ajouter(novembre)
+              .fusionner(EsquissesActivite(inscriptions).ajouter(decembre)).cloturer())
+    assert _resultats(unique)[2] == _resultats(fusion)[2]
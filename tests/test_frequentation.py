@@ -0,0 +1,36 @@
+import pandas as pd
+
+from arkose.frequentation import calculate_monthly_visits
+
+
+def test_mois_calendaires_alignes_sur_le_dernier_passage():
+    passages = pd.DataFrame({
+        'ID Client': [1, 1, 1, 1, 1, 2, 2, 3, 3],
+        'Date Passage': pd.to_datetime([
+            '2022-03-31 23:59:00',  # client 1 : dernier passage, mois_12 = mars 2022
+            '2022-03-01 00:00:00',  # mars 2022 -> mois_12
+            '2022-02-28 23:30:00',  # février 2022 -> mois_11 (à moins de 30 jours du dernier passage)
+            '2021-04-01 00:00:00',  # avril 2021, 11 mois avant -> mois_1
+            '2021-03-31 23:59:00',  # mars 2021, 12 mois avant -> hors fenêtre
+            '2021-12-31 23:59:00',  # client 2 : décembre 2021 -> mois_11
+            '2022-01-31 23:45:00',  # dernier passage, fin de journée -> mois_12
+            None,                   # client 3 : date absente ignorée
+            '2022-06-15 12:00:00',
+        ]),
+    })
+
+    resultat = calculate_monthly_visits(passages)
+
+    attendu = pd.DataFrame(0, index=[1, 2, 3], columns=[f'mois_{i}' for i in range(1, 13)])
+    attendu.loc[1, ['mois_1', 'mois_11', 'mois_12']] = [1, 1, 2]
+    attendu.loc[2, ['mois_11', 'mois_12']] = [1, 1]
+    attendu.loc[3, 'mois_12'] = 1
+    assert resultat['ID Client'].tolist() == [1, 2, 3]
+    assert (resultat.set_index('ID Client').to_numpy() == attendu.to_numpy()).all()
+
+
+def test_fenetre_reduite():
+    passages = pd.DataFrame({'ID Client': [5, 5, 5],
+                             'Date Passage': pd.to_datetime(['2022-01-31 23:00', '2021-12-01 00:00', '2021-11-30 23:59'])})
+    resultat = calculate_monthly_visits(passages, n_mois=2)
+    assert resultat.iloc[0, 1:].tolist() == [1, 1]
@@ -0,0 +1,88 @@
+import pytest
+from sqlalchemy import select
+
+from arkose import incremental
+from arkose.backend import creer_moteur
+from arkose.cache_requetes import CACHE
+from arkose.chargement import passages_table
+from arkose.incremental import agg_forfait_table, agg_mensuels_table, ingerer_passages
+from arkose.ingestion import charger_passages
+
+ENTETE = 'Date Passage,Etablissement,ID Client,Type Forfait,Designation,Quantite\n'
+LIGNES = [
+    '2022-01-05 10:00:00,A,1,Mensuel,Entrée adulte,1\n',
+    '2022-01-05 10:00:00,A,1,Annuel,Entrée adulte,1\n',
+    '2022-01-20 18:00:00,B,2,,Tarif réduit,1\n',
+    '2022-02-01 09:00:00,A,1,Mensuel,Entrée adulte,2\n',
+]
+
+
+@pytest.fixture(autouse=True)
+def sans_cache(monkeypatch):
+    monkeypatch.setattr(CACHE, 'actif', False)
+
+
+def _ecrire(chemin, lignes):
+    chemin.write_text(ENTETE + ''.join(lignes), encoding='utf-8')
+
+
+def _etat_base(engine):
+    with engine.connect() as conn:
+        passages = conn.execute(select(passages_table.c.empreinte)).scalars().all()
+        mensuels = dict(((a, m), n) for a, m, n in conn.execute(select(agg_mensuels_table)).all())
+        forfaits = dict(((a, m, f), n) for a, m, f, n in conn.execute(select(agg_forfait_table)).all())
+    return len(passages), mensuels, forfaits
+
+
+def test_ajouts_en_fin_de_fichier(tmp_path):
+    engine, chemin = creer_moteur('sqlite://'), tmp_path / 'passages.csv'
+    _ecrire(chemin, LIGNES[:2])
+    assert ingerer_passages(engine, chemin)['nouveaux_passages'] == 2
+
+    # Une ligne déjà ingérée, répétée en fin de fichier, n'est ni rechargée ni recomptée
+    _ecrire(chemin, LIGNES[:2] + LIGNES[2:] + LIGNES[:1])
+    assert ingerer_passages(engine, chemin)['nouveaux_passages'] == 2
+
+    assert _etat_base(engine) == (4, {(2022, 1): 3, (2022, 2): 1},
+                                  {(2022, 1, 'Mensuel'): 1, (2022, 1, 'Annuel'): 1, (2022, 1, ''): 1,
+                                   (2022, 2, 'Mensuel'): 1})
+    assert ingerer_passages(engine, chemin)['nouveaux_passages'] == 0
+
+
+def test_fichier_remplace_reprend_la_date_du_filigrane(tmp_path):
+    engine, chemin = creer_moteur('sqlite://'), tmp_path / 'passages.csv'
+    _ecrire(chemin, LIGNES[:1] + LIGNES[3:])
+    ingerer_passages(engine, chemin)
+
+    # Nouvel export : un passage arrivé tard, à la date même du filigrane
+    tardif = '2022-02-01 09:00:00,B,3,Mensuel,Entrée adulte,1\n'
+    _ecrire(chemin, LIGNES[3:] + [tardif] + LIGNES[:1])
+    resultat = ingerer_passages(engine, chemin)
+
+    assert resultat['nouveaux_passages'] == 1
+    assert _etat_base(engine)[:2] == (3, {(2022, 1): 1, (2022, 2): 2})
+
+
+def test_seconde_source_conserve_les_agregats(tmp_path):
+    engine = creer_moteur('sqlite://')
+    _ecrire(tmp_path / 'a.csv', LIGNES[:2])
+    _ecrire(tmp_path / 'b.csv', LIGNES[1:])
+    ingerer_passages(engine, tmp_path / 'a.csv')
+    assert ingerer_passages(engine, tmp_path / 'b.csv')['nouveaux_passages'] == 2
+
+    assert _etat_base(engine)[:2] == (4, {(2022, 1): 3, (2022, 2): 1})
+
+
+def test_lecture_deja_faite_reutilisee(tmp_path, monkeypatch):
+    engine, chemin = creer_moteur('sqlite://'), tmp_path / 'passages.csv'
+    _ecrire(chemin, LIGNES)
+    ingestion = charger_passages(chemin)
+
+    def relecture(*args, **kwargs):
+        raise AssertionError("l'export ne doit pas être relu")
+
+    monkeypatch.setattr(incremental, 'iterer_blocs', relecture)
+    resultat = ingerer_passages(engine, chemin, ingestion=ingestion)
+
+    assert resultat['nouveaux_passages'] == 4
+    assert resultat['lignes'] == 4
@@ -0,0 +1,44 @@
+import subprocess
+import sys
+import time
+
+import pytest
+from sqlalchemy import text
+from sqlalchemy.exc import OperationalError
+
+from arkose.backend import creer_moteur, executer_scalaire
+from arkose.instrumentation import Instrumentation
+
+
+def test_instrumentation_sans_base_n_importe_pas_sqlalchemy():
+    code = ("import sys\n"
+            "from arkose.instrumentation import Instrumentation\n"
+            "with Instrumentation().etape('calcul'):\n"
+            "    pass\n"
+            "print('sqlalchemy' in sys.modules)\n")
+    sortie = subprocess.run([sys.executable, '-c', code], capture_output=True, text=True, check=True)
+    assert sortie.stdout.strip() == 'False'
+
+
+def test_requetes_imputees_a_l_etape():
+    mesures = Instrumentation()
+    engine = creer_moteur('sqlite://')
+    with mesures.etape('requete'):
+        executer_scalaire('SELECT 1', engine)
+    assert mesures.mesures[-1]['requetes_sql'] == 1
+
+
+def test_requete_en_erreur_ne_decale_pas_les_mesures_suivantes():
+    mesures = Instrumentation()
+    engine = creer_moteur('sqlite://')
+    with engine.connect() as conn:
+        with mesures.etape('erreur'):
+            with pytest.raises(OperationalError):
+                conn.execute(text('SELECT * FROM table_absente'))
+        time.sleep(0.2)
+        with mesures.etape('suivante'):
+            conn.execute(text('SELECT 1'))
+    erreur, suivante = mesures.mesures
+    assert erreur['requetes_sql'] == 1
+    assert suivante['requetes_sql'] == 1
+    assert suivante['sql_secondes'] < 0.1
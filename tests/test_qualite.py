@@ -0,0 +1,78 @@
+import json
+
+from arkose import qualite
+from arkose.cache import charger_clients_cache, charger_passages_cache
+from arkose.ingestion import charger_passages
+from arkose.qualite import controle_ages, controle_orphelins, rapport_qualite, valider
+
+CLIENTS = """ID Client,Etablissement Inscription,Date Inscription,Date de naissance
+1,A,2021-01-01 10:00:00,1990-05-01
+2,A,2021-02-01 10:00:00,1850-01-01
+2,A,2021-02-01 10:00:00,1850-01-01
+3,B,pas une date,
+"""
+
+PASSAGES = """Date Passage,Etablissement,ID Client,Type Forfait,Designation,Quantite
+2022-01-05 10:00:00,A,1,Mensuel,Entrée adulte,1
+2022-01-05 10:00:00,A,1,Mensuel,Entrée adulte,1
+2022-01-06 10:00:00,A,9,,Entrée adulte,1
+"""
+
+
+def test_rapport_tire_de_l_ingestion_identique_a_la_validation(tmp_path):
+    (tmp_path / 'clients.csv').write_text(CLIENTS, encoding='utf-8')
+    (tmp_path / 'passages.csv').write_text(PASSAGES, encoding='utf-8')
+    cache = tmp_path / 'cache'
+
+    for _ in range(2):  # lecture, puis relecture du cache
+        clients, rapport_clients = charger_clients_cache(tmp_path / 'clients.csv', repertoire=cache,
+                                                         controles=[controle_ages('2022-12-31')])
+        _, rapport_passages = charger_passages_cache(tmp_path / 'passages.csv', repertoire=cache,
+                                                     controles=[controle_orphelins(clients['ID Client'])])
+        rapport = rapport_qualite(rapport_clients, rapport_passages, '2022-12-31')
+
+        assert rapport == valider(tmp_path / 'clients.csv', tmp_path / 'passages.csv', '2022-12-31')
+        assert rapport['clients']['ages_incoherents'] == 1
+        assert rapport['clients']['dates_invalides'] == {'Date Inscription': 1, 'Date de naissance': 0}
+        assert rapport['passages']['doublons'] == 1
+        assert rapport['passages']['passages_orphelins'] == 1
+
+
+def test_identifiant_et_quantite_manquants_comptes_puis_ecartes(tmp_path, capsys):
+    (tmp_path / 'clients.csv').write_text(CLIENTS + ',A,2021-03-01 10:00:00,1990-01-01\n', encoding='utf-8')
+    (tmp_path / 'passages.csv').write_text(PASSAGES + '2022-01-07 10:00:00,A,1,Mensuel,Entrée adulte,\n'
+                                           '2022-01-08 10:00:00,A,,Mensuel,Entrée adulte,1\n', encoding='utf-8')
+
+    qualite.main([str(tmp_path / 'clients.csv'), str(tmp_path / 'passages.csv')])
+    rapport = json.loads(capsys.readouterr().out)
+    assert rapport['clients']['valeurs_manquantes']['ID Client'] == 1
+    assert rapport['clients']['lignes_incompletes'] == 1
+    assert rapport['clients']['lignes_conservees'] == 3
+    assert rapport['passages']['valeurs_manquantes']['ID Client'] == 1
+    assert rapport['passages']['valeurs_manquantes']['Quantite'] == 1
+    assert rapport['passages']['lignes_incompletes'] == 2
+    assert rapport['passages']['lignes_conservees'] == 2
+
+    passages, _ = charger_passages(tmp_path / 'passages.csv')
+    assert len(passages) == 2
+    assert str(passages['ID Client'].dtype) == 'int64'
+    assert str(passages['Quantite'].dtype) == 'int16'
+
+
+def test_orphelins_recomptes_sans_invalider_le_cache_des_passages(tmp_path, monkeypatch):
+    (tmp_path / 'passages.csv').write_text(PASSAGES, encoding='utf-8')
+    cache = tmp_path / 'cache'
+    lectures = []
+    monkeypatch.setattr('arkose.cache.charger_passages',
+                        lambda *args, **kwargs: lectures.append(1) or charger_passages(*args, **kwargs))
+
+    _, rapport = charger_passages_cache(tmp_path / 'passages.csv', repertoire=cache,
+                                        controles=[controle_orphelins([1])])
+    assert rapport['passages_orphelins'] == 1
+    fichiers = sorted(p.name for p in cache.iterdir())
+
+    _, rapport = charger_passages_cache(tmp_path / 'passages.csv', repertoire=cache,
+                                        controles=[controle_orphelins([1, 9])])
+    assert rapport['passages_orphelins'] == 0
+    assert sorted(p.name for p in cache.iterdir()) == fichiers
+    assert len(lectures) == 1
@@ -0,0 +1,42 @@
+import importlib
+import sys
+
+import pandas as pd
+
+from arkose import backend, cache_requetes, rapport
+from arkose.graphe import empreinte_code
+
+
+def test_empreinte_suit_les_modules_joints(tmp_path, monkeypatch):
+    (tmp_path / 'module_joint.py').write_text("def traduire(sql):\n    return sql\n", encoding='utf-8')
+    monkeypatch.syspath_prepend(str(tmp_path))
+    module = importlib.import_module('module_joint')
+    try:
+        def etape():
+            return 1
+        avant = empreinte_code(etape, module)
+        (tmp_path / 'module_joint.py').write_text("def traduire(sql):\n    return sql.upper()\n",
+                                                  encoding='utf-8')
+        importlib.reload(module)
+        assert empreinte_code(etape, module) != avant
+        assert empreinte_code(etape) == empreinte_code(etape)
+    finally:
+        sys.modules.pop('module_joint', None)
+
+
+def test_etapes_sql_empreintes_avec_la_traduction_et_le_cache(tmp_path):
+    (tmp_path / 'clients.csv').write_text('ID Client\n', encoding='utf-8')
+    (tmp_path / 'passages.csv').write_text('ID Client\n', encoding='utf-8')
+    graphe = rapport.construire_graphe(tmp_path / 'clients.csv', tmp_path / 'passages.csv', '2022-12-31',
+                                       url='sqlite://', repertoire=tmp_path / 'etapes')
+    for nom in ['chargement', *rapport.ANALYSES]:
+        assert backend in graphe.etapes[nom]['code']
+        assert cache_requetes in graphe.etapes[nom]['code']
+
+
+def test_nettoyage_compte_les_ages_incoherents():
+    clients = pd.DataFrame({'ID Client': [1, 2, 3],
+                            'Date de naissance': pd.to_datetime(['1990-05-01', '1850-01-01', '2030-01-01'])})
+    nettoyes, qualite = rapport._nettoyer((clients, {'doublons_supprimes': 0}), '2022-12-31')
+    assert qualite['incoherences_age'] == 2
+    assert nettoyes['age'].tolist()[0] == 32
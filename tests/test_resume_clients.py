@@ -0,0 +1,63 @@
+import pandas as pd
+from sqlalchemy import select
+
+from arkose import analyses
+from arkose.backend import creer_moteur
+from arkose.cache_requetes import CACHE
+from arkose.chargement import charger_donnees
+from arkose.frequentation import calculate_monthly_visits
+from arkose.resume_clients import N_MOIS, rafraichir_resume, resume_clients_table
+
+
+def _donnees():
+    clients = pd.DataFrame({'ID Client': [1, 2, 3],
+                            'Date Inscription': pd.to_datetime(['2021-01-15', '2022-05-01', '2022-06-01'])})
+    passages = pd.DataFrame({
+        'Date Passage': pd.to_datetime(['2021-02-01 10:00', '2021-02-20 10:00', '2022-01-03 23:00',
+                                        '2022-05-10 09:00', '2022-09-30 12:00', None]),
+        'Etablissement': 'A',
+        'ID Client': [1, 1, 1, 2, 2, 3],
+        'Type Forfait': 'Entrée',
+        'Designation': ['Entrée adulte', 'Tarif réduit', 'Tarif réduit', 'Entrée adulte', 'Entrée adulte',
+                        'Entrée adulte'],
+        'Quantite': 1,
+    })
+    return clients, passages
+
+
+def test_synthese_calculee_dans_la_base(monkeypatch):
+    monkeypatch.setattr(CACHE, 'actif', False)
+    engine = creer_moteur('sqlite://')
+    clients, passages = _donnees()
+    charger_donnees(engine, clients, passages)
+    rafraichir_resume(engine)
+
+    with engine.connect() as conn:
+        resume = pd.read_sql(select(resume_clients_table), conn).set_index('ID Client').sort_index()
+    assert resume.index.tolist() == [1, 2]
+    assert resume['nb_passages'].tolist() == [3, 2]
+    assert resume['nb_passages_reduit'].tolist() == [2, 0]
+    assert resume['anciennete_jours'].tolist() == [353, 152]
+
+    attendu = calculate_monthly_visits(passages.dropna(subset=['Date Passage']), N_MOIS).set_index('ID Client')
+    mois = [f'mois_{i}' for i in range(1, N_MOIS + 1)]
+    assert (resume[mois].to_numpy() == attendu.sort_index()[mois].to_numpy()).all()
+
+    profil = analyses.profil_mensuel(engine)
+    assert profil['Moyenne'].tolist() == attendu[mois].mean().tolist()
+    assert analyses.repartition_anciennete(engine)['clients'].tolist() == [0, 1, 0, 1, 0, 0]
+
+
+def test_rafraichissement_partiel(monkeypatch):
+    monkeypatch.setattr(CACHE, 'actif', False)
+    engine = creer_moteur('sqlite://')
+    clients, passages = _donnees()
+    charger_donnees(engine, clients, passages.iloc[:4])
+    rafraichir_resume(engine)
+
+    charger_donnees(engine, clients, passages)
+    assert rafraichir_resume(engine, [2]) == 1
+    with engine.connect() as conn:
+        resume = pd.read_sql(select(resume_clients_table), conn).set_index('ID Client')
+    assert resume.loc[2, 'nb_passages'] == 2
+    assert resume.loc[1, 'nb_passages'] == 3
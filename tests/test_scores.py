@@ -0,0 +1,28 @@
+import pandas as pd
+from sqlalchemy import select
+
+from arkose.backend import creer_moteur
+from arkose.scores import enregistrer_scores, scores_clients_table
+
+
+def _scores(a_risque):
+    return pd.DataFrame({'ID Client': [1, 2, 3], 'score': [0.9, 0.8, 0.1], 'rang': [1, 2, 3],
+                         'a_risque': a_risque, 'perdu': False,
+                         'mois_baisse': [3, 2, 0], 'jours_inactivite': [120, 30, 5], 'tendance': [0.5, 0.7, 1.0]})
+
+
+def _enregistres(engine):
+    with engine.connect() as conn:
+        return pd.read_sql(select(scores_clients_table).order_by(scores_clients_table.c.date_score,
+                                                                 scores_clients_table.c['ID Client']), conn)
+
+
+def test_nouveau_calcul_de_la_meme_date_remplace_la_liste():
+    engine = creer_moteur('sqlite://')
+    enregistrer_scores(engine, _scores([True, True, False]), '2022-11-30')
+    enregistrer_scores(engine, _scores([True, True, False]), '2022-12-31')
+    enregistrer_scores(engine, _scores([True, False, False]), '2022-12-31')
+
+    df = _enregistres(engine)
+    assert df.loc[df['date_score'] == '2022-11-30', 'ID Client'].tolist() == [1, 2]
+    assert df.loc[df['date_score'] == '2022-12-31', 'ID Client'].tolist() == [1]
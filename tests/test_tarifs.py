@@ -0,0 +1,13 @@
+import sqlite3
+
+from arkose.tarifs import TARIF_REDUIT, classe_tarif
+
+DESIGNATIONS = ['Entrée adulte', 'Tarif réduit', 'Entrée réduite', 'Tarif reduit ', 'ENTREE REDUIT',
+                'Réduit étudiant']
+
+
+def test_meme_regle_que_la_requete_sql():
+    conn = sqlite3.connect(':memory:')
+    for designation in DESIGNATIONS:
+        en_sql = conn.execute("SELECT LOWER(REPLACE(?, 'é', 'e')) LIKE '%reduit'", (designation,)).fetchone()[0]
+        assert (classe_tarif(designation) == TARIF_REDUIT) == bool(en_sql), designation